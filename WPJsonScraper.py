@@ -22,19 +22,22 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import atexit
 import argparse
-import requests
 import re
 import os
 
+from lib import defaults
 from lib.console import Console
-from lib.wpapi import WPApi
-from lib.infodisplayer import InfoDisplayer
+from lib.endpoints import Endpoint
 from lib.exceptions import NoWordpressApi, WordPressApiNotV2, \
                             NSNotFoundException
-from lib.exporter import Exporter
-from lib.requestsession import RequestSession
-from lib.interactive import start_interactive
+from lib.eventlog import EventLog
+
+# The scanner and requests are imported once the arguments are parsed, and
+# the modules only needed by some actions (display, exports, interactive
+# mode, traffic record, profiling) when these actions run, so that --help,
+# --version and quick runs do not load them
 
 version = '0.5'
 
@@ -63,6 +66,12 @@ license, check LICENSE.txt for more information""")
                         action='store_true',
                         help='dumps basic information about the WordPress '
                         'installation')
+    parser.add_argument('--census',
+                        dest='census',
+                        action='store_true',
+                        help='count the objects of every collection and '
+                        'estimate the number of requests, the size and the '
+                        'duration of a full crawl')
     parser.add_argument('-e',
                         '--endpoints',
                         dest='endpoints',
@@ -102,6 +111,34 @@ license, check LICENSE.txt for more information""")
                         dest='pages',
                         action='store_true',
                         help='lists pages')
+    parser.add_argument('-C',
+                        '--custom-types',
+                        dest='custom_types',
+                        action='store_true',
+                        help='lists objects of custom post types and '
+                        'taxonomies')
+    parser.add_argument('--embed',
+                        dest='embed',
+                        action='store_true',
+                        help='crawl posts and pages with their authors and '
+                        'terms embedded, which are then used by exports '
+                        'instead of crawling all users, tags and categories')
+    parser.add_argument('--shard',
+                        dest='shard_size',
+                        action='store',
+                        type=int,
+                        nargs='?',
+                        const=defaults.SHARD_SIZE,
+                        help='crawl whole collections of posts, pages, custom '
+                        'types and comments by date windows of at most '
+                        'SHARD_SIZE entries (default %d) instead of deep '
+                        'pages' % defaults.SHARD_SIZE)
+    parser.add_argument('--revisions',
+                        dest='revisions',
+                        action='store_true',
+                        help='fetch the revisions and autosaves of posts and '
+                        'pages (usually requires authentication), they are '
+                        'also included in exports')
     parser.add_argument('-o',
                         '--comments',
                         dest='comments',
@@ -115,16 +152,77 @@ license, check LICENSE.txt for more information""")
                         dest='comment_export_folder',
                         action='store',
                         help='export comments to a specified destination folder')
+    parser.add_argument('--compress',
+                        dest='compress',
+                        action='store',
+                        choices=defaults.COMPRESSIONS,
+                        help='write --export-posts, --export-pages and '
+                        '--export-comments as a single compressed tar archive '
+                        '(also guessed from a .tar.gz, .tar.xz or .tar.bz2 '
+                        'destination)')
+    parser.add_argument('--export-sqlite',
+                        dest='sqlite_export_file',
+                        action='store',
+                        help='export posts, pages, users, tags, categories, '
+                        'media and comments to a SQLite database')
     parser.add_argument('--download-media',
                         dest='media_folder',
                         action='store',
                         help='download media to the designated folder')
+    parser.add_argument('--workers',
+                        dest='workers',
+                        action='store',
+                        type=int,
+                        default=defaults.DEFAULT_WORKERS,
+                        help='number of parallel connections used for '
+                        'downloads and namespace crawls (default %d)' %
+                        defaults.DEFAULT_WORKERS)
+    parser.add_argument('--dedup',
+                        dest='dedup',
+                        action='store_true',
+                        help='store downloaded media once per content in a '
+                        '.blobs folder of the download folder and hard link '
+                        'them to their location')
+    parser.add_argument('--blob-store',
+                        dest='blob_store',
+                        action='store',
+                        help='use the specified folder as deduplicated media '
+                        'storage (e.g. shared between several targets), '
+                        'implies --dedup')
     parser.add_argument('-r',
                         '--crawl-ns',
                         dest='crawl_ns',
                         action='store',
                         help='crawl all GET routes of the specified namespace '
                         'or all namespaces if all is specified')
+    parser.add_argument('--export-ns',
+                        dest='ns_export_file',
+                        action='store',
+                        help='export the data of crawled routes to a JSON file '
+                        '(NDJSON if the file ends with .ndjson or .jsonl), '
+                        'crawls all namespaces if -r is not specified')
+    parser.add_argument('--probe-ids',
+                        dest='probe_ids',
+                        action='store_true',
+                        help='also enumerate the crawled routes taking a '
+                        'numeric ID by probing IDs, seeded with the IDs seen '
+                        'in the collections')
+    parser.add_argument('--probe-misses',
+                        dest='probe_misses',
+                        action='store',
+                        type=int,
+                        default=defaults.PROBE_MISSES,
+                        help='number of consecutive missing IDs after which '
+                        'a probe jumps to the next known ID or stops '
+                        '(default %d)' % defaults.PROBE_MISSES)
+    parser.add_argument('--probe-max',
+                        dest='probe_max',
+                        action='store',
+                        type=int,
+                        default=defaults.PROBE_MAX,
+                        help='highest ID probed, unless the IDs seen in the '
+                        'collection of the route go further (default %d)' %
+                        defaults.PROBE_MAX)
     parser.add_argument('-a',
                         '--all',
                         dest='all',
@@ -153,6 +251,36 @@ license, check LICENSE.txt for more information""")
                         action='store',
                         help='define specific cookies to send with the request '
                         'in the format cookie1=foo; cookie2=bar')
+    parser.add_argument('--stats',
+                        dest='stats',
+                        action='store_true',
+                        help='display the number, latency and size of the '
+                        'requests sent per endpoint at the end of the run')
+    parser.add_argument('--event-log',
+                        dest='event_log',
+                        action='store',
+                        help='write the events of the scan (requests, pages, '
+                        'exports, errors) to EVENT_LOG as NDJSON')
+    parser.add_argument('--profile',
+                        dest='profile_folder',
+                        action='store',
+                        help='profile the CPU time and the memory of each phase '
+                        'of the run and write the reports to PROFILE_FOLDER')
+    parser.add_argument('--record',
+                        dest='record_file',
+                        action='store',
+                        help='record the HTTP exchanges to RECORD_FILE '
+                        '(compressed if it ends with .gz, .xz or .bz2)')
+    parser.add_argument('--record-media',
+                        dest='record_media',
+                        action='store_true',
+                        help='with --record, also record the content of the '
+                        'downloaded media')
+    parser.add_argument('--replay',
+                        dest='replay_file',
+                        action='store',
+                        help='answer the requests with the exchanges recorded '
+                        'in REPLAY_FILE instead of sending them')
     parser.add_argument('--no-color',
                         dest='nocolor',
                         action='store_true',
@@ -185,11 +313,19 @@ license, check LICENSE.txt for more information""")
 
     """ % (version, args.target)
 
-    print(motd)
+    Console.write(motd + "\n")
 
     if args.nocolor:
         Console.wipe_color()
 
+    if args.event_log is not None:
+        try:
+            EventLog.open(args.event_log)
+        except IOError as e:
+            Console.log_error("Could not open the event log: %s" % e)
+            exit(1)
+        atexit.register(EventLog.close)
+
     Console.log_info("Testing connectivity with the server")
 
     target = args.target
@@ -198,6 +334,13 @@ license, check LICENSE.txt for more information""")
     if re.match(r'^.+/$', target) is None:
         target += "/"
 
+    EventLog.emit('scan_started', target=target, version=version)
+
+    import requests
+    from lib.wpapi import WPApi
+    from lib.requestsession import RequestSession, ConnectionCouldNotResolve, \
+                                   ConnectionRefused, ConnectionReset, NotRecorded
+
     proxy = None
     if args.proxy_server is not None:
         proxy = args.proxy_server
@@ -214,17 +357,69 @@ license, check LICENSE.txt for more information""")
               ':'.join(authorization_list[1:]))
     session = RequestSession(proxy=proxy, cookies=cookies,
       authorization=authorization)
+    if args.record_file is not None and args.replay_file is not None:
+        Console.log_error("--record and --replay cannot be used together")
+        exit(1)
+    if args.replay_file is not None:
+        from lib.traffic import TrafficArchive
+        try:
+            archive = TrafficArchive(args.replay_file)
+        except (IOError, ValueError) as e:
+            Console.log_error("Could not load the recorded traffic: %s" % e)
+            exit(1)
+        session.set_replay(archive)
+        Console.log_info("Replaying %d exchanges recorded from %s" % (len(archive),
+            archive.target))
+    if args.record_file is not None:
+        from lib.traffic import TrafficRecorder
+        try:
+            recorder = TrafficRecorder(args.record_file, target,
+                stream_bodies=args.record_media)
+        except IOError as e:
+            Console.log_error("Could not create the traffic record: %s" % e)
+            exit(1)
+        session.set_recorder(recorder)
+        atexit.register(recorder.close)
+    if args.stats:
+        def display_stats():
+            from lib.infodisplayer import InfoDisplayer
+            InfoDisplayer.display_stats(session.stats.summary())
+        atexit.register(display_stats)
+    # Phases are only marked when profiling
+    phase = lambda name: None
+    if args.profile_folder is not None:
+        from lib.profiler import Profiler
+        def display_profile():
+            from lib.infodisplayer import InfoDisplayer
+            InfoDisplayer.display_profile(Profiler.stop())
+        Profiler.start(args.profile_folder)
+        atexit.register(display_profile)
+        phase = Profiler.phase
+        phase("discovery")
+
+    scanner = WPApi(target, session=session, search_terms=args.search,
+                    workers=args.workers, embed=args.embed,
+                    shard_size=args.shard_size)
+    # Every action needs the API index, its request is the connectivity check
+    api_available = True
     try:
-        session.get(target)
+        scanner.get_basic_info()
         Console.log_success("Connection OK")
-    except Exception as e:
-        Console.log_error("Failed to connect to the server")
-        exit(0)
-    
+    except NoWordpressApi as e:
+        if isinstance(e.__cause__, NotRecorded):
+            # Already reported by the session
+            exit(1)
+        if isinstance(e.__cause__, (requests.RequestException,
+            ConnectionCouldNotResolve, ConnectionRefused, ConnectionReset)):
+            Console.log_error("Failed to connect to the server")
+            exit(0)
+        api_available = False
+
     # Quite an ugly check to launch a search on all parameters edible 
     # Should find something better (maybe in argparser doc?)
     if args.search is not None and not (args.all | args.posts | args.pages | 
-        args.users | args.categories | args.tags | args.media):
+        args.users | args.categories | args.tags | args.media |
+        args.custom_types):
         Console.log_info("Searching on all available sources")
         args.posts = True
         args.pages = True 
@@ -232,13 +427,20 @@ license, check LICENSE.txt for more information""")
         args.categories = True
         args.tags = True
         args.media = True
+        args.custom_types = True
 
     if args.interactive:
-        start_interactive(target, session, version)
+        from lib.interactive import start_interactive
+        start_interactive(target, session, version, args.workers, scanner)
         return
 
-    scanner = WPApi(target, session=session, search_terms=args.search)
+    if not api_available:
+        Console.log_error("No WordPress API available at the given URL "
+        "(too old WordPress or not WordPress?)")
+        exit()
+
     if args.info or args.all:
+        from lib.infodisplayer import InfoDisplayer
         try:
             basic_info = scanner.get_basic_info()
             Console.log_info("General information on the target")
@@ -248,147 +450,275 @@ license, check LICENSE.txt for more information""")
             "(too old WordPress or not WordPress?)")
             exit()
     
+    if args.census:
+        from lib.infodisplayer import InfoDisplayer
+        try:
+            Console.log_info("Collection census")
+            InfoDisplayer.display_census(scanner.census(), args.workers)
+        except NoWordpressApi:
+            Console.log_error("No WordPress API available at the given URL "
+            "(too old WordPress or not WordPress?)")
+
     if args.posts or args.all:
+        phase("crawl posts")
+        from lib.infodisplayer import InfoDisplayer
         try:
             if args.comments:
                 Console.log_info("Post list with comments")
             else:
                 Console.log_info("Post list")
-            posts_list = scanner.get_posts(args.comments)
-            InfoDisplayer.display_posts(posts_list, scanner.get_orphans_comments())
+            InfoDisplayer.display_progressively(
+                lambda callback: scanner.get_posts(args.comments, callback=callback),
+                InfoDisplayer.display_posts, scanner.get_orphans_comments())
         except WordPressApiNotV2:
             Console.log_error("The API does not support WP V2")
 
     if args.pages or args.all:
+        phase("crawl pages")
+        from lib.infodisplayer import InfoDisplayer
         try:
             Console.log_info("Page list")
-            pages_list = scanner.get_pages()
-            InfoDisplayer.display_pages(pages_list)
+            InfoDisplayer.display_progressively(
+                lambda callback: scanner.get_pages(callback=callback),
+                InfoDisplayer.display_pages)
+        except WordPressApiNotV2:
+            Console.log_error("The API does not support WP V2")
+
+    if args.revisions:
+        phase("crawl revisions")
+        from lib.infodisplayer import InfoDisplayer
+        try:
+            Console.log_info("Post and page revisions")
+            revision_number = 0
+            for obj_type in [WPApi.POST, WPApi.PAGE]:
+                revision_number += scanner.get_revisions(obj_type)
+            if revision_number == 0:
+                Console.log_info("No revision found (authentication may be required)")
+            else:
+                InfoDisplayer.display_revisions(scanner.get_posts() +
+                    scanner.get_pages())
         except WordPressApiNotV2:
             Console.log_error("The API does not support WP V2")
 
     if args.users or args.all:
+        phase("crawl users")
+        from lib.infodisplayer import InfoDisplayer
         try:
             Console.log_info("User list")
-            users_list = scanner.get_users()
-            InfoDisplayer.display_users(users_list)
+            InfoDisplayer.display_progressively(
+                lambda callback: scanner.get_users(callback=callback),
+                InfoDisplayer.display_users)
         except WordPressApiNotV2:
             Console.log_error("The API does not support WP V2")
 
     if args.endpoints or args.all:
+        phase("endpoints")
+        from lib.infodisplayer import InfoDisplayer
         try:
             Console.log_info("API endpoints")
-            basic_info = scanner.get_basic_info()
-            InfoDisplayer.display_endpoints(basic_info)
+            InfoDisplayer.display_endpoints({'routes': scanner.get_routes()})
         except NoWordpressApi:
             Console.log_error("No WordPress API available at the given URL "
             "(too old WordPress or not WordPress?)")
             exit()
 
     if args.categories or args.all:
+        phase("crawl categories")
+        from lib.infodisplayer import InfoDisplayer
         try:
             Console.log_info("Category list")
-            categories_list = scanner.get_categories()
-            InfoDisplayer.display_categories(categories_list)
+            InfoDisplayer.display_progressively(
+                lambda callback: scanner.get_categories(callback=callback),
+                InfoDisplayer.display_categories)
         except WordPressApiNotV2:
             Console.log_error("The API does not support WP V2")
 
     if args.tags or args.all:
+        phase("crawl tags")
+        from lib.infodisplayer import InfoDisplayer
         try:
             Console.log_info("Tags list")
-            tags_list = scanner.get_tags()
-            InfoDisplayer.display_tags(tags_list)
+            InfoDisplayer.display_progressively(
+                lambda callback: scanner.get_tags(callback=callback),
+                InfoDisplayer.display_tags)
         except WordPressApiNotV2:
             Console.log_error("The API does not support WP V2")
 
     media_list = None
     if args.media or args.all:
+        phase("crawl media")
+        from lib.infodisplayer import InfoDisplayer
         try:
             Console.log_info("Media list")
-            media_list = scanner.get_media()
-            InfoDisplayer.display_media(media_list)
+            media_list = InfoDisplayer.display_progressively(
+                lambda callback: scanner.get_media(callback=callback),
+                InfoDisplayer.display_media)
+        except WordPressApiNotV2:
+            Console.log_error("The API does not support WP V2")
+
+    if args.custom_types or args.all:
+        phase("crawl custom types")
+        from lib.infodisplayer import InfoDisplayer
+        try:
+            for endpoint in scanner.get_endpoints().custom():
+                Console.log_info("%s list" % endpoint.plural.capitalize())
+                if endpoint.kind == Endpoint.TYPE:
+                    display = InfoDisplayer.display_posts
+                else:
+                    display = InfoDisplayer.display_terms
+                InfoDisplayer.display_progressively(
+                    lambda callback: scanner.get_collection(endpoint.key, callback=callback),
+                    display)
         except WordPressApiNotV2:
             Console.log_error("The API does not support WP V2")
 
-    if args.crawl_ns is None and args.all:
+    if args.crawl_ns is None and (args.all or args.ns_export_file is not None):
         args.crawl_ns = "all"
 
     if args.crawl_ns is not None:
+        phase("crawl namespaces")
+        from lib.infodisplayer import InfoDisplayer
         try:
             if args.crawl_ns == "all":
                 Console.log_info("Crawling all namespaces")
             else:
                 Console.log_info("Crawling %s namespace" % args.crawl_ns)
-            ns_data = scanner.crawl_namespaces(args.crawl_ns)
-            InfoDisplayer.display_crawled_ns(ns_data)
+            routes = scanner.iter_namespaces(args.crawl_ns, args.probe_ids,
+                                             args.probe_misses, args.probe_max)
+            if args.ns_export_file is not None:
+                from lib.exporter import Exporter
+                fmt = Exporter.ns_export_format(args.ns_export_file)
+                print()
+                route_number = Exporter.export_crawled_ns(routes, fmt,
+                    args.ns_export_file, InfoDisplayer.display_crawled_route)
+                print()
+                Console.log_success("Exported %d routes to %s" %
+                    (route_number, Exporter.prepare_filename(args.ns_export_file, fmt)))
+            else:
+                InfoDisplayer.display_crawled_ns(routes)
         except NSNotFoundException:
             Console.log_error("The specified namespace was not found")
         except Exception as e:
             print(e)
 
     if args.post_export_folder is not None:
+        phase("export posts")
+        from lib.exporter import Exporter
         try:
             posts_list = scanner.get_posts()
-            tags_list = scanner.get_tags()
-            categories_list = scanner.get_categories()
-            users_list = scanner.get_users()
+            if args.embed:
+                tags_list = scanner.get_known_objects(WPApi.TAG)
+                categories_list = scanner.get_known_objects(WPApi.CATEGORY)
+                users_list = scanner.get_known_objects(WPApi.USER)
+            else:
+                tags_list = scanner.get_tags()
+                categories_list = scanner.get_categories()
+                users_list = scanner.get_users()
             print()
             post_number = Exporter.export_posts_html(posts_list,
              args.post_export_folder,
              tags_list,
              categories_list,
-             users_list)
+             users_list,
+             args.compress)
             if post_number> 0:
+                from lib.output import export_path
                 Console.log_success("Exported %d posts to %s" %
-                (post_number, args.post_export_folder))
+                (post_number, export_path(args.post_export_folder, args.compress)))
         except WordPressApiNotV2:
             Console.log_error("The API does not support WP V2")
 
     if args.page_export_folder is not None:
+        phase("export pages")
+        from lib.exporter import Exporter
         try:
             pages_list = scanner.get_pages()
-            users_list = scanner.get_users()
+            if args.embed:
+                users_list = scanner.get_known_objects(WPApi.USER)
+            else:
+                users_list = scanner.get_users()
             print()
             page_number = Exporter.export_posts_html(pages_list,
              args.page_export_folder,
              None,
              None,
-             users_list)
+             users_list,
+             args.compress)
             if page_number> 0:
+                from lib.output import export_path
                 Console.log_success("Exported %d pages to %s" %
-                (page_number, args.page_export_folder))
+                (page_number, export_path(args.page_export_folder, args.compress)))
         except WordPressApiNotV2:
             Console.log_error("The API does not support WP V2")
     
     if args.comment_export_folder is not None:
+        phase("export comments")
+        from lib.exporter import Exporter
         try:
             post_list = scanner.get_posts(True)
             orphan_list = scanner.get_orphans_comments()
             print()
-            page_number = Exporter.export_comments(post_list, orphan_list, args.comment_export_folder)
+            page_number = Exporter.export_comments(post_list, orphan_list,
+             args.comment_export_folder, args.compress)
             if page_number > 0:
+                from lib.output import export_path
                 Console.log_success("Exported %d comments to %s" %
-                (page_number, args.comment_export_folder))
+                (page_number, export_path(args.comment_export_folder, args.compress)))
+        except WordPressApiNotV2:
+            Console.log_error("The API does not support WP V2")
+
+    if args.sqlite_export_file is not None:
+        phase("export sqlite")
+        from lib.exporter import Exporter
+        try:
+            posts_list = scanner.get_posts()
+            pages_list = scanner.get_pages()
+            users_list = scanner.get_users()
+            tags_list = scanner.get_tags()
+            categories_list = scanner.get_categories()
+            media_list = scanner.get_media()
+            comments_list = scanner.get_comments()
+            print()
+            object_number = Exporter.write_sqlite(args.sqlite_export_file,
+             posts=posts_list,
+             pages=pages_list,
+             users=users_list,
+             tags=tags_list,
+             categories=categories_list,
+             media=media_list,
+             comments=comments_list)
+            Console.log_success("Exported %d objects to %s" %
+            (object_number, args.sqlite_export_file))
         except WordPressApiNotV2:
             Console.log_error("The API does not support WP V2")
 
     if args.media_folder is not None:
+        phase("download media")
         Console.log_info("Downloading media files")
         if not os.path.isdir(args.media_folder):
             Console.log_error("The destination is not a folder or does not exist")
         else:
             print("Pulling the media URLs")
 
-            media, _ = scanner.get_media_urls('all', True)
+            media, _, media_ids = scanner.get_media_urls('all', True, with_ids=True)
             if len(media) == 0:
                 Console.log_error("No media found")
                 return
             print("%d media URLs found" % len(media))
 
-            print("Note: Only files over 10MB are logged here")
-            number_downloaded = Exporter.download_media(media, args.media_folder)
+            from lib.exporter import Exporter
+            blob_store = args.blob_store
+            if blob_store is None and args.dedup:
+                blob_store = os.path.join(args.media_folder, ".blobs")
+            number_downloaded = Exporter.download_media(media, args.media_folder,
+              session=session, workers=args.workers, ids=media_ids,
+              blob_store=blob_store)
             Console.log_success('Downloaded %d media to %s' % (number_downloaded, args.media_folder))
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    except BrokenPipeError:
+        # The reader of the output (e.g. head) exited before the end
+        Console.drop_output()
@@ -0,0 +1,446 @@
+"""
+Copyright (c) 2018-2020 Mickaël "Kilawyn" Walter
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+SITE_OPTIONS = [
+    ('posts', int, 2000, 'number of posts'),
+    ('pages', int, 50, 'number of pages'),
+    ('comments', int, 4000, 'number of comments, spread over the posts'),
+    ('media', int, 40, 'number of media objects'),
+    ('media_size', int, 256 * 1024, 'size in bytes of each media file'),
+    ('users', int, 20, 'number of users'),
+    ('tags', int, 200, 'number of tags'),
+    ('categories', int, 30, 'number of categories'),
+    ('items', int, 1000, 'number of objects of the bench/v1/items plugin route'),
+    ('content_size', int, 2000, 'size in characters of the content of posts and pages'),
+    ('max_per_page', int, 100, 'maximum per_page value accepted by the collections'),
+    ('latency', float, 0.0, 'seconds waited before answering each request'),
+    ('jitter', float, 0.0, 'random seconds added to the latency of each request'),
+    ('error_rate', float, 0.0, 'fraction of the requests answered with an error'),
+    ('error_status', int, 500, 'HTTP status of the injected errors'),
+    ('seed', int, 0, 'seed of the generated content and of the injected errors'),
+]
+"""
+    Options of the stand-in site: (name, type, default value, description)
+"""
+
+SETUP_HEADER = "X-Benchmark-Setup"
+"""
+    Header of the requests which are not part of the measures
+"""
+
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod "
+    "tempor incididunt ut labore et dolore magna aliqua ut enim ad minim veniam "
+    "quis nostrud exercitation ullamco laboris nisi aliquip ex ea commodo").split()
+
+class MockSite:
+    """
+    The content of a stand-in WordPress site, generated from a seed so that
+    every run serves the same objects
+    """
+
+    def __init__(self, base_url, **options):
+        """
+        Generates the objects of the site
+        param base_url: the URL of the site, used in the links of the objects
+        param options: the values of SITE_OPTIONS, defaults are used for the
+        missing ones
+        """
+        for name, _, default, _ in SITE_OPTIONS:
+            setattr(self, name, options.get(name, default))
+        self.base_url = base_url.rstrip('/')
+        rand = random.Random(self.seed)
+
+        def text(size):
+            words = []
+            length = 0
+            while length < size:
+                word = rand.choice(WORDS)
+                words.append(word)
+                length += len(word) + 1
+            return " ".join(words)
+
+        def date(i, count):
+            # Spread over about 5 years, the newest objects having the highest IDs
+            return time.strftime("%Y-%m-%dT%H:%M:%S",
+                time.gmtime(1500000000 + int(i * 160000000 / max(count, 1))))
+
+        base = self.base_url
+        self.collections = {}
+        self.collections['users'] = [{
+            'id': i, 'name': "User %d" % i, 'slug': "user-%d" % i, 'url': "",
+            'description': text(80), 'link': "%s/author/user-%d/" % (base, i),
+            'avatar_urls': {},
+        } for i in range(1, self.users + 1)]
+        self.collections['categories'] = [{
+            'id': i, 'name': "Category %d" % i, 'slug': "category-%d" % i,
+            'description': "", 'count': 0, 'parent': 0, 'taxonomy': 'category',
+            'link': "%s/category/category-%d/" % (base, i),
+        } for i in range(1, self.categories + 1)]
+        self.collections['tags'] = [{
+            'id': 10000 + i, 'name': "tag %d" % i, 'slug': "tag-%d" % i,
+            'description': "", 'count': 0, 'taxonomy': 'post_tag',
+            'link': "%s/tag/tag-%d/" % (base, i),
+        } for i in range(1, self.tags + 1)]
+        posts = []
+        for i in range(1, self.posts + 1):
+            posts.append({
+                'id': i, 'date': date(i, self.posts), 'date_gmt': date(i, self.posts),
+                'modified': date(i, self.posts), 'modified_gmt': date(i, self.posts),
+                'slug': "post-%d" % i, 'status': 'publish', 'type': 'post',
+                'link': "%s/?p=%d" % (base, i), 'guid': {'rendered': "%s/?p=%d" % (base, i)},
+                'title': {'rendered': "Post %d: %s" % (i, text(40))},
+                'content': {'rendered': "<p>%s</p>" % text(self.content_size), 'protected': False},
+                'excerpt': {'rendered': "<p>%s</p>" % text(150), 'protected': False},
+                'author': rand.randint(1, max(self.users, 1)),
+                'comment_status': 'open', 'ping_status': 'open', 'sticky': False,
+                'template': "", 'format': 'standard', 'meta': [],
+                'categories': [rand.randint(1, max(self.categories, 1))],
+                'tags': sorted(set(10000 + rand.randint(1, max(self.tags, 1)) for _ in range(3))),
+            })
+        self.collections['posts'] = posts
+        self.collections['pages'] = [{
+            'id': 100000 + i, 'date_gmt': date(i, self.pages), 'modified_gmt': date(i, self.pages),
+            'slug': "page-%d" % i, 'status': 'publish', 'type': 'page',
+            'link': "%s/page-%d/" % (base, i),
+            'title': {'rendered': "Page %d" % i},
+            'content': {'rendered': "<p>%s</p>" % text(self.content_size), 'protected': False},
+            'excerpt': {'rendered': "", 'protected': False},
+            'author': 1, 'parent': 0, 'menu_order': 0, 'comment_status': 'closed',
+            'template': "",
+        } for i in range(1, self.pages + 1)]
+        self.collections['comments'] = [{
+            'id': 200000 + i, 'post': rand.randint(1, max(self.posts, 1)), 'parent': 0,
+            'author': 0, 'author_name': "Visitor %d" % rand.randint(1, 500),
+            'author_url': "", 'date': date(i, self.comments), 'date_gmt': date(i, self.comments),
+            'status': 'approved', 'type': 'comment',
+            'link': "%s/?p=1#comment-%d" % (base, 200000 + i),
+            'content': {'rendered': "<p>%s</p>" % text(300)},
+            '_links': {'up': [{'href': "%s/wp-json/wp/v2/posts/1" % base}]},
+        } for i in range(1, self.comments + 1)]
+        self.collections['media'] = [{
+            'id': 300000 + i, 'date_gmt': date(i, self.media), 'slug': "image-%d" % i,
+            'status': 'inherit', 'type': 'attachment', 'link': "%s/image-%d/" % (base, i),
+            'title': {'rendered': "Image %d" % i}, 'author': 1, 'post': None,
+            'media_type': 'image', 'mime_type': 'image/jpeg', 'alt_text': "",
+            'caption': {'rendered': ""}, 'description': {'rendered': ""},
+            'source_url': "%s/wp-content/uploads/%s/image-%d.jpg" % (base,
+                date(i, self.media)[:7].replace('-', '/'), i),
+        } for i in range(1, self.media + 1)]
+        self.collections['items'] = [{'id': i, 'name': "item %d" % i, 'value': text(100)}
+            for i in range(1, self.items + 1)]
+        self.by_id = {}
+        for name, objects in self.collections.items():
+            self.by_id[name] = dict((o['id'], o) for o in objects)
+        self.files = dict((urlsplit(m['source_url']).path, m['id'])
+            for m in self.collections['media'])
+        self.routes = self.build_routes()
+
+    def build_routes(self):
+        """
+        Returns the routes published by the API index
+        """
+        def endpoint(args, methods=None):
+            return {'methods': methods or ['GET'], 'args': args}
+
+        collection_args = {
+            'context': {'required': False, 'default': 'view', 'type': 'string'},
+            'page': {'required': False, 'default': 1, 'type': 'integer', 'minimum': 1},
+            'per_page': {'required': False, 'default': 10, 'type': 'integer',
+                'minimum': 1, 'maximum': self.max_per_page},
+            'search': {'required': False, 'type': 'string'},
+        }
+        id_args = {'id': {'required': False, 'type': 'integer'}}
+        routes = {
+            '/': {'namespace': "", 'methods': ['GET'], 'endpoints': [endpoint({})]},
+            '/wp/v2': {'namespace': 'wp/v2', 'methods': ['GET'], 'endpoints': [endpoint({})]},
+            '/bench/v1': {'namespace': 'bench/v1', 'methods': ['GET'], 'endpoints': [endpoint({})]},
+        }
+        for name in ['posts', 'pages', 'comments', 'media', 'users', 'tags', 'categories']:
+            routes['/wp/v2/%s' % name] = {'namespace': 'wp/v2', 'methods': ['GET', 'POST'],
+                'endpoints': [endpoint(collection_args), endpoint({}, ['POST'])]}
+            routes['/wp/v2/%s/(?P<id>[\\d]+)' % name] = {'namespace': 'wp/v2',
+                'methods': ['GET'], 'endpoints': [endpoint(id_args)]}
+        for name in ['types', 'taxonomies']:
+            routes['/wp/v2/%s' % name] = {'namespace': 'wp/v2', 'methods': ['GET'],
+                'endpoints': [endpoint({})]}
+        routes['/bench/v1/items'] = {'namespace': 'bench/v1', 'methods': ['GET'],
+            'endpoints': [endpoint(collection_args)]}
+        routes['/bench/v1/items/(?P<id>[\\d]+)'] = {'namespace': 'bench/v1',
+            'methods': ['GET'], 'endpoints': [endpoint(id_args)]}
+        routes['/bench/v1/settings'] = {'namespace': 'bench/v1', 'methods': ['GET'],
+            'endpoints': [endpoint({})]}
+        return routes
+
+    def index(self):
+        """
+        Returns the API index (wp-json/)
+        """
+        return {
+            'name': "Benchmark site", 'description': "Stand-in WordPress site",
+            'url': self.base_url, 'home': self.base_url, 'gmt_offset': 0,
+            'timezone_string': "UTC", 'namespaces': ['wp/v2', 'bench/v1'],
+            'authentication': [], 'routes': self.routes,
+        }
+
+    def types(self):
+        return {
+            'post': {'slug': 'post', 'name': "Posts", 'rest_base': 'posts',
+                'taxonomies': ['category', 'post_tag']},
+            'page': {'slug': 'page', 'name': "Pages", 'rest_base': 'pages', 'taxonomies': []},
+            'attachment': {'slug': 'attachment', 'name': "Media", 'rest_base': 'media',
+                'taxonomies': []},
+        }
+
+    def taxonomies(self):
+        return {
+            'category': {'slug': 'category', 'name': "Categories", 'rest_base': 'categories',
+                'types': ['post']},
+            'post_tag': {'slug': 'post_tag', 'name': "Tags", 'rest_base': 'tags',
+                'types': ['post']},
+        }
+
+    def file_content(self, media_id):
+        """
+        Returns the content of a media file, the same for every request
+        """
+        block = hashlib.sha256(b"%d" % media_id).digest() * 128
+        return (block * (self.media_size // len(block) + 1))[:self.media_size]
+
+class MockHandler(BaseHTTPRequestHandler):
+    """
+    Answers the requests like the REST API of a WordPress site
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, str(value))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def send_json(self, data, status=200, headers=None):
+        self.send_body(status, json.dumps(data).encode("utf-8"),
+            "application/json; charset=UTF-8", headers)
+
+    def send_error_json(self, status, code, message):
+        self.send_json({'code': code, 'message': message, 'data': {'status': status}}, status)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        server = self.server
+        site = server.site
+        url = urlsplit(self.path)
+        query = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+        path = url.path
+        delay = 0
+        fail = False
+        with server.lock:
+            server.requests += 1
+            # The requests preparing a benchmark are neither delayed nor failed
+            if SETUP_HEADER not in self.headers:
+                delay = site.latency + server.random.random() * site.jitter
+                fail = path not in ('/', '/wp-json', '/wp-json/') and \
+                    server.random.random() < site.error_rate
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            with server.lock:
+                server.errors += 1
+            return self.send_error_json(site.error_status, 'injected_error',
+                "Error injected by the benchmark server")
+        if path == '/':
+            return self.send_body(200, b"<html><body>Benchmark site</body></html>",
+                "text/html; charset=UTF-8")
+        if path in site.files:
+            return self.send_file(site.file_content(site.files[path]))
+        if not path.startswith('/wp-json'):
+            return self.send_body(404, b"Not found", "text/plain")
+        route = path[len('/wp-json'):].rstrip('/') or '/'
+        if route == '/':
+            index = site.index()
+            if '_fields' in query:
+                fields = query['_fields'].split(',')
+                index = dict((k, v) for k, v in index.items() if k in fields)
+            return self.send_json(index)
+        for namespace in ['wp/v2', 'bench/v1']:
+            if route == '/' + namespace:
+                return self.send_json({'namespace': namespace, 'routes': dict(
+                    (k, v) for k, v in site.routes.items() if v['namespace'] == namespace)})
+        if route == '/wp/v2/types':
+            return self.send_json(site.types())
+        if route == '/wp/v2/taxonomies':
+            return self.send_json(site.taxonomies())
+        if route == '/bench/v1/settings':
+            return self.send_json({'enabled': True, 'items': site.items})
+        match = re.match(r'^/(?:wp/v2|bench/v1)/([a-z]+)(?:/(\d+))?(/revisions|/autosaves)?$', route)
+        if match is None or match.group(1) not in site.collections or \
+           (match.group(1) == 'items') != route.startswith('/bench/v1/'):
+            return self.send_error_json(404, 'rest_no_route',
+                "No route was found matching the URL and request method")
+        name = match.group(1)
+        if match.group(2) is not None:
+            obj = site.by_id[name].get(int(match.group(2)))
+            if obj is None:
+                return self.send_error_json(404, 'rest_post_invalid_id', "Invalid ID.")
+            if match.group(3) is not None:
+                return self.send_json([])
+            return self.send_json(obj)
+        return self.send_collection(site.collections[name], query)
+
+    def send_collection(self, objects, query):
+        """
+        Sends a page of a collection, filtered and ordered like WordPress does
+        """
+        site = self.server.site
+        try:
+            page = int(query.get('page', 1))
+            per_page = int(query.get('per_page', 10))
+        except ValueError:
+            return self.send_error_json(400, 'rest_invalid_param', "Invalid parameter(s)")
+        if per_page > site.max_per_page or per_page < 1 or page < 1:
+            return self.send_error_json(400, 'rest_invalid_param', "Invalid parameter(s): per_page")
+        if 'search' in query:
+            terms = query['search'].lower()
+            objects = [o for o in objects if terms in json.dumps(o).lower()]
+        if 'include' in query:
+            ids = set(int(i) for i in query['include'].split(',') if i.isdigit())
+            objects = [o for o in objects if o['id'] in ids]
+        if 'post' in query:
+            objects = [o for o in objects if str(o.get('post')) == query['post']]
+        if 'after' in query:
+            objects = [o for o in objects if o.get('date_gmt', "") > query['after'][:19]]
+        if 'before' in query:
+            objects = [o for o in objects if o.get('date_gmt', "") < query['before'][:19]]
+        # Newest first, as the default orderby=date&order=desc
+        objects = sorted(objects, key=lambda o: (o.get('date_gmt', ""), o['id']),
+            reverse=query.get('order', 'desc') == 'desc')
+        total = len(objects)
+        total_pages = (total + per_page - 1) // per_page
+        if page > max(total_pages, 1):
+            return self.send_error_json(400, 'rest_post_invalid_page_number',
+                "The page number requested is larger than the number of pages available.")
+        self.send_json(objects[(page - 1) * per_page:page * per_page],
+            headers={'X-WP-Total': total, 'X-WP-TotalPages': total_pages})
+
+    def send_file(self, content):
+        """
+        Sends a media file, honoring Range requests
+        """
+        etag = '"%s"' % hashlib.md5(content).hexdigest()
+        byte_range = re.match(r'^bytes=(\d+)-$', self.headers.get('Range', ""))
+        if byte_range is not None and self.headers.get('If-Range', etag) == etag:
+            start = int(byte_range.group(1))
+            if start >= len(content):
+                return self.send_body(416, b"", "image/jpeg",
+                    {'Content-Range': "bytes */%d" % len(content)})
+            return self.send_body(206, content[start:], "image/jpeg", {'ETag': etag,
+                'Content-Range': "bytes %d-%d/%d" % (start, len(content) - 1, len(content))})
+        self.send_body(200, content, "image/jpeg", {'ETag': etag, 'Accept-Ranges': 'bytes'})
+
+class MockServer(ThreadingHTTPServer):
+    """
+    HTTP server of a stand-in WordPress site, see MockSite
+    """
+    daemon_threads = True
+
+    def __init__(self, port=0, **options):
+        """
+        Binds the server to the loopback interface
+        param port: the port to listen on, 0 to pick a free one
+        param options: the options of the site, see SITE_OPTIONS
+        """
+        ThreadingHTTPServer.__init__(self, ('127.0.0.1', port), MockHandler)
+        self.url = "http://127.0.0.1:%d/" % self.server_address[1]
+        self.site = MockSite(self.url, **options)
+        self.lock = threading.Lock()
+        self.random = random.Random(self.site.seed)
+        self.requests = 0
+        self.errors = 0
+
+def add_site_arguments(parser):
+    """
+    Adds the options of the site to an argument parser
+    """
+    for name, option_type, default, description in SITE_OPTIONS:
+        parser.add_argument('--' + name.replace('_', '-'),
+                            dest=name,
+                            type=option_type,
+                            default=default,
+                            help='%s (default %s)' % (description, default))
+
+def site_options(args):
+    """
+    Returns the options of the site given by parsed arguments
+    """
+    return dict((name, getattr(args, name)) for name, _, _, _ in SITE_OPTIONS)
+
+def site_argv(options):
+    """
+    Returns the command line arguments giving the options of a site
+    """
+    argv = []
+    for name, value in options.items():
+        argv += ['--' + name.replace('_', '-'), str(value)]
+    return argv
+
+def main():
+    parser = argparse.ArgumentParser(description='Stand-in WordPress REST API '
+        'server used by the benchmarks')
+    parser.add_argument('--port',
+                        dest='port',
+                        type=int,
+                        default=0,
+                        help='port to listen on (default: a free port)')
+    add_site_arguments(parser)
+    args = parser.parse_args()
+    server = MockServer(args.port, **site_options(args))
+    # The first line gives the URL to the benchmark runner
+    print(server.url)
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,494 @@
+"""
+Copyright (c) 2018-2020 Mickaël "Kilawyn" Walter
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+import contextlib
+from statistics import median
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.mockserver import add_site_arguments, site_options, site_argv, \
+                                  SETUP_HEADER
+from lib.wpapi import WPApi
+from lib.exporter import Exporter
+from lib.requestsession import RequestSession
+from lib.requeststats import RequestStats
+from lib.traffic import TrafficRecorder, TrafficArchive
+from lib.utils import format_size
+
+class BenchmarkContext:
+    """
+    What the benchmarks share: the URL of the stand-in site, the number of
+    workers, a temporary folder and the data crawled once for the exports
+    """
+
+    def __init__(self, url, workers, folder, recorder=None, archive=None):
+        self.url = url
+        self.workers = workers
+        self.folder = folder
+        self.recorder = recorder
+        self.archive = archive
+        self.session = None
+        self.data = None
+
+    def new_session(self):
+        """
+        Returns a new RequestSession, recording or replaying the traffic if
+        requested
+        """
+        session = RequestSession()
+        session.set_recorder(self.recorder)
+        session.set_replay(self.archive)
+        return session
+
+    def scanner(self):
+        """
+        Returns a new WPApi with an empty cache and its own session, which
+        has already fetched the API index
+        """
+        self.session = self.new_session()
+        scanner = WPApi(self.url, session=self.session, workers=self.workers)
+        self.session.s.headers[SETUP_HEADER] = "1"
+        scanner.get_basic_info()
+        del self.session.s.headers[SETUP_HEADER]
+        self.session.stats = RequestStats()
+        return scanner
+
+    def crawled(self):
+        """
+        Returns the objects of the site, crawled on the first call
+        """
+        if self.data is None:
+            session = self.new_session()
+            session.s.headers[SETUP_HEADER] = "1"
+            scanner = WPApi(self.url, session=session, workers=self.workers)
+            posts = scanner.get_posts(comments=True)
+            self.data = {
+                'posts': posts,
+                'orphans': scanner.get_orphans_comments(),
+                'pages': scanner.get_pages(),
+                'users': scanner.get_users(),
+                'tags': scanner.get_tags(),
+                'categories': scanner.get_categories(),
+                'media': scanner.get_media(),
+                'comments': scanner.get_comments(),
+                'routes': list(scanner.iter_namespaces('all')),
+            }
+            self.data['urls'], _, self.data['media_ids'] = \
+                scanner.get_media_urls('all', with_ids=True)
+        return self.data
+
+    def output(self, name):
+        """
+        Returns a path of the temporary folder, removing what a previous run
+        left there
+        """
+        path = os.path.join(self.folder, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+        return path
+
+def output_size(path):
+    """
+    Returns the size of a file or of the files of a folder
+    """
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    size = 0
+    for folder, _, files in os.walk(path):
+        size += sum(os.path.getsize(os.path.join(folder, f)) for f in files)
+    return size
+
+# Each benchmark takes the context, prepares what is not measured and returns
+# the function to measure. This function returns the number of objects
+# processed and the path of the output, if any.
+
+def bench_crawl_pages(ctx):
+    scanner = ctx.scanner()
+    return lambda: (len(scanner.crawl_pages('wp/v2/posts', display_progress=False)[0]), None)
+
+def bench_get_posts_comments(ctx):
+    scanner = ctx.scanner()
+    def run():
+        posts = scanner.get_posts(comments=True)
+        comments = sum(len(p.get('comments', [])) for p in posts)
+        return len(posts) + comments + len(scanner.get_orphans_comments()), None
+    return run
+
+def bench_crawl_namespaces(ctx):
+    scanner = ctx.scanner()
+    def run():
+        routes = scanner.crawl_namespaces('all')
+        return sum(len(d) if type(d) is list else 1 for d in routes.values()), None
+    return run
+
+def bench_export(fmt, filename):
+    def prepare(ctx):
+        data = ctx.crawled()
+        path = ctx.output(filename)
+        def run():
+            count = Exporter.export_posts(data['posts'], fmt, path, data['tags'],
+                data['categories'], data['users'])
+            return count, Exporter.prepare_filename(path, fmt)
+        return run
+    return prepare
+
+def bench_export_sqlite(ctx):
+    data = ctx.crawled()
+    path = ctx.output("site.sqlite")
+    def run():
+        count = Exporter.write_sqlite(path, posts=data['posts'], pages=data['pages'],
+            users=data['users'], tags=data['tags'], categories=data['categories'],
+            media=data['media'], comments=data['comments'])
+        return count, path
+    return run
+
+def bench_export_ns(filename):
+    def prepare(ctx):
+        data = ctx.crawled()
+        path = ctx.output(filename)
+        fmt = Exporter.ns_export_format(path)
+        return lambda: (Exporter.export_crawled_ns(data['routes'], fmt, path), path)
+    return prepare
+
+def bench_export_html(folder):
+    def prepare(ctx):
+        data = ctx.crawled()
+        path = ctx.output(folder)
+        def run():
+            count = Exporter.export_posts_html(data['posts'], path, data['tags'],
+                data['categories'], data['users'])
+            return count, path
+        return run
+    return prepare
+
+def bench_export_comments(ctx):
+    data = ctx.crawled()
+    path = ctx.output("comments")
+    return lambda: (Exporter.export_comments(data['posts'], data['orphans'], path), path)
+
+def bench_download_media(ctx):
+    data = ctx.crawled()
+    path = ctx.output("media")
+    os.makedirs(path)
+    ctx.session = ctx.new_session()
+    def run():
+        count = Exporter.download_media(data['urls'], path, session=ctx.session,
+            workers=ctx.workers, ids=data['media_ids'])
+        return count, path
+    return run
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "WPJsonScraper.py")
+
+STARTUP_LAUNCHES = 5
+"""
+    The number of launches of the script in each run of a startup benchmark
+"""
+
+def bench_startup(*arguments):
+    """
+    Measures launches of WPJsonScraper.py, '{url}' being replaced by the URL
+    of the site in the arguments
+    """
+    def prepare(ctx):
+        if ctx.archive is not None:
+            raise RuntimeError("the startup benchmarks need the server")
+        command = [sys.executable, SCRIPT, '--no-color'] + \
+            [a.replace('{url}', ctx.url) for a in arguments]
+        def run():
+            for _ in range(STARTUP_LAUNCHES):
+                subprocess.run(command, stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL, check=True)
+            return STARTUP_LAUNCHES, None
+        return run
+    return prepare
+
+BENCHMARKS = [
+    ('crawl_pages', bench_crawl_pages),
+    ('get_posts_comments', bench_get_posts_comments),
+    ('crawl_namespaces', bench_crawl_namespaces),
+    ('export_posts_json', bench_export(Exporter.JSON, "posts.json")),
+    ('export_posts_json_gz', bench_export(Exporter.JSON, "posts.json.gz")),
+    ('export_posts_csv', bench_export(Exporter.CSV, "posts.csv")),
+    ('export_sqlite', bench_export_sqlite),
+    ('export_ns_json', bench_export_ns("ns.json")),
+    ('export_ns_ndjson', bench_export_ns("ns.ndjson")),
+    ('export_posts_html', bench_export_html("posts")),
+    ('export_posts_html_tar_gz', bench_export_html("posts.tar.gz")),
+    ('export_comments', bench_export_comments),
+    ('download_media', bench_download_media),
+    ('startup_version', bench_startup('--version')),
+    ('startup_info', bench_startup('-i', '{url}')),
+]
+"""
+    The benchmarks, in the order they are run
+"""
+
+SUBPROCESS_BENCHMARKS = ['startup_version', 'startup_info']
+"""
+    The benchmarks running in other processes, whose memory is not traced
+"""
+
+def measure(ctx, prepare, repeat, trace_memory=True):
+    """
+    Runs a benchmark repeat times, then once more with tracemalloc to get
+    its peak of memory
+    param ctx: the BenchmarkContext
+    param prepare: the function preparing the benchmark
+    param repeat: the number of timed runs
+    param trace_memory: whether to make the run measuring the memory
+    return: the results as a dict
+    """
+    times = []
+    result = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            ctx.session = None
+            run = prepare(ctx)
+            start = time.perf_counter()
+            items, path = run()
+            times.append(time.perf_counter() - start)
+            if ctx.session is not None:
+                total = ctx.session.stats.summary()['total']
+                result['requests'] = total['requests']
+                result['errors'] = total['errors']
+                result['bytes_received'] = total['bytes']
+                result['latency_p50'] = total['p50']
+                result['latency_p95'] = total['p95']
+            if path is not None:
+                result['bytes_written'] = output_size(path)
+        if trace_memory:
+            run = prepare(ctx)
+            tracemalloc.start()
+            try:
+                run()
+                result['peak_memory'] = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+    result.update({
+        'runs': times,
+        'best': min(times),
+        'median': median(times),
+        'items': items,
+        'items_per_second': items / median(times) if median(times) > 0 else None,
+    })
+    return result
+
+def start_server(options):
+    """
+    Starts the stand-in site in another process, so that it does not weigh
+    on the measures
+    return: the process and the URL of the site
+    """
+    server = subprocess.Popen([sys.executable,
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "mockserver.py")] +
+        site_argv(options), stdout=subprocess.PIPE, universal_newlines=True)
+    url = server.stdout.readline().strip()
+    if not url.startswith("http"):
+        server.kill()
+        raise RuntimeError("The benchmark server did not start")
+    return server, url
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def display_results(results, baseline=None, threshold=0.2):
+    """
+    Displays the results, compared to a baseline if given
+    return: the names of the benchmarks slower than the baseline by more than
+    the threshold
+    """
+    regressions = []
+    print()
+    print("%-26s %9s %9s %11s %7s %9s %10s %8s" % ("Benchmark", "Best (s)", "Median",
+        "Items/s", "Reqs", "p95 (ms)", "Peak mem", "Change"))
+    for name, result in results['benchmarks'].items():
+        if 'error' in result:
+            print("%-26s failed: %s" % (name, result['error']))
+            continue
+        change = ""
+        previous = None
+        if baseline is not None:
+            previous = baseline['benchmarks'].get(name)
+        if previous is not None and 'median' in previous and previous['median'] > 0:
+            ratio = result['median'] / previous['median'] - 1
+            change = "%+.0f%%" % (ratio * 100)
+            if ratio > threshold:
+                regressions.append(name)
+                change += " !"
+        p95 = result.get('latency_p95')
+        print("%-26s %9.3f %9.3f %11.0f %7s %9s %10s %8s" % (name, result['best'],
+            result['median'], result['items_per_second'] or 0, result.get('requests', "-"),
+            "-" if p95 is None else "%.1f" % (p95 * 1000),
+            format_size(result['peak_memory']) if 'peak_memory' in result else "-", change))
+    print()
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks of WPJsonScraper '
+        'against a local stand-in WordPress site')
+    parser.add_argument('-o', '--output',
+                        dest='output',
+                        action='store',
+                        help='write the results to OUTPUT (JSON), by default '
+                        'benchmarks/results/<date>.json')
+    parser.add_argument('--compare',
+                        dest='baseline',
+                        action='store',
+                        help='compare the results to those of a previous run '
+                        'and exit with status 1 on regressions')
+    parser.add_argument('--threshold',
+                        dest='threshold',
+                        type=float,
+                        default=0.2,
+                        help='slowdown of the median time regarded as a '
+                        'regression (default 0.2 for 20%%)')
+    parser.add_argument('-r', '--repeat',
+                        dest='repeat',
+                        type=int,
+                        default=3,
+                        help='number of timed runs of each benchmark (default 3)')
+    parser.add_argument('--workers',
+                        dest='workers',
+                        type=int,
+                        default=4,
+                        help='number of parallel connections (default 4)')
+    parser.add_argument('-b', '--bench',
+                        dest='only',
+                        action='append',
+                        help='run only the given benchmark (can be repeated)')
+    parser.add_argument('--record',
+                        dest='record_file',
+                        action='store',
+                        help='record the HTTP exchanges with the server to '
+                        'RECORD_FILE')
+    parser.add_argument('--record-media',
+                        dest='record_media',
+                        action='store_true',
+                        help='with --record, also record the content of the '
+                        'downloaded media, needed to replay download_media')
+    parser.add_argument('--replay',
+                        dest='replay_file',
+                        action='store',
+                        help='replay the exchanges of REPLAY_FILE instead of '
+                        'starting the server, the site options are ignored')
+    parser.add_argument('-l', '--list',
+                        dest='list',
+                        action='store_true',
+                        help='list the benchmarks and exit')
+    add_site_arguments(parser)
+    args = parser.parse_args()
+
+    names = [name for name, _ in BENCHMARKS]
+    if args.list:
+        print("\n".join(names))
+        return 0
+    if args.only is not None:
+        unknown = [name for name in args.only if name not in names]
+        if len(unknown) > 0:
+            parser.error("unknown benchmark(s): %s" % ", ".join(unknown))
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline, "rt", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    options = site_options(args)
+    results = {
+        'date': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'options': dict(options, repeat=args.repeat, workers=args.workers),
+        'benchmarks': {},
+    }
+    server = None
+    archive = None
+    recorder = None
+    if args.replay_file is not None:
+        archive = TrafficArchive(args.replay_file)
+        url = archive.target
+        results['options'] = dict(replay=args.replay_file, repeat=args.repeat,
+            workers=args.workers)
+    else:
+        server, url = start_server(options)
+        if args.record_file is not None:
+            recorder = TrafficRecorder(args.record_file, url,
+                stream_bodies=args.record_media)
+    folder = tempfile.mkdtemp(prefix="wpjson-bench-")
+    try:
+        ctx = BenchmarkContext(url, args.workers, folder, recorder, archive)
+        for name, prepare in BENCHMARKS:
+            if args.only is not None and name not in args.only:
+                continue
+            sys.stderr.write("Running %s\n" % name)
+            try:
+                results['benchmarks'][name] = measure(ctx, prepare, args.repeat,
+                    name not in SUBPROCESS_BENCHMARKS)
+            except Exception as e:
+                error = type(e).__name__
+                if str(e) != "":
+                    error += ": %s" % e
+                results['benchmarks'][name] = {'error': error}
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        if recorder is not None:
+            recorder.close()
+        shutil.rmtree(folder, ignore_errors=True)
+
+    output = args.output
+    if output is None:
+        output = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results",
+            time.strftime("%Y%m%d-%H%M%S") + ".json")
+    if os.path.dirname(output) != "":
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "wt", encoding="utf-8") as f:
+        json.dump(results, f, indent=4)
+
+    regressions = display_results(results, baseline, args.threshold)
+    print("Results written to %s" % output)
+    if len(regressions) > 0:
+        print("Regressions: %s" % ", ".join(regressions))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -20,6 +20,11 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import os
+import sys
+import threading
+
+from lib.eventlog import EventLog
 
 class Console:
     """
@@ -29,6 +34,11 @@ class Console:
     blue = "\033[94m"
     green = "\033[92m"
     red = "\033[31m"
+    status = None
+    """
+        The text of the status line (e.g. a progress bar) currently displayed
+    """
+    status_lock = threading.RLock()
 
     @staticmethod
     def wipe_color():
@@ -40,14 +50,53 @@ class Console:
         Console.green = ""
         Console.red = ""
 
+    @staticmethod
+    def write(text, stream=None):
+        """
+        Writes a text to the standard output, below which the status line
+        stays. If the reader of the output went away (e.g. a pager or head
+        exited), the rest of the output is dropped instead of failing.
+        param text: the text to write
+        param stream: the stream to write to, sys.stdout by default
+        return: False if the output is closed, True otherwise
+        """
+        if stream is None:
+            stream = sys.stdout
+        try:
+            with Console.status_lock:
+                Console.hide_status()
+                stream.write(text)
+                stream.flush()
+                Console.restore_status()
+        except BrokenPipeError:
+            Console.drop_output(stream)
+            return False
+        return True
+
+    @staticmethod
+    def drop_output(stream=None):
+        """
+        Sends everything written later to a stream whose reader went away to
+        the null device, so that neither the next writes nor the final flush
+        at exit fail
+        param stream: the stream to drop, sys.stdout by default
+        """
+        if stream is None:
+            stream = sys.stdout
+        try:
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, stream.fileno())
+            os.close(devnull)
+        except (OSError, ValueError, AttributeError):
+            pass
+
     @staticmethod
     def log_info(text):
         """
         Prints information log to the console
         param text: the text to display
         """
-        print()
-        print(Console.blue + "[*] " + text + Console.normal)
+        Console.write("\n" + Console.blue + "[*] " + text + Console.normal + "\n")
 
     @staticmethod
     def log_error(text):
@@ -55,8 +104,52 @@ class Console:
         Prints error log to the console
         param text: the text to display
         """
-        print()
-        print(Console.red + "[!] " + text + Console.normal)
+        EventLog.emit('error', message=text)
+        Console.write("\n" + Console.red + "[!] " + text + Console.normal + "\n")
+
+    @staticmethod
+    def show_status(text):
+        """
+        Displays a text on the status line, below the regular output, in
+        place of the previous status
+        param text: the text to display
+        """
+        with Console.status_lock:
+            padding = ""
+            if Console.status is not None and len(Console.status) > len(text):
+                padding = " " * (len(Console.status) - len(text))
+            Console.status = text
+            sys.stderr.write("\r" + text + padding + "\r")
+            sys.stderr.flush()
+
+    @staticmethod
+    def hide_status():
+        """
+        Erases the status line, before some regular output is written
+        """
+        with Console.status_lock:
+            if Console.status is not None:
+                sys.stderr.write("\r" + " " * len(Console.status) + "\r")
+                sys.stderr.flush()
+
+    @staticmethod
+    def restore_status():
+        """
+        Displays the status line again after some regular output
+        """
+        with Console.status_lock:
+            if Console.status is not None:
+                sys.stderr.write("\r" + Console.status + "\r")
+                sys.stderr.flush()
+
+    @staticmethod
+    def clear_status():
+        """
+        Erases the status line for good (e.g. after an interrupted crawl)
+        """
+        with Console.status_lock:
+            Console.hide_status()
+            Console.status = None
 
     @staticmethod
     def log_success(text):
@@ -64,4 +157,54 @@ class Console:
         Prints error log to the console
         param text: the text to display
         """
-        print(Console.green + "[+] " + text + Console.normal)
+        Console.write(Console.green + "[+] " + text + Console.normal + "\n")
+
+class BufferedOutput:
+    """
+    Text stream standing for the standard output while displaying large
+    amounts of data: the text is collected and written by chunks, so that
+    long outputs cost a few system calls and still reach a pager as they are
+    rendered
+    """
+    CHUNK_SIZE = 64 * 1024
+    """
+        The number of characters collected before writing them
+    """
+
+    def __init__(self, stream, chunk_size=CHUNK_SIZE):
+        """
+        Creates a buffer in front of a stream
+        param stream: the stream to write to (e.g. sys.stdout)
+        param chunk_size: the number of characters written at once
+        """
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.parts = []
+        self.size = 0
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def write(self, text):
+        with self.lock:
+            self.parts.append(text)
+            self.size += len(text)
+            full = self.size >= self.chunk_size
+        if full:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        with self.lock:
+            if len(self.parts) == 0:
+                return
+            data = "".join(self.parts)
+            self.parts = []
+            self.size = 0
+        if self.closed:
+            return
+        # The pager (or head...) exited, the rest of the output is dropped
+        if not Console.write(data, self.stream):
+            self.closed = True
+
+    def isatty(self):
+        return self.stream.isatty()
@@ -0,0 +1,52 @@
+"""
+Copyright (c) 2018-2020 Mickaël "Kilawyn" Walter
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# Default values shared by the command line and the modules implementing the
+# actions, kept free of imports so that the parser can be built without them
+
+COMPRESSIONS = ['gz', 'xz', 'bz2']
+"""
+    Supported compression formats, named after their file extension
+"""
+
+DEFAULT_WORKERS = 4
+"""
+    The default number of parallel connections of crawls and downloads
+"""
+
+SHARD_SIZE = 1000
+"""
+    The default maximum number of entries of a date window when crawling with
+    shards
+"""
+
+PROBE_MISSES = 20
+"""
+    The default number of consecutive missing IDs after which ID probing jumps
+    to the next known ID or stops
+"""
+
+PROBE_MAX = 10000
+"""
+    The default highest ID probed, unless the known IDs go further, so that
+    routes answering for any ID are not probed forever
+"""
@@ -0,0 +1,404 @@
+"""
+Copyright (c) 2018-2020 Mickaël "Kilawyn" Walter
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import json
+import time
+import threading
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib import parse as urlparse
+
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
+
+from lib import defaults
+from lib.console import Console
+from lib.mediastore import MediaStore
+from lib.requestsession import RequestSession, HTTPError416
+from lib.progress import Progress
+
+class MediaDownloader:
+    """
+        Downloads media files concurrently over a shared session.
+
+        Partial files are kept with a .part suffix and resumed with HTTP Range
+        requests, made conditional (If-Range) on the ETag or Last-Modified date
+        of the first response so that a changed file is fetched again. A state
+        file in the output folder remembers the size and validators of every
+        completed or partial file so that a new run skips or resumes them.
+    """
+    DEFAULT_WORKERS = defaults.DEFAULT_WORKERS
+    """
+        The default number of parallel downloads
+    """
+    MIN_CHUNK_SIZE = 64 * 1024
+    """
+        The initial (and minimal) size of chunks read from the network
+    """
+    MAX_CHUNK_SIZE = 4 * 1024 * 1024
+    """
+        The maximal size of chunks read from the network
+    """
+    STATE_FILE = ".wpjsonscraper-media.json"
+    """
+        The name of the file keeping track of completed downloads
+    """
+    PART_SUFFIX = ".part"
+    """
+        The suffix of files being downloaded
+    """
+    LARGE_FILE_SIZE = 4 * 1024 * 1024
+    """
+        The size from which the progress of a single file is reported
+    """
+    SKIPPED = 0
+    DOWNLOADED = 1
+    FAILED = 2
+    LINKED = 3
+
+    def __init__(self, session=None, workers=DEFAULT_WORKERS, blob_store=None):
+        """
+            Creates a new MediaDownloader
+
+            :param session: the RequestSession to use (proxy, cookies and authentication are kept)
+            :param workers: the number of parallel downloads
+            :param blob_store: the folder of a MediaStore to deduplicate files in, if any
+        """
+        self.s = session if session is not None else RequestSession()
+        self.workers = max(1, workers)
+        self.store = None
+        if blob_store is not None:
+            self.store = MediaStore(blob_store)
+        self.s.set_max_connections(max(self.workers, 10))
+        self.state = {}
+        self.bytes_downloaded = 0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.progress = None
+
+    def load_state(self, output_folder):
+        """
+            Loads the state file of the output folder, if any
+        """
+        self.state = {}
+        try:
+            with open(os.path.join(output_folder, MediaDownloader.STATE_FILE), "rt", encoding="utf-8") as f:
+                self.state = json.load(f)
+        except (IOError, ValueError):
+            pass
+
+    def save_state(self, output_folder):
+        """
+            Atomically writes the state file of the output folder
+        """
+        state_file = os.path.join(output_folder, MediaDownloader.STATE_FILE)
+        with open(state_file + ".tmp", "wt", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(state_file + ".tmp", state_file)
+
+    @staticmethod
+    def local_folder(url, output_folder):
+        """
+            Returns the local folder mirroring the URL path (e.g. wp-content/uploads/2020/01)
+        """
+        http_path = urlparse.urlparse(url).path.split("/")
+        local_path = output_folder
+        for el in http_path[:-1]:
+            if el not in ["", ".", ".."]:
+                local_path = os.path.join(local_path, el)
+        return local_path, http_path[-1]
+
+    def local_path(self, url, output_folder, slug=None, content_type=None):
+        """
+            Computes the local path of a media file
+
+            :param url: the URL of the media
+            :param output_folder: the destination folder
+            :param slug: the slug to use as filename, if any
+            :param content_type: the Content-Type of the response, used to guess the extension of slugs
+            :return: the path of the file, or None if the slug extension can't be guessed yet
+        """
+        folder, filename = MediaDownloader.local_folder(url, output_folder)
+        if slug is None:
+            return os.path.join(folder, filename)
+        if content_type is None:
+            return None
+        ext = mimetypes.guess_extension(content_type.split(';')[0].strip())
+        return os.path.join(folder, slug + (ext if ext is not None else ""))
+
+    def download(self, media, output_folder, slugs=None, ids=None):
+        """
+            Downloads the media files based on the given URLs
+
+            :param media: the URLs as a list
+            :param output_folder: the path to the folder where the files are being saved, it is assumed as existing
+            :param slugs: list of slugs to associate with media. The list must be ordered the same as media and should be the same size
+            :param ids: list of media IDs, ordered the same as media, recorded in the blob store manifest
+            :return: the number of files available in the output folder
+        """
+        self.load_state(output_folder)
+        self.bytes_downloaded = 0
+        self.stop_event.clear()
+        results = {MediaDownloader.SKIPPED: 0, MediaDownloader.DOWNLOADED: 0,
+                   MediaDownloader.FAILED: 0, MediaDownloader.LINKED: 0}
+        last_save = time.time()
+        self.progress = Progress.start("media", total=len(media))
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        futures = []
+        try:
+            for i in range(0, len(media)):
+                slug = slugs[i] if slugs is not None else None
+                media_id = ids[i] if ids is not None else None
+                futures.append(executor.submit(self.download_one, media[i], output_folder, slug, media_id))
+            pending = set(futures)
+            while len(pending) > 0:
+                done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in done:
+                    status, url, entry = future.result()
+                    results[status] += 1
+                    self.progress.advance()
+                    if entry is not None:
+                        self.state[url] = entry
+                if time.time() - last_save > 5:
+                    self.save_state(output_folder)
+                    if self.store is not None:
+                        self.store.save()
+                    last_save = time.time()
+        except KeyboardInterrupt:
+            self.stop_event.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+            # The validators of the partial files are needed to resume them
+            for future in futures:
+                if future.done() and not future.cancelled() and future.exception() is None:
+                    status, url, entry = future.result()
+                    if entry is not None:
+                        self.state[url] = entry
+            Console.log_error("Download interrupted, partial files will be resumed next time")
+        finally:
+            executor.shutdown(wait=True)
+            self.progress.close()
+            self.save_state(output_folder)
+            if self.store is not None:
+                self.store.save()
+        if results[MediaDownloader.SKIPPED] > 0:
+            print("%d files already downloaded were skipped" % results[MediaDownloader.SKIPPED])
+        if results[MediaDownloader.LINKED] > 0:
+            print("%d files were linked from the blob store without downloading" %
+                results[MediaDownloader.LINKED])
+        if results[MediaDownloader.FAILED] > 0:
+            Console.log_error("%d files could not be downloaded" % results[MediaDownloader.FAILED])
+        return results[MediaDownloader.SKIPPED] + results[MediaDownloader.DOWNLOADED] + \
+            results[MediaDownloader.LINKED]
+
+    def download_one(self, url, output_folder, slug=None, media_id=None):
+        """
+            Downloads a single media file, resuming or skipping it if possible.
+
+            :param url: the URL of the media
+            :param output_folder: the destination folder
+            :param slug: the slug to use as filename, if any
+            :param media_id: the ID of the media, if known
+            :return: a tuple (status, url, state entry)
+        """
+        entry = self.state.get(url)
+        if entry is not None:
+            path = os.path.join(output_folder, entry['path'])
+            # The file may have been saved under another name (e.g. without slug)
+            expected = self.local_path(url, output_folder, slug, entry.get('content_type'))
+            if path == expected and os.path.isfile(path) and \
+               os.path.getsize(path) == entry['size']:
+                return (MediaDownloader.SKIPPED, url, entry)
+
+        if self.store is not None:
+            blob = self.store.lookup(url, media_id)
+            path = None
+            if blob is not None:
+                # None if the extension of the slug is unknown, the file is downloaded
+                path = self.local_path(url, output_folder, slug, blob['content_type'])
+            if path is not None:
+                try:
+                    self.store.materialize(blob['digest'], path)
+                    return (MediaDownloader.LINKED, url,
+                        self.state_entry(path, output_folder, None, None, blob['content_type']))
+                except IOError:
+                    return (MediaDownloader.FAILED, url, None)
+
+        path = self.local_path(url, output_folder, slug,
+            entry.get('content_type') if entry is not None else None)
+        # Range offsets are byte offsets of the stored representation, a
+        # compressed transfer would not match the bytes written to the file
+        headers = {'Accept-Encoding': 'identity'}
+        offset = 0
+        validator = MediaDownloader.validator(entry)
+        if path is not None and os.path.isfile(path + MediaDownloader.PART_SUFFIX) and \
+           validator is not None:
+            # Without validator, a changed file could not be told apart and
+            # the download starts again from zero
+            offset = os.path.getsize(path + MediaDownloader.PART_SUFFIX)
+            headers['Range'] = 'bytes=%d-' % offset
+            headers['If-Range'] = validator
+
+        try:
+            r = self.s.get(url, headers=headers, stream=True)
+        except HTTPError416:
+            # The partial file already holds every byte
+            content_type = entry.get('content_type') if entry is not None else None
+            try:
+                hasher = None
+                if self.store is not None:
+                    hasher = MediaStore.new_hash()
+                    MediaStore.hash_file(path + MediaDownloader.PART_SUFFIX, hasher)
+                self.complete(path, url, media_id, content_type, hasher)
+                return (MediaDownloader.DOWNLOADED, url, self.state_entry(path, output_folder,
+                    entry.get('etag'), entry.get('last_modified'), content_type))
+            except IOError:
+                return (MediaDownloader.FAILED, url, None)
+        except Exception:
+            return (MediaDownloader.FAILED, url, None)
+
+        file_progress = None
+        partial_entry = None
+        try:
+            if r.status_code not in [200, 206]:
+                return (MediaDownloader.FAILED, url, None)
+            content_type = r.headers.get('Content-Type')
+            if path is None:
+                path = self.local_path(url, output_folder, slug, content_type)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Servers may still compress the body, its length and offsets then
+            # do not match the decoded bytes written to the file
+            encoded = r.headers.get('Content-Encoding', 'identity').lower() != 'identity'
+            if encoded and r.status_code == 206:
+                os.remove(path + MediaDownloader.PART_SUFFIX)
+                return (MediaDownloader.FAILED, url, None)
+
+            mode = "wb"
+            if r.status_code == 206:
+                mode = "ab"
+            else:
+                offset = 0
+            total = None
+            if 'Content-Length' in r.headers and not encoded:
+                total = offset + int(r.headers['Content-Length'])
+
+            if entry is None and r.status_code == 200 and total is not None and \
+               os.path.isfile(path) and os.path.getsize(path) == total:
+                # Downloaded by a previous run without state, no need to read the body
+                return (MediaDownloader.SKIPPED, url, self.state_entry(path, output_folder,
+                    r.headers.get('ETag'), r.headers.get('Last-Modified'), content_type))
+            if r.status_code == 200:
+                etag, last_modified = r.headers.get('ETag'), r.headers.get('Last-Modified')
+            else:
+                # A partial content is only sent when the validators matched
+                etag, last_modified = entry.get('etag'), entry.get('last_modified')
+            partial_entry = {
+                'path': os.path.relpath(path, output_folder),
+                'size': total,
+                'etag': etag,
+                'last_modified': last_modified,
+                'content_type': content_type
+            }
+
+            hasher = None
+            if self.store is not None:
+                hasher = MediaStore.new_hash()
+                if mode == "ab":
+                    MediaStore.hash_file(path + MediaDownloader.PART_SUFFIX, hasher)
+
+            chunk_size = MediaDownloader.MIN_CHUNK_SIZE
+            if total is not None and total >= MediaDownloader.LARGE_FILE_SIZE:
+                file_progress = Progress.start(os.path.basename(path), total_bytes=total)
+                file_progress.advance(0, offset)
+            with open(path + MediaDownloader.PART_SUFFIX, mode) as f:
+                while not self.stop_event.is_set():
+                    chunk_start = time.time()
+                    chunk = r.raw.read(chunk_size, decode_content=True)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    if hasher is not None:
+                        hasher.update(chunk)
+                    with self.lock:
+                        self.bytes_downloaded += len(chunk)
+                    self.progress.advance(0, len(chunk))
+                    if file_progress is not None:
+                        file_progress.advance(0, len(chunk))
+                    # Grow the chunks on fast links, shrink them when they stall
+                    chunk_time = time.time() - chunk_start
+                    if chunk_time < 0.1 and chunk_size < MediaDownloader.MAX_CHUNK_SIZE:
+                        chunk_size *= 2
+                    elif chunk_time > 1 and chunk_size > MediaDownloader.MIN_CHUNK_SIZE:
+                        chunk_size //= 2
+            if self.stop_event.is_set() or (total is not None and
+               os.path.getsize(path + MediaDownloader.PART_SUFFIX) < total):
+                # Interrupted or truncated transfer, the .part file will be
+                # resumed next time
+                return (MediaDownloader.FAILED, url, partial_entry)
+            self.complete(path, url, media_id, content_type, hasher)
+            return (MediaDownloader.DOWNLOADED, url, self.state_entry(path, output_folder,
+                etag, last_modified, content_type))
+        except (IOError, ProtocolError, ReadTimeoutError):
+            # The validators are kept if the transfer broke, to resume it
+            return (MediaDownloader.FAILED, url, partial_entry)
+        finally:
+            if file_progress is not None:
+                file_progress.close()
+            r.close()
+
+    @staticmethod
+    def validator(entry):
+        """
+            Returns the validator sent in If-Range to resume a partial file:
+            its strong ETag or else its Last-Modified date, None if there is
+            none (weak ETags are not allowed in If-Range)
+        """
+        if entry is None:
+            return None
+        etag = entry.get('etag')
+        if etag is not None and not etag.startswith('W/'):
+            return etag
+        return entry.get('last_modified')
+
+    def complete(self, path, url, media_id, content_type, hasher):
+        """
+            Moves a completed .part file to its final location, through the
+            blob store if deduplication is enabled
+        """
+        if self.store is None:
+            os.replace(path + MediaDownloader.PART_SUFFIX, path)
+            return
+        digest = hasher.hexdigest()
+        self.store.add(path + MediaDownloader.PART_SUFFIX, digest, url, media_id, content_type)
+        self.store.materialize(digest, path)
+
+    @staticmethod
+    def state_entry(path, output_folder, etag, last_modified, content_type):
+        """
+            Builds the state entry of a completed file
+        """
+        return {
+            'path': os.path.relpath(path, output_folder),
+            'size': os.path.getsize(path),
+            'etag': etag,
+            'last_modified': last_modified,
+            'content_type': content_type
+        }
@@ -0,0 +1,150 @@
+"""
+Copyright (c) 2018-2020 Mickaël "Kilawyn" Walter
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+class Endpoint:
+    """
+        Describes a collection of the WordPress API and how it is handled
+    """
+    TYPE = "type"
+    """
+        Post type collection (posts, pages, custom post types...)
+    """
+    TAXONOMY = "taxonomy"
+    """
+        Taxonomy term collection (tags, categories, custom taxonomies...)
+    """
+    OTHER = "other"
+    """
+        Any other collection (users, comments...)
+    """
+
+    def __init__(self, key, name, plural, rest_base, kind, cache=None,
+                 namespace="wp/v2"):
+        """
+            Creates a new endpoint description
+
+            :param key: the identifier of the type (a WPApi constant for built-in types, the slug for custom ones)
+            :param name: the name of a single object, as used in commands
+            :param plural: the name of the collection, as used in commands
+            :param rest_base: the base of the collection route
+            :param kind: TYPE, TAXONOMY or OTHER
+            :param cache: the WPApi attribute holding the cache, None to use the cache of custom types
+            :param namespace: the namespace of the collection route
+        """
+        self.key = key
+        self.name = name
+        self.plural = plural
+        self.rest_base = rest_base
+        self.kind = kind
+        self.cache = cache
+        self.namespace = namespace
+
+    @property
+    def path(self):
+        """
+            The collection route, relative to the API root
+        """
+        return self.namespace + "/" + self.rest_base
+
+    def is_custom(self):
+        return self.cache is None
+
+class EndpointRegistry:
+    """
+        The collections known for a target: the built-in ones, completed by
+        the custom post types and taxonomies published by wp/v2/types and
+        wp/v2/taxonomies
+    """
+    IGNORED_SLUGS = ['nav_menu_item', 'wp_block', 'wp_template',
+        'wp_template_part', 'wp_navigation', 'wp_global_styles',
+        'wp_font_family', 'wp_font_face', 'nav_menu', 'wp_pattern_category',
+        'wp_template_part_area', 'wp_theme']
+    """
+        Internal post types and taxonomies of WordPress, of no interest or
+        only available to editors
+    """
+
+    def __init__(self, endpoints):
+        """
+            Creates a registry
+
+            :param endpoints: the built-in endpoints
+        """
+        self.endpoints = {}
+        for endpoint in endpoints:
+            self.add(endpoint)
+
+    def add(self, endpoint):
+        self.endpoints[endpoint.key] = endpoint
+
+    def get(self, key):
+        """
+            Returns the endpoint of the given type or None
+        """
+        return self.endpoints.get(key)
+
+    def find(self, name):
+        """
+            Returns the endpoint having the given name, plural name or REST
+            base, or None
+        """
+        for endpoint in self.endpoints.values():
+            if name in [endpoint.name, endpoint.plural, endpoint.rest_base]:
+                return endpoint
+        return None
+
+    def all(self):
+        return list(self.endpoints.values())
+
+    def custom(self):
+        """
+            Returns the endpoints of custom post types and taxonomies
+        """
+        return [e for e in self.endpoints.values() if e.is_custom()]
+
+    def load(self, types, taxonomies):
+        """
+            Registers the custom post types and taxonomies, as returned by
+            wp/v2/types and wp/v2/taxonomies
+
+            :param types: the post types as a dict (slug -> type), or None
+            :param taxonomies: the taxonomies as a dict (slug -> taxonomy), or None
+        """
+        known_paths = [e.path for e in self.endpoints.values()]
+        for objects, kind in [(types, Endpoint.TYPE), (taxonomies, Endpoint.TAXONOMY)]:
+            if type(objects) is not dict:
+                continue
+            for slug, obj in objects.items():
+                if type(obj) is not dict or slug in EndpointRegistry.IGNORED_SLUGS:
+                    continue
+                rest_base = obj.get('rest_base')
+                if type(rest_base) is not str or len(rest_base) == 0:
+                    continue
+                namespace = obj.get('rest_namespace')
+                if type(namespace) is not str or len(namespace) == 0:
+                    namespace = "wp/v2"
+                endpoint = Endpoint(slug, slug, rest_base, rest_base, kind,
+                    namespace=namespace)
+                if endpoint.path in known_paths or slug in self.endpoints.keys():
+                    continue
+                self.add(endpoint)
+                known_paths.append(endpoint.path)
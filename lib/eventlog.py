@@ -0,0 +1,103 @@
+"""
+Copyright (c) 2018-2020 Mickaël "Kilawyn" Walter
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+import json
+import time
+import threading
+
+class EventLog:
+    """
+    Writes the events of a scan (requests, pages, exports, errors) to a file,
+    one JSON object per line.
+
+    Events are buffered and the file is flushed at most every FLUSH_INTERVAL
+    seconds, so the log can be kept enabled on long scans. Nothing is done
+    while no file is opened.
+    """
+    FLUSH_INTERVAL = 1
+    """
+        The maximum number of seconds between two writes of the buffer
+    """
+    file = None
+    buffer = []
+    last_flush = 0
+    lock = threading.RLock()
+
+    @staticmethod
+    def open(filename):
+        """
+        Starts logging the events to a file (appended if it exists)
+        param filename: the path of the NDJSON file
+        """
+        EventLog.close()
+        EventLog.file = open(filename, "a", encoding="utf-8")
+        EventLog.last_flush = time.time()
+
+    @staticmethod
+    def enabled():
+        return EventLog.file is not None
+
+    @staticmethod
+    def emit(event, **fields):
+        """
+        Logs an event
+        param event: the name of the event (e.g. request_finished)
+        param fields: the data of the event, JSON serializable
+        """
+        if EventLog.file is None:
+            return
+        now = time.time()
+        record = {'ts': round(now, 6), 'event': event}
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':'),
+            default=str)
+        with EventLog.lock:
+            EventLog.buffer.append(line)
+            if now - EventLog.last_flush >= EventLog.FLUSH_INTERVAL:
+                EventLog.flush()
+
+    @staticmethod
+    def flush():
+        """
+        Writes the buffered events to the file
+        """
+        with EventLog.lock:
+            if EventLog.file is None:
+                return
+            if len(EventLog.buffer) > 0:
+                EventLog.file.write("\n".join(EventLog.buffer) + "\n")
+                EventLog.buffer = []
+            EventLog.file.flush()
+            EventLog.last_flush = time.time()
+
+    @staticmethod
+    def close():
+        """
+        Writes the remaining events and closes the file
+        """
+        with EventLog.lock:
+            if EventLog.file is None:
+                return
+            EventLog.flush()
+            EventLog.file.close()
+            EventLog.file = None
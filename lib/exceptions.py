@@ -37,3 +37,9 @@ class NSNotFoundException (Exception):
     The specified namespace does not exist
     """
     pass
+
+class CrawlInterrupted (Exception):
+    """
+    The crawl was stopped by the consumer of its objects
+    """
+    pass
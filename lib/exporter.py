@@ -26,12 +26,13 @@ import html
 import json
 import csv
 from datetime import datetime
-from urllib import parse as urlparse
-import mimetypes
-import requests
 
 from lib.console import Console
-from lib.utils import get_by_id, print_progress_bar
+from lib.eventlog import EventLog
+from lib.downloader import MediaDownloader
+from lib.sqliteexporter import SQLiteExporter
+from lib.output import ExportFolder, open_output, split_compression
+from lib.utils import get_by_id
 
 class Exporter:
     """
@@ -45,56 +46,36 @@ class Exporter:
     """
         Represents the CSV format for format choice
     """
-    CHUNK_SIZE = 2048
+    SQLITE = 3
     """
-        The size of chunks to download large files
+        Represents the SQLite format for format choice
+    """
+    NDJSON = 4
+    """
+        Represents the newline-delimited JSON format (one object per line) for format choice
+    """
+    FORMAT_NAMES = {JSON: 'json', CSV: 'csv', SQLITE: 'sqlite', NDJSON: 'ndjson'}
+    """
+        The names of the formats, as written to the event log
     """
 
     @staticmethod
-    def download_media(media, output_folder, slugs=None):
+    def download_media(media, output_folder, slugs=None, session=None,
+    workers=MediaDownloader.DEFAULT_WORKERS, ids=None, blob_store=None):
         """
             Downloads the media files based on the given URLs
             
             :param media: the URLs as a list
             :param output_folder: the path to the folder where the files are being saved, it is assumed as existing
             :param slugs: list of slugs to associate with media. The list must be ordered the same as media and should be the same size
+            :param session: the RequestSession to use for downloads
+            :param workers: the number of parallel downloads
+            :param ids: list of media IDs, ordered the same as media (used by the blob store manifest)
+            :param blob_store: a folder where files are stored once by content hash and hard linked to the output folder
             :return: the number of files wrote
         """
-        files_number = 0
-        media_length = len(media)
-        progress = 0
-        for m in media:
-            r = requests.get(m, stream=True)
-            if r.status_code == 200:
-                http_path = urlparse.urlparse(m).path.split("/")
-                local_path = output_folder
-                if len(http_path) > 1:
-                    for el in http_path[:-1]:
-                        local_path = os.path.join(local_path, el)
-                        if not os.path.isdir(local_path):
-                            os.mkdir(local_path)
-                if slugs is None:
-                    local_path = os.path.join(local_path, http_path[-1])
-                else:
-                    ext = mimetypes.guess_extension(r.headers['Content-Type'])
-                    local_path = os.path.join(local_path, slugs[progress])
-                    if ext is not None:
-                        local_path += ext
-                with open(local_path, "wb") as f:
-                    i = 0
-                    content_size = int(r.headers['Content-Length'])
-                    for chunk in r.iter_content(Exporter.CHUNK_SIZE):
-                        if content_size > 10485706: # 10Mo
-                            print_progress_bar(i*Exporter.CHUNK_SIZE, content_size, prefix=http_path[-1], length=70)
-                        f.write(chunk)
-                        i += 1
-                    if content_size > 10485706: # 10Mo
-                            print_progress_bar(content_size, content_size, prefix=http_path[-1], length=70)
-                files_number += 1
-            progress += 1
-            if progress % 10 == 1:
-                print("Downloaded file %d of %d" % (progress, media_length))
-        return files_number
+        downloader = MediaDownloader(session, workers, blob_store)
+        return downloader.download(media, output_folder, slugs, ids)
 
     @staticmethod
     def map_params(el, parameters_to_map):
@@ -189,37 +170,81 @@ class Exporter:
         return exported_list
 
     @staticmethod
-    def prepare_filename(filename, fmt):
+    def prepare_filename(filename, fmt, compression=None):
         """
             Returns a filename with the proper extension according to the given format
 
+            A compression extension (.gz, .xz or .bz2) is kept at the end of the filename.
+
             :param filename: the filename to clean
             :param fmt: the file format
+            :param compression: a compression to add to the filename (gz, xz or bz2), if any
             :return: the cleaned filename
         """
+        if fmt == Exporter.SQLITE:
+            compression = None
+        else:
+            filename, file_compression = split_compression(filename)
+            if file_compression is not None:
+                compression = file_compression
         if filename[-5:] != ".json" and fmt == Exporter.JSON:
             filename += ".json"
         elif filename[-4:] != ".csv" and fmt == Exporter.CSV:
             filename += ".csv"
+        elif filename[-7:] != ".sqlite" and filename[-3:] != ".db" and fmt == Exporter.SQLITE:
+            filename += ".sqlite"
+        elif filename[-7:] != ".ndjson" and filename[-6:] != ".jsonl" and fmt == Exporter.NDJSON:
+            filename += ".ndjson"
+        if compression is not None:
+            filename += "." + compression
         return filename
 
+    @staticmethod
+    def write_sqlite(filename, posts=None, pages=None, users=None, tags=None,
+    categories=None, media=None, comments=None, terms=None):
+        """
+            Writes raw objects to normalized tables of a SQLite database.
+
+            The database is created if needed, objects already present (same ID) are replaced.
+
+            :param filename: the path of the database
+            :return: the number of objects written
+        """
+        filename = Exporter.prepare_filename(filename, Exporter.SQLITE)
+        exporter = SQLiteExporter(filename)
+        try:
+            count = exporter.write(posts=posts, pages=pages, users=users, tags=tags,
+                categories=categories, media=media, comments=comments, terms=terms)
+        finally:
+            exporter.close()
+        EventLog.emit('export_written', path=filename, format='sqlite', objects=count)
+        return count
+
     @staticmethod
     def write_file(filename, fmt, csv_keys, data, details=None):
         """
             Writes content to the given file using the given format.
 
             The key mapping must be a dict of keys or lists of keys to ensure proper mapping.
+            The file is compressed on the fly if its name ends with .gz, .xz or .bz2.
 
             :param filename: the path of the file
-            :param fmt: the format of the file
+            :param fmt: the format of the file (JSON, NDJSON or CSV)
             :param csv_keys: the key mapping
             :param data: the actual data to export
             :param details: the details keys to look for
+            :raise ValueError: if the format cannot be written to a file
         """
-        with open(filename, "w", encoding="utf-8") as f:
+        if fmt not in [Exporter.JSON, Exporter.NDJSON, Exporter.CSV]:
+            raise ValueError("Cannot write %s to a file" % Exporter.FORMAT_NAMES.get(fmt, fmt))
+        with open_output(filename) as f:
             if fmt == Exporter.JSON:
                 # The JSON format is straightforward, we dump the flattened objects to JSON
                 json.dump(data, f, ensure_ascii=False, indent=4)
+            elif fmt == Exporter.NDJSON:
+                for el in data:
+                    f.write(json.dumps(el, ensure_ascii=False))
+                    f.write("\n")
             else:
                 # The CSV format requires some work, to select the most relevant information
                 fieldnames = csv_keys.keys()
@@ -254,6 +279,8 @@ class Exporter:
                             el_csv[key] = "unknown"
                     # And we write the row
                     w.writerow(el_csv)
+        EventLog.emit('export_written', path=filename,
+            format=Exporter.FORMAT_NAMES.get(fmt), objects=len(data))
 
     @staticmethod
     def export_posts(posts, fmt, filename, tags_list=None, categories_list=None, users_list=None):
@@ -261,13 +288,15 @@ class Exporter:
             Exports posts in specified format to specified file
 
             :param posts: the posts to export
-            :param fmt: the export format (JSON or CSV)
+            :param fmt: the export format (JSON, CSV or SQLITE)
             :param tags_list: a list of tags to associate them with tag ids
             :param categories_list: a list of categories to associate them with
             category ids
             :param user_list: a list of users to associate them with author id
             :return: the length of the list written to the file
         """
+        if fmt == Exporter.SQLITE:
+            return Exporter.write_sqlite(filename, posts=posts)
         exported_posts = Exporter.setup_export(posts, 
             [['title', 'rendered'], ['content', 'rendered'], ['excerpt', 'rendered']],
             {
@@ -298,11 +327,13 @@ class Exporter:
             Exports categories in specified format to specified file.
 
             :param categories: the categories to export
-            :param fmt: the export format (JSON or CSV)
+            :param fmt: the export format (JSON, CSV or SQLITE)
             :param filename: the path to the file to write
             :param category_list: the list of categories to be used as parents
             :return: the length of the list written to the file
         """
+        if fmt == Exporter.SQLITE:
+            return Exporter.write_sqlite(filename, categories=categories)
         exported_categories = Exporter.setup_export(categories, # TODO
             [],
             {
@@ -330,10 +361,12 @@ class Exporter:
             Exports tags in specified format to specified file
 
             :param tags: the tags to export
-            :param fmt: the export format (JSON or CSV)
+            :param fmt: the export format (JSON, CSV or SQLITE)
             :param filename: the path to the file to write
             :return: the length of the list written to the file
         """
+        if fmt == Exporter.SQLITE:
+            return Exporter.write_sqlite(filename, tags=tags)
         filename = Exporter.prepare_filename(filename, fmt)
         
         exported_tags = tags # It seems that no modification will be done for this one, so no deepcopy
@@ -346,16 +379,42 @@ class Exporter:
         Exporter.write_file(filename, fmt, csv_keys, exported_tags)
         return len(exported_tags)
 
+    @staticmethod
+    def export_terms(terms, fmt, filename):
+        """
+            Exports terms of custom taxonomies in specified format to specified file
+
+            :param terms: the terms to export
+            :param fmt: the export format (JSON, CSV or SQLITE)
+            :param filename: the path to the file to write
+            :return: the length of the list written to the file
+        """
+        if fmt == Exporter.SQLITE:
+            return Exporter.write_sqlite(filename, terms=terms)
+        filename = Exporter.prepare_filename(filename, fmt)
+
+        csv_keys = {
+            'id': 'id',
+            'taxonomy': 'taxonomy',
+            'name': 'name',
+            'count': 'count',
+            'description': 'description'
+        }
+        Exporter.write_file(filename, fmt, csv_keys, terms)
+        return len(terms)
+
     @staticmethod
     def export_users(users, fmt, filename):
         """
             Exports users in specified format to specified file.
 
             :param users: the users to export
-            :param fmt: the export format (JSON or CSV)
+            :param fmt: the export format (JSON, CSV or SQLITE)
             :param filename: the path to the file to write
             :return: the length of the list written to the file
         """
+        if fmt == Exporter.SQLITE:
+            return Exporter.write_sqlite(filename, users=users)
         filename = Exporter.prepare_filename(filename, fmt)
         
         exported_users = users # It seems that no modification will be done for this one, so no deepcopy
@@ -374,12 +433,14 @@ class Exporter:
             Exports pages in specified format to specified file.
         
             :param pages: the pages to export
-            :param fmt: the export format (JSON or CSV)
+            :param fmt: the export format (JSON, CSV or SQLITE)
             :param filename: the path to the file to write
             :param parent_pages: the list of all cached pages, to get parents
             :param users: the list of all cached users, to get users
             :return: the length of the list written to the file
         """
+        if fmt == Exporter.SQLITE:
+            return Exporter.write_sqlite(filename, pages=pages)
         exported_pages = Exporter.setup_export(pages,
             [["guid", "rendered"], ["title", "rendered"], ["content", "rendered"], ["excerpt", "rendered"]],
             {
@@ -410,10 +471,12 @@ class Exporter:
             Exports media in specified format to specified file.
 
             :param media: the media to export
-            :param fmt: the export format (JSON or CSV)
+            :param fmt: the export format (JSON, CSV or SQLITE)
             :param users: a list of users to associate them with author ids
             :return: the length of the list written to the file
         """
+        if fmt == Exporter.SQLITE:
+            return Exporter.write_sqlite(filename, media=media)
         exported_media = Exporter.setup_export(media, 
             [
                 ['guid', 'rendered'],
@@ -445,14 +508,77 @@ class Exporter:
     @staticmethod
     def export_namespaces(namespaces, fmt, filename):
         """
-            **NOT IMPLEMENTED** Exports namespaces in specified format to specified file.
+            Exports namespaces in specified format to specified file.
 
             :param namespaces: the namespaces to export
-            :param fmt: the export format (JSON or CSV)
+            :param fmt: the export format (JSON, NDJSON or CSV)
             :return: the length of the list written to the file
         """
-        Console.log_info("Namespaces export not available yet")
-        return 0
+        if fmt == Exporter.SQLITE:
+            Console.log_info("Namespaces cannot be exported to SQLite")
+            return 0
+        filename = Exporter.prepare_filename(filename, fmt)
+        exported_namespaces = [{'namespace': ns} for ns in namespaces]
+        if fmt == Exporter.JSON:
+            exported_namespaces = list(namespaces)
+        Exporter.write_file(filename, fmt, {'namespace': 'namespace'}, exported_namespaces)
+        return len(exported_namespaces)
+
+    @staticmethod
+    def ns_export_format(filename):
+        """
+            Guesses the format of a crawled namespaces export from its filename
+
+            :param filename: the path to the file
+            :return: NDJSON if the file is a .ndjson or .jsonl file, JSON otherwise
+        """
+        filename = split_compression(filename)[0]
+        if filename[-7:] == ".ndjson" or filename[-6:] == ".jsonl":
+            return Exporter.NDJSON
+        return Exporter.JSON
+
+    @staticmethod
+    def export_crawled_ns(routes, fmt, filename, callback=None):
+        """
+            Exports the data of crawled namespace routes to the specified file.
+
+            The routes are written one by one as they are consumed, so the
+            generator returned by WPApi.iter_namespaces can be given to avoid
+            holding every route payload in memory.
+
+            :param routes: an iterable of (route, result) tuples as yielded by WPApi.iter_namespaces
+            :param fmt: the export format (JSON or NDJSON)
+            :param filename: the path to the file to write
+            :param callback: a function called with each route and its result once written (e.g. to display it)
+            :return: the number of routes written to the file
+        """
+        filename = Exporter.prepare_filename(filename, fmt)
+        count = 0
+        with open_output(filename) as f:
+            if fmt == Exporter.JSON:
+                f.write("{")
+            for url, result in routes:
+                data = result['data']
+                if fmt == Exporter.NDJSON:
+                    # Each line also carries the crawl statistics of the route
+                    line = {'route': url}
+                    line.update(result)
+                    f.write(json.dumps(line, ensure_ascii=False))
+                    f.write("\n")
+                else:
+                    if count > 0:
+                        f.write(",")
+                    # Same layout as a json.dump of the whole dict with indent=4
+                    f.write("\n    %s: " % json.dumps(url, ensure_ascii=False))
+                    f.write(json.dumps(data, ensure_ascii=False, indent=4).replace("\n", "\n    "))
+                count += 1
+                if callback is not None:
+                    callback(url, result)
+            if fmt == Exporter.JSON:
+                f.write("\n}" if count > 0 else "}")
+        EventLog.emit('export_written', path=filename,
+            format=Exporter.FORMAT_NAMES.get(fmt), objects=count)
+        return count
 
     # FIXME to be refactored
     @staticmethod
@@ -461,12 +587,14 @@ class Exporter:
             Exports comments in specified format to specified file.
 
             :param comments: the comments to export
-            :param fmt: the export format (JSON or CSV)
+            :param fmt: the export format (JSON, CSV or SQLITE)
             :param filename: the path to the file to write
             :param parent_posts: the list of all cached posts, to get parent posts (not used yet because this could be too verbose)
             :param users: the list of all cached users, to get users
             :return: the length of the list written to the file
         """
+        if fmt == Exporter.SQLITE:
+            return Exporter.write_sqlite(filename, comments=comments)
         exported_comments = Exporter.setup_export(comments,
             [["content", "rendered"]],
             {
@@ -493,31 +621,39 @@ class Exporter:
     # TODO deprecated, to be moved to export_posts when HTML will be supported
     @staticmethod
     def export_posts_html(posts, folder, tags_list=None, categories_list=None,
-    users_list=None):
+    users_list=None, compression=None):
         """
             Exports posts as HTML to specified export folder.
+
+            If the folder name ends with .tar, .tar.gz, .tar.xz or .tar.bz2 (or if a compression is
+            given), the files are written to a single tar stream instead.
         
             :param posts: the posts to export
             :param folder: the export folder
             :param tags_list: a list of tags to associate them with tag ids
             :param categories_list: a list of categories to associate them with category ids
             :param user_list: a list of users to associate them with author id
+            :param compression: gz, xz or bz2 to write a compressed tar archive
             :return: the length of the list written to the file
         """
+        with ExportFolder(folder, compression) as output:
+            count = Exporter.export_posts_html_helper(posts, output, tags_list,
+                categories_list, users_list)
+        EventLog.emit('export_written', path=output.path, format='html', objects=count)
+        return count
+
+    @staticmethod
+    def export_posts_html_helper(posts, output, tags_list, categories_list, users_list):
         exported_posts = 0
 
         date_format = "%Y-%m-%dT%H:%M:%S-%Z"
 
-        if not os.path.isdir(folder):
-            os.makedirs(folder)
         for post in posts:
             post_file = None
             if 'slug' in post.keys():
-                post_file = open(os.path.join(folder, post['slug'])+".html",
-                "wt", encoding="utf-8")
+                post_file = post['slug'] + ".html"
             else:
-                post_file = open(os.path.join(folder, str(post['id']))+".html",
-                "wt", encoding="utf-8")
+                post_file = str(post['id']) + ".html"
 
             title = "Unknown"
             if 'title' in post.keys() and 'rendered' in post['title'].keys():
@@ -667,39 +803,37 @@ class Exporter:
             content=content
             )
 
-            post_file.write(buffer)
-            post_file.close()
+            output.write(post_file, buffer)
             exported_posts += 1
 
         return exported_posts
 
     @staticmethod
-    def export_comments(posts, orphan_comments, export_folder):
+    def export_comments(posts, orphan_comments, export_folder, compression=None):
         """
         Exports comments from posts and from orphans list
+        The export folder can be a tar archive, see export_posts_html
         """
         exported_comments = 0
-        for post in posts:
-            if 'comments' in post.keys() and len(post['comments']) > 0:
-                for comment in post['comments']:
-                    if 'slug' in post.keys() and len(post['slug']) > 0:
-                        Exporter.export_comments_helper(comment, post['slug'], export_folder)
-                    else:
-                        Exporter.export_comments_helper(comment, post['id'], export_folder)
-                    exported_comments += 1
-        for comment in orphan_comments:
-            Exporter.export_comments_helper(comment, '__orphan_comments', export_folder)
-            exported_comments += 1
+        with ExportFolder(export_folder, compression) as output:
+            for post in posts:
+                if 'comments' in post.keys() and len(post['comments']) > 0:
+                    for comment in post['comments']:
+                        if 'slug' in post.keys() and len(post['slug']) > 0:
+                            Exporter.export_comments_helper(comment, post['slug'], output)
+                        else:
+                            Exporter.export_comments_helper(comment, str(post['id']), output)
+                        exported_comments += 1
+            for comment in orphan_comments:
+                Exporter.export_comments_helper(comment, '__orphan_comments', output)
+                exported_comments += 1
+        EventLog.emit('export_written', path=output.path, format='html',
+            objects=exported_comments)
         return exported_comments
 
     @staticmethod 
-    def export_comments_helper(comment, post, export_folder):
+    def export_comments_helper(comment, post, output):
         date_format = "%Y-%m-%dT%H:%M:%S-%Z"
-        if not os.path.isdir(export_folder):
-            os.mkdir(export_folder)
-        if not os.path.isdir(os.path.join(export_folder, post)):
-            os.mkdir(os.path.join(export_folder, post))
-        out_file = open(os.path.join(export_folder, post, "%04d.html" % comment['id']), "wt", encoding="utf-8")
         date_gmt = "Unknown"
         if 'date_gmt' in comment.keys():
             date_gmt = datetime.strptime(comment['date_gmt'] +
@@ -744,5 +878,4 @@ class Exporter:
             post_id=int(comment['post']),
             post_link=post_link
         )
-        out_file.write(buffer)
-        out_file.close()
+        output.write(os.path.join(post, "%04d.html" % comment['id']), buffer)
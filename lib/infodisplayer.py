@@ -20,18 +20,107 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import os
+import sys
+import math
 import html
 import csv
+import queue
+import functools
+import threading
+import contextlib
 from datetime import datetime
 
-from lib.console import Console
+from lib.console import Console, BufferedOutput
+from lib.exceptions import CrawlInterrupted
+from lib.utils import format_size
+from lib.requeststats import RequestStats
+
+def buffered(display):
+    """
+    Decorator sending the output of a display function to the standard output
+    by chunks (see BufferedOutput) instead of one write per line
+    """
+    @functools.wraps(display)
+    def wrapper(*args, **kwargs):
+        if isinstance(sys.stdout, BufferedOutput):
+            return display(*args, **kwargs)
+        out = BufferedOutput(sys.stdout)
+        try:
+            with contextlib.redirect_stdout(out):
+                return display(*args, **kwargs)
+        finally:
+            out.flush()
+    return wrapper
 
 class InfoDisplayer:
     """
     Static class to display information for different categories
     """
 
+    STOP_TIMEOUT = 1
+    """
+        The time given to an interrupted crawl to end before returning
+    """
+
+    @staticmethod
+    def display_progressively(fetch, display, *args, **kwargs):
+        """
+        Displays objects page by page, as they are fetched
+
+        If the display is interrupted (e.g. by Ctrl-C), the crawl is stopped
+        at its next page, its pending requests being cancelled, and the
+        interruption is raised without waiting for it.
+        param fetch: a function taking a callback, which it calls with each
+        page of objects (e.g. lambda callback: scanner.get_users(callback=callback))
+        param display: the display function (e.g. InfoDisplayer.display_users)
+        param args: additional arguments of the display function
+        param kwargs: additional keyword arguments of the display function
+        return: the value returned by fetch
+        """
+        pages = queue.Queue()
+        result = {}
+        stop = threading.Event()
+
+        def put(page):
+            # Raised in the crawl, which cancels its pending requests
+            if stop.is_set():
+                raise CrawlInterrupted
+            pages.put(page)
+
+        def run():
+            try:
+                result['value'] = fetch(put)
+            except Exception as e:
+                result['error'] = e
+            finally:
+                pages.put(None)
+
+        def objects():
+            while not stop.is_set():
+                # Everything received so far is shown before waiting
+                sys.stdout.flush()
+                page = pages.get()
+                if page is None:
+                    return
+                yield from page
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        try:
+            display(objects(), *args, **kwargs)
+        except BaseException:
+            stop.set()
+            raise
+        finally:
+            thread.join(InfoDisplayer.STOP_TIMEOUT if stop.is_set() else None)
+            Console.clear_status()
+        if 'error' in result.keys():
+            raise result['error']
+        return result['value']
+
     @staticmethod
+    @buffered
     def display_basic_info(information):
         """
         Displays basic information about the WordPress instance
@@ -92,6 +181,7 @@ class InfoDisplayer:
         print()
 
     @staticmethod
+    @buffered
     def display_namespaces(information, details=False):
         """
             Displays namespace list of the WordPress API
@@ -106,6 +196,7 @@ class InfoDisplayer:
         print()
 
     @staticmethod
+    @buffered
     def display_endpoints(information):
         """
         Displays endpoint documentation of the WordPress API
@@ -155,69 +246,68 @@ class InfoDisplayer:
             print()
 
     @staticmethod
+    @buffered
     def display_posts(information, orphan_comments=[], details=False):
         """
         Displays posts published on the WordPress instance
         param information: information as a JSON object
         """
-        print()
+        write = sys.stdout.write
+        write("\n")
         date_format = "%Y-%m-%dT%H:%M:%S-%Z"
         for post in information:
             if post is not None:
-                line = ""
                 if 'id' in post.keys():
-                    line += "ID: %d" %post['id']
+                    write("ID: %d" %post['id'])
                 if 'title' in post.keys():
-                    line += " - " + html.unescape(post['title']['rendered'])
+                    write(" - " + html.unescape(post['title']['rendered']))
                 if 'date_gmt' in post.keys():
                     date_gmt = datetime.strptime(post['date_gmt'] +
                                                 "-GMT", date_format)
-                    line += " on %s" % \
-                            date_gmt.strftime("%d/%m/%Y at %H:%M:%S")
+                    write(" on %s" %
+                            date_gmt.strftime("%d/%m/%Y at %H:%M:%S"))
                 if 'link' in post.keys():
-                    line += " - " + post['link']
+                    write(" - " + post['link'])
                 if details:
                     if 'slug' in post.keys():
-                        line += "\nSlug: " + post['slug']
+                        write("\nSlug: " + post['slug'])
                     if 'status' in post.keys():
-                        line += "\nStatus: " + post['status']
+                        write("\nStatus: " + post['status'])
                     if 'author' in post.keys():
-                        line += "\nAuthor ID: %d" % post['author']
+                        write("\nAuthor ID: %d" % post['author'])
                     if 'comment_status' in post.keys():
-                        line += "\nComment status: " + post['comment_status']
+                        write("\nComment status: " + post['comment_status'])
                     if 'template' in post.keys() and len(post['template']) > 0:
-                        line += "\nTemplate: " + post['template']
+                        write("\nTemplate: " + post['template'])
                     if 'categories' in post.keys() and len(post['categories']) > 0:
-                        line += "\nCategory IDs: "
-                        for cat in post['categories']:
-                            line += "%d, " % cat
-                        line = line[:-2]
+                        write("\nCategory IDs: ")
+                        write(", ".join("%d" % cat for cat in post['categories']))
                     if 'excerpt' in post.keys():
-                        line += "\nExcerpt: "
+                        write("\nExcerpt: ")
                         if 'protected' in post['excerpt'].keys() and post['excerpt']['protected']:
-                            line += "<post is protected>"
+                            write("<post is protected>")
                         elif 'rendered' in post['excerpt'].keys():
-                            line += "\n" + html.unescape(post['excerpt']['rendered'])
+                            write("\n" + html.unescape(post['excerpt']['rendered']))
                     if 'content' in post.keys():
-                        line += "\nContent: "
+                        write("\nContent: ")
                         if 'protected' in post['content'].keys() and post['content']['protected']:
-                            line += "<post is protected>"
+                            write("<post is protected>")
                         elif 'rendered' in post['content'].keys():
-                            line += "\n" + html.unescape(post['content']['rendered'])
+                            write("\n" + html.unescape(post['content']['rendered']))
                 if 'comments' in post.keys():
                     for comment in post['comments']:
-                        line += "\n\t * Comment by %s from (%s) - %s" % (comment['author_name'], comment['author_url'], comment['link'])
-                print(line)
+                        write("\n\t * Comment by %s from (%s) - %s" % (comment['author_name'], comment['author_url'], comment['link']))
+                write("\n")
         
         if len(orphan_comments) > 0:
             # TODO: Untested code, may never be executed, I don't know how the REST API and WordPress handle post/comment link in back-end
-            print()
-            print("Found orphan comments! Check them right below:")
-            for comment in post['comments']:
-                line += "\n\t * Comment by %s from (%s) on post ID %d - %s" % (comment['author_name'], comment['author_url'], comment['post'], comment['link'])
-        print()
+            write("\nFound orphan comments! Check them right below:")
+            for comment in orphan_comments:
+                write("\n\t * Comment by %s from (%s) on post ID %d - %s" % (comment['author_name'], comment['author_url'], comment['post'], comment['link']))
+        write("\n")
 
     @staticmethod
+    @buffered
     def display_comments(information, details=False):
         """
             Displays comments published on the WordPress instance.
@@ -225,37 +315,38 @@ class InfoDisplayer:
             :param information: information as a JSON object
             :param details: if the details should be displayed
         """
-        print()
+        write = sys.stdout.write
+        write("\n")
         date_format = "%Y-%m-%dT%H:%M:%S-%Z"
         for comment in information:
             if comment is not None:
-                line = ""
                 if 'id' in comment.keys():
-                    line += "ID: %d" % comment['id']
+                    write("ID: %d" % comment['id'])
                 if 'post' in comment.keys():
-                    line += " - Post ID: %d" % comment['post'] #html.unescape(post['title']['rendered'])
+                    write(" - Post ID: %d" % comment['post']) #html.unescape(post['title']['rendered'])
                 if 'author_name' in comment.keys():
-                    line += " - By %s" % comment['author_name']
+                    write(" - By %s" % comment['author_name'])
                 if 'date' in comment.keys():
                     date_gmt = datetime.strptime(comment['date_gmt'] +
                                                 "-GMT", date_format)
-                    line += " on %s" % \
-                            date_gmt.strftime("%d/%m/%Y at %H:%M:%S")
+                    write(" on %s" %
+                            date_gmt.strftime("%d/%m/%Y at %H:%M:%S"))
                 if details:
                     if 'parent' in comment.keys() and comment['parent'] != 0:
-                        line += "\nParent ID: " + comment['parent']
+                        write("\nParent ID: " + comment['parent'])
                     if 'link' in comment.keys():
-                        line += "\nLink: " + comment['link']
+                        write("\nLink: " + comment['link'])
                     if 'status' in comment.keys():
-                        line += "\nStatus: " + comment['status']
+                        write("\nStatus: " + comment['status'])
                     if 'author_url' in comment.keys() and len(comment['author_url']) > 0:
-                        line += "\nAuthor URL: " + comment['author_url']
+                        write("\nAuthor URL: " + comment['author_url'])
                     if 'content' in comment.keys():
-                        line += "\nContent: \n" + html.unescape(comment['content']['rendered'])
-                print(line)
-        print()
+                        write("\nContent: \n" + html.unescape(comment['content']['rendered']))
+                write("\n")
+        write("\n")
 
     @staticmethod
+    @buffered
     def display_users(information, details=False):
         """
             Displays users on the WordPress instance
@@ -263,96 +354,167 @@ class InfoDisplayer:
             :param information: information as a JSON object
             :param details: display more details about the user
         """
-        print()
+        write = sys.stdout.write
+        write("\n")
         for user in information:
             if user is not None:
-                line = ""
                 if 'id' in user.keys():
-                    line += "User ID: %d\n" % user['id']
+                    write("User ID: %d\n" % user['id'])
                 if 'name' in user.keys():
-                    line += "    Display name: %s\n" % user['name']
+                    write("    Display name: %s\n" % user['name'])
                 if 'slug' in user.keys():
-                    line += "    User name (probable): %s\n" % user['slug']
+                    write("    User name (probable): %s\n" % user['slug'])
                 if 'description' in user.keys():
-                    line += "    User description: %s\n" % user['description']
+                    write("    User description: %s\n" % user['description'])
                 if 'url' in user.keys():
-                    line += "    User website: %s\n" % user['url']
+                    write("    User website: %s\n" % user['url'])
                 if 'link' in user.keys():
-                    line += "    User personal page: %s\n" % user['link']
+                    write("    User personal page: %s\n" % user['link'])
                 if details:
                     if "avatar_urls" in user.keys() and type(user["avatar_urls"]) is dict and len(user["avatar_urls"].keys()) > 0:
-                        line += "    Avatars: \n"
+                        write("    Avatars: \n")
                         for key, value in user["avatar_urls"].items():
-                            line += "        * %s: %s\n" % (key, value)
-                print(line)
-        print()
+                            write("        * %s: %s\n" % (key, value))
+                write("\n")
+        write("\n")
+
+    @staticmethod
+    @buffered
+    def display_revisions(information, details=False):
+        """
+        Displays the revisions and autosaves of posts or pages
+        param information: the posts or pages, with their revisions as
+        fetched by WPApi.get_revisions
+        """
+        write = sys.stdout.write
+        write("\n")
+        date_format = "%Y-%m-%dT%H:%M:%S-%Z"
+        for parent in information:
+            if parent is None or 'id' not in parent.keys():
+                continue
+            revisions = parent.get('revisions', [])
+            autosaves = parent.get('autosaves', [])
+            if len(revisions) == 0 and len(autosaves) == 0:
+                continue
+            write("ID: %d" % parent['id'])
+            if 'title' in parent.keys():
+                write(" - " + html.unescape(parent['title']['rendered']))
+            write(" - %d revisions, %d autosaves" % (len(revisions), len(autosaves)))
+            for kind, objects in [("Revision", revisions), ("Autosave", autosaves)]:
+                for revision in objects:
+                    write("\n    %s ID: %d" % (kind, revision['id']))
+                    if 'date_gmt' in revision.keys():
+                        date_gmt = datetime.strptime(revision['date_gmt'] +
+                                                    "-GMT", date_format)
+                        write(" on %s" %
+                                date_gmt.strftime("%d/%m/%Y at %H:%M:%S"))
+                    if 'title' in revision.keys():
+                        write(" - " + html.unescape(revision['title']['rendered']))
+                    if details and 'content' in revision.keys():
+                        write("\n        " + revision['content']['rendered'].replace("\n", "\n        "))
+            write("\n")
+        write("\n")
+
+    @staticmethod
+    @buffered
+    def display_terms(information, details=False):
+        """
+        Displays terms of a custom taxonomy of the WordPress instance
+        param information: information as a JSON object
+        """
+        write = sys.stdout.write
+        write("\n")
+        for term in information:
+            if term is not None:
+                if 'id' in term.keys():
+                    write("Term ID: %d\n" % term['id'])
+                if 'name' in term.keys():
+                    write("    Name: %s\n" % term['name'])
+                if 'taxonomy' in term.keys():
+                    write("    Taxonomy: %s\n" % term['taxonomy'])
+                if 'description' in term.keys():
+                    write("    Description: %s\n" % term['description'])
+                if 'count' in term.keys():
+                    write("    Number of objects: %d\n" % term['count'])
+                if 'link' in term.keys():
+                    write("    Page: %s\n" % term['link'])
+                if details:
+                    if 'slug' in term.keys():
+                        write("    Slug: %s\n" % term['slug'])
+                    if 'parent' in term.keys():
+                        write("    Parent term: %d\n" % term['parent'])
+                write("\n")
+        write("\n")
 
     @staticmethod
+    @buffered
     def display_categories(information, details=False):
         """
         Displays categories of the WordPress instance
         param information: information as a JSON object
         """
-        print()
+        write = sys.stdout.write
+        write("\n")
         for category in information:
             if category is not None:
-                line = ""
                 if 'id' in category.keys():
-                    line += "Category ID: %d\n" % category['id']
+                    write("Category ID: %d\n" % category['id'])
                 if 'name' in category.keys():
-                    line += "    Name: %s\n" % category['name']
+                    write("    Name: %s\n" % category['name'])
                 if 'description' in category.keys():
-                    line += "    Description: %s\n" % category['description']
+                    write("    Description: %s\n" % category['description'])
                 if 'count' in category.keys():
-                    line += "    Number of posts: %d\n" % category['count']
+                    write("    Number of posts: %d\n" % category['count'])
                 if 'link' in category.keys():
-                    line += "    Page: %s\n" % category['link']
+                    write("    Page: %s\n" % category['link'])
                 if details:
                     if 'slug' in category.keys():
-                        line += "    Slug: %s\n" % category['slug']
+                        write("    Slug: %s\n" % category['slug'])
                     if 'taxonomy' in category.keys():
-                        line += "    Taxonomy: %s\n" % category['slug']
+                        write("    Taxonomy: %s\n" % category['slug'])
                     if 'parent' in category.keys():
-                        line += "    Parent category: "
+                        write("    Parent category: ")
                         if type(category['parent']) is str:
-                            line += category['parent']
+                            write(category['parent'])
                         elif type(category['parent']) is int:
-                            line += "%d" % category['parent']
+                            write("%d" % category['parent'])
                         else:
-                            line += "Unknown"
-                        line += "\n"
-                print(line)
-        print()
+                            write("Unknown")
+                        write("\n")
+                write("\n")
+        write("\n")
 
     @staticmethod
+    @buffered
     def display_tags(information, details=False):
         """
         Displays tags of the WordPress instance
         param information: information as a JSON object
         """
-        print()
+        write = sys.stdout.write
+        write("\n")
         for tag in information:
             if tag is not None:
-                line = ""
                 if 'id' in tag.keys():
-                    line += "Tag ID: %d\n" % tag['id']
+                    write("Tag ID: %d\n" % tag['id'])
                 if 'name' in tag.keys():
-                    line += "    Name: %s\n" % tag['name']
+                    write("    Name: %s\n" % tag['name'])
                 if 'description' in tag.keys():
-                    line += "    Description: %s\n" % tag['description']
+                    write("    Description: %s\n" % tag['description'])
                 if 'count' in tag.keys():
-                    line += "    Number of posts: %d\n" % tag['count']
+                    write("    Number of posts: %d\n" % tag['count'])
                 if 'link' in tag.keys():
-                    line += "    Page: %s\n" % tag['link']
+                    write("    Page: %s\n" % tag['link'])
                 if details:
                     if 'slug' in tag.keys():
-                        line += "    Slug: %s\n" % tag['slug']
+                        write("    Slug: %s\n" % tag['slug'])
                     if 'taxonomy' in tag.keys():
-                        line += "    Taxonomy: %s\n" % tag['slug']
-                print(line)
-        print()
+                        write("    Taxonomy: %s\n" % tag['slug'])
+                write("\n")
+        write("\n")
 
     @staticmethod
+    @buffered
     def display_media(information, details=False):
         """
             Displays media objects of the WordPress instance
@@ -360,52 +522,53 @@ class InfoDisplayer:
             :param information: information as a JSON object
             :param details: if the details should be displayed
         """
-        print()
+        write = sys.stdout.write
+        write("\n")
         date_format = "%Y-%m-%dT%H:%M:%S-%Z"
         for media in information:
             if media is not None:
-                line = ""
                 if 'id' in media.keys():
-                    line += "Media ID: %d\n" % media['id']
+                    write("Media ID: %d\n" % media['id'])
                 if 'title' in media.keys() and 'rendered' in media['title']:
-                    line += "    Media title: %s\n" % \
-                            html.unescape(media['title']['rendered'])
+                    write("    Media title: %s\n" %
+                            html.unescape(media['title']['rendered']))
                 if 'date_gmt' in media.keys():
                     date_gmt = datetime.strptime(media['date_gmt'] +
                                                 "-GMT", date_format)
-                    line += "    Upload date (GMT): %s\n" % \
-                            date_gmt.strftime("%d/%m/%Y %H:%M:%S")
+                    write("    Upload date (GMT): %s\n" %
+                            date_gmt.strftime("%d/%m/%Y %H:%M:%S"))
                 if 'media_type' in media.keys():
-                    line += "    Media type: %s\n" % media['media_type']
+                    write("    Media type: %s\n" % media['media_type'])
                 if 'mime_type' in media.keys():
-                    line += "    Mime type: %s\n" % media['mime_type']
+                    write("    Mime type: %s\n" % media['mime_type'])
                 if 'link' in media.keys():
-                    line += "    Page: %s\n" % media['link']
+                    write("    Page: %s\n" % media['link'])
                 if 'source_url' in media.keys():
-                    line += "    Source URL: %s\n" % media['source_url']
+                    write("    Source URL: %s\n" % media['source_url'])
                 if details:
                     if 'slug' in media.keys():
-                        line += "Slug: " + media['slug'] + "\n"
+                        write("Slug: " + media['slug'] + "\n")
                     if 'status' in media.keys():
-                        line += "Status: " + media['status'] + "\n"
+                        write("Status: " + media['status'] + "\n")
                     if 'type' in media.keys():
-                        line += "Type: " + media['type'] + "\n"
+                        write("Type: " + media['type'] + "\n")
                     if 'author' in media.keys():
-                        line += "Author ID: %d\n" % media['author']
+                        write("Author ID: %d\n" % media['author'])
                     if 'alt_text' in media.keys():
-                        line += "Alt text: " + media['alt_text'] + "\n"
+                        write("Alt text: " + media['alt_text'] + "\n")
                     if 'comment_status' in media.keys():
-                        line += "Comment status: " + media['comment_status'] + "\n"
+                        write("Comment status: " + media['comment_status'] + "\n")
                     if 'post' in media.keys():
-                        line += "Post or page ID: %d\n" % media['post']
+                        write("Post or page ID: %d\n" % media['post'])
                     if 'description' in media.keys() and media['description']['rendered']:
-                        line += "Description: \n" + html.unescape(media['description']['rendered']) + "\n"
+                        write("Description: \n" + html.unescape(media['description']['rendered']) + "\n")
                     if 'caption' in media.keys() and media['caption']['rendered']:
-                        line += "Caption: \n" + html.unescape(media['caption']['rendered']) + "\n"
-                print(line)
-        print()
+                        write("Caption: \n" + html.unescape(media['caption']['rendered']) + "\n")
+                write("\n")
+        write("\n")
 
     @staticmethod
+    @buffered
     def display_pages(information, details=False):
         """
             Displays pages published on the WordPress instance
@@ -413,103 +576,230 @@ class InfoDisplayer:
             :param information: information as a JSON object
             :param details: if the details should be displayed
         """
-        print()
+        write = sys.stdout.write
+        write("\n")
         for page in information:
             if page is not None:
-                line = ""
                 if 'id' in page.keys():
-                    line += "ID: %d" % page['id']
+                    write("ID: %d" % page['id'])
                 if 'title' in page.keys() and 'rendered' in page['title']:
-                    line += " - " + html.unescape(page['title']['rendered'])
+                    write(" - " + html.unescape(page['title']['rendered']))
                 if 'link' in page.keys():
-                    line += " - " + page['link']
+                    write(" - " + page['link'])
                 if details:
                     if 'slug' in page.keys():
-                        line += "\nSlug: " + page['slug']
+                        write("\nSlug: " + page['slug'])
                     if 'status' in page.keys():
-                        line += "\nStatus: " + page['status']
+                        write("\nStatus: " + page['status'])
                     if 'author' in page.keys():
-                        line += "\nAuthor ID: %d" % page['author']
+                        write("\nAuthor ID: %d" % page['author'])
                     if 'comment_status' in page.keys():
-                        line += "\nComment status: " + page['comment_status']
+                        write("\nComment status: " + page['comment_status'])
                     if 'template' in page.keys() and len(page['template']) > 0:
-                        line += "\nTemplate: " + page['template']
+                        write("\nTemplate: " + page['template'])
                     if 'parent' in page.keys():
                         if page['parent'] == 0:
-                            line += "\nParent: none"
+                            write("\nParent: none")
                         else:
-                            line += "\nParent ID: %d" % page['parent']
+                            write("\nParent ID: %d" % page['parent'])
                     if 'excerpt' in page.keys():
-                        line += "\nExcerpt: "
+                        write("\nExcerpt: ")
                         if 'protected' in page['excerpt'].keys() and page['excerpt']['protected']:
-                            line += "<page is protected>"
+                            write("<page is protected>")
                         elif 'rendered' in page['excerpt'].keys():
-                            line += "\n" + html.unescape(page['excerpt']['rendered'])
+                            write("\n" + html.unescape(page['excerpt']['rendered']))
                     if 'content' in page.keys():
-                        line += "\nContent: "
+                        write("\nContent: ")
                         if 'protected' in page['content'].keys() and page['content']['protected']:
-                            line += "<page is protected>"
+                            write("<page is protected>")
                         elif 'rendered' in page['content'].keys():
-                            line += "\n" + html.unescape(page['content']['rendered'])
-                print(line)
-        print()
+                            write("\n" + html.unescape(page['content']['rendered']))
+                write("\n")
+        write("\n")
 
     @staticmethod
     def recurse_list_or_dict(data, tab):
         """
         Helper function to generate recursive display of API data
         """
+        parts = []
+        InfoDisplayer.render_data(data, tab, parts.append)
+        return "".join(parts)
+
+    @staticmethod
+    def render_data(data, tab, write):
+        """
+        Renders API data recursively, piece by piece
+        param data: the data (a JSON object)
+        param tab: the indentation of the data
+        param write: the function called with each piece of text
+        """
         if type(data) is not dict and type(data) is not list:
-            return tab + str(data)
+            write(tab + str(data))
+            return
 
-        line = ""
         if type(data) is list:
-            i = 0
-            length = len(data)
             for value in data:
                 do_jmp = True
                 if type(value) is dict or type(value) is list:
-                    line += InfoDisplayer.recurse_list_or_dict(value, tab+"\t")
+                    InfoDisplayer.render_data(value, tab+"\t", write)
                 elif type(value) is str:
                     if "\n" in value:
-                        line += "\n" + tab + "\t"
-                        line += value.replace("\n", "\n"+tab+"\t")
+                        write("\n" + tab + "\t")
+                        write(value.replace("\n", "\n"+tab+"\t"))
                     else:
-                        line += " "
-                        line += value.replace("\n", "\n"+tab)
+                        write(" ")
+                        write(value.replace("\n", "\n"+tab))
                         do_jmp = False
                 else:
-                    line += " " + str(value)
-                if i < length and do_jmp:
-                    line += "\n"
-                i += 1
+                    write(" " + str(value))
+                if do_jmp:
+                    write("\n")
         else:
             for key,value in data.items():
-                line += "\n" + tab + key
+                write("\n" + tab + key)
                 if type(value) is dict or type(value) is list:
-                    line += InfoDisplayer.recurse_list_or_dict(value, tab+"\t")
+                    InfoDisplayer.render_data(value, tab+"\t", write)
                 elif type(value) is str:
                     if "\n" in value:
-                        line += "\n" + tab + "\t"
-                        line += value.replace("\n", "\n"+tab+"\t")
+                        write("\n" + tab + "\t")
+                        write(value.replace("\n", "\n"+tab+"\t"))
                     else:
-                        line += " "
-                        line += value.replace("\n", "\n"+tab)
+                        write(" ")
+                        write(value.replace("\n", "\n"+tab))
                 else:
-                    line += " " + str(value)
-        return line
+                    write(" " + str(value))
+
+    @staticmethod
+    @buffered
+    def display_census(information, workers=1):
+        """
+        Displays the number of objects of each collection and an estimate of
+        the cost of a full crawl
+        param information: the list of counts as returned by WPApi.census
+        param workers: the number of parallel connections of the crawl
+        """
+        print()
+        print("%-24s %10s %10s %12s" % ("Collection", "Objects", "Requests", "Size"))
+        total_requests = 0
+        total_bytes = 0
+        duration = 0
+        for entry in information:
+            endpoint = entry['endpoint']
+            if entry['total'] is None:
+                print("%-24s %10s %10s %12s" % (endpoint.plural, "n/a", "-", "-"))
+                continue
+            print("%-24s %10d %10d %12s" % (endpoint.plural, entry['total'],
+                entry['requests'], format_size(entry['bytes'])))
+            total_requests += entry['requests']
+            total_bytes += entry['bytes']
+            duration += entry['requests'] * entry['latency']
+        print("%-24s %10s %10d %12s" % ("Total", "", total_requests,
+            format_size(total_bytes)))
+        print()
+        print("Estimated duration of a full crawl with %d worker%s: %.1fs" % (workers,
+            "s" if workers > 1 else "", duration / max(1, workers)))
+        print()
+
+    @staticmethod
+    @buffered
+    def display_stats(information, limit=15):
+        """
+        Displays the measures of the requests sent during the session
+        param information: the summary as returned by RequestStats.summary
+        param limit: the number of endpoints to display, slowest first
+        """
+        def ms(value):
+            return "-" if value is None else "%.0f" % (value * 1000)
+
+        total = information['total']
+        print()
+        print("%d requests (%d errors), %s received in %.1fs" % (
+            total['requests'], total['errors'],
+            format_size(total['bytes']), information['elapsed']))
+        if total['requests'] == 0:
+            print()
+            return
+        print("Latency (ms): p50 %s, p95 %s, p99 %s, max %s, time to first byte p50 %s" % (
+            ms(total['p50']), ms(total['p95']), ms(total['p99']), ms(total['max']),
+            ms(total['ttfb_p50'])))
+        print()
+        lower = 0
+        bounds = RequestStats.BUCKETS + [None]
+        # Empty buckets above the slowest request are not shown
+        last = max(i for i, count in enumerate(total['histogram']) if count > 0)
+        for bound, count in zip(bounds[:last + 1], total['histogram']):
+            label = "< %s ms" % ms(bound) if bound is not None else ">= %s ms" % ms(lower)
+            bar = "#" * math.ceil(50 * count / total['requests'])
+            print("%12s %7d %s" % (label, count, bar))
+            lower = bound
+        print()
+        print("%-48s %7s %6s %9s %7s %7s %7s %10s" % ("Endpoint", "Reqs", "Errors",
+            "Time (s)", "p50", "p95", "p99", "Size"))
+        for endpoint in information['endpoints'][:limit]:
+            print("%-48s %7d %6d %9.2f %7s %7s %7s %10s" % (endpoint['endpoint'][:48],
+                endpoint['requests'], endpoint['errors'], endpoint['total_time'],
+                ms(endpoint['p50']), ms(endpoint['p95']), ms(endpoint['p99']),
+                format_size(endpoint['bytes'])))
+        if len(information['endpoints']) > limit:
+            print("... and %d other endpoints" % (len(information['endpoints']) - limit))
+        print()
+
+    @staticmethod
+    @buffered
+    def display_profile(phases):
+        """
+        Displays the summary of the profiled phases
+        param phases: the list of summaries as returned by Profiler.stop
+        """
+        if len(phases) == 0:
+            return
+        print()
+        print("%-32s %9s %9s %8s %10s %10s" % ("Phase", "Time (s)", "Profiled",
+            "Threads", "Peak mem", "Retained"))
+        for phase in phases:
+            print("%-32s %9.2f %9.2f %8d %10s %10s" % (phase['name'][:32],
+                phase['duration'], phase['profiled_time'], phase['threads'],
+                format_size(phase['peak_memory']), format_size(phase['allocated'])))
+        print()
+        print("Reports written to %s" % os.path.dirname(phases[0]['report']))
+        print()
 
     @staticmethod
+    @buffered
     def display_crawled_ns(information):
         """
         Displays endpoints details published on the WordPress instance
-        param information: information as a JSON object
+        param information: information as a JSON object or an iterable of
+        (route, result) tuples as yielded by WPApi.iter_namespaces, displayed
+        as they come
         """
+        if type(information) is dict:
+            information = ((url, {'data': data}) for url, data in information.items())
         print()
-        for url,data in information.items():
-            line = "\n"
-            line += url
-            tab = "\t"
-            line += InfoDisplayer.recurse_list_or_dict(data, tab)
-            print(line)
+        for url,result in information:
+            InfoDisplayer.display_crawled_route(url, result)
+            # Routes are shown as they are crawled
+            sys.stdout.flush()
         print()
+
+    @staticmethod
+    @buffered
+    def display_crawled_route(url, result):
+        """
+        Displays the data returned by a single crawled route
+        param url: the route
+        param result: a dict with the data and, if available, the number of
+        pages, the elapsed time and the bytes received
+        """
+        line = "\n"
+        line += url
+        if 'pages' in result.keys():
+            line += " (%d page%s, %s, %.2fs)" % (result['pages'],
+                "s" if result['pages'] > 1 else "",
+                format_size(result['bytes']), result['elapsed'])
+        tab = "\t"
+        parts = [line]
+        InfoDisplayer.render_data(result['data'], tab, parts.append)
+        parts.append("\n")
+        sys.stdout.write("".join(parts))
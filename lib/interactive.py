@@ -29,10 +29,16 @@ import copy
 import os
 
 from lib.wpapi import WPApi, WordPressApiNotV2
+from lib.exceptions import NoWordpressApi
 from lib.requestsession import RequestSession
+from lib.requeststats import RequestStats
+from lib.profiler import Profiler
 from lib.console import Console
 from lib.infodisplayer import InfoDisplayer
 from lib.exporter import Exporter
+from lib.downloader import MediaDownloader
+from lib.endpoints import Endpoint
+from lib.output import COMPRESSIONS
 from lib.utils import get_by_id
 
 class ArgumentParser(argparse.ArgumentParser):
@@ -73,21 +79,76 @@ class InteractiveShell(cmd.Cmd):
     `command -h` gives more details about a command
     """
     prompt = "> "
+    LIST_TYPES = [
+        'posts', 
+        #'post-revisions', 
+        #'wp-blocks', 
+        'categories',
+        'tags',
+        'pages',
+        'comments',
+        'media',
+        'users',
+        #'themes',
+        #'search-results',
+        'namespaces',
+        'all',
+    ]
+    """
+        The object types listed by the list command, custom post types and
+        taxonomies aside
+    """
+    FETCH_TYPES = [
+        'post', 
+        #'post-revision', 
+        #'wp-block', 
+        'category',
+        'tag',
+        'page',
+        'comment',
+        'media',
+        'user',
+        #'theme',
+        #'search-result',
+    ]
+    """
+        The object types fetched or searched by ID, custom post types and
+        taxonomies aside
+    """
 
-    def __init__(self, target, session, version):
+    def __init__(self, target, session, version, workers=MediaDownloader.DEFAULT_WORKERS,
+                 scanner=None):
         cmd.Cmd.__init__(self)
         self.target = target
         InteractiveShell.prompt = Console.red + target + Console.normal + " > "
         self.session = session
         self.version = version
-        self.scanner = WPApi(self.target, session=session)
+        self.workers = workers
+        self.scanner = scanner
+        if self.scanner is None:
+            self.scanner = WPApi(self.target, session=session, workers=workers)
+
+    def preloop(self):
+        # The time waiting for commands is not part of any phase
+        Profiler.end_phase()
+
+    def precmd(self, line):
+        if line.split()[:1] not in [[], ["profile"], ["exit"], ["EOF"]]:
+            Profiler.phase(line.strip())
+        return line
+
+    def postcmd(self, stop, line):
+        Profiler.end_phase()
+        return stop
 
     @staticmethod
-    def export_decorator(export_func, is_all, export_str, json, csv, values, kwargs = {}):
+    def export_decorator(export_func, is_all, export_str, json, csv, values, kwargs = {}, sqlite=None, compress=None):
         if json is not None:
             json_file = json
             if is_all:
                 json_file = json + "-" + export_str
+            if compress is not None:
+                json_file = Exporter.prepare_filename(json_file, Exporter.JSON, compress)
             args = [values]
             args.append(Exporter.JSON)
             args.append(json_file)
@@ -96,10 +157,18 @@ class InteractiveShell(cmd.Cmd):
             csv_file = csv
             if is_all:
                 csv_file = csv + "-" + export_str
+            if compress is not None:
+                csv_file = Exporter.prepare_filename(csv_file, Exporter.CSV, compress)
             args = [values]
             args.append(Exporter.CSV)
             args.append(csv_file)
             export_func(*args, **kwargs)
+        if sqlite is not None:
+            # All object types share the same database
+            args = [values]
+            args.append(Exporter.SQLITE)
+            args.append(sqlite)
+            export_func(*args, **kwargs)
     
     def get_fetch_or_list_type(self, obj_type, plural=False):
         """
@@ -162,9 +231,25 @@ class InteractiveShell(cmd.Cmd):
             obj_name = "Media"
         elif obj_type == WPApi.NAMESPACE:
             display_func = InfoDisplayer.display_namespaces
-            export_func = Exporter.export_media
+            export_func = Exporter.export_namespaces
             additional_info = {}
             obj_name = "Namespaces" if plural else "Namespace"
+        else:
+            endpoint = self.scanner.get_endpoint(obj_type)
+            if endpoint is not None and endpoint.kind == Endpoint.TYPE:
+                display_func = InfoDisplayer.display_posts
+                export_func = Exporter.export_posts
+                additional_info = {
+                    'tags_list': self.scanner.tags,
+                    'categories_list': self.scanner.categories,
+                    'users_list': self.scanner.users
+                }
+            elif endpoint is not None:
+                display_func = InfoDisplayer.display_terms
+                export_func = Exporter.export_terms
+                additional_info = {}
+            if endpoint is not None:
+                obj_name = endpoint.plural.capitalize() if plural else endpoint.name.capitalize()
 
         return {
             "display_func": display_func,
@@ -173,7 +258,7 @@ class InteractiveShell(cmd.Cmd):
             "obj_name": obj_name
         }
 
-    def fetch_obj(self, obj_type, obj_id, cache=True, json=None, csv=None):
+    def fetch_obj(self, obj_type, obj_id, cache=True, json=None, csv=None, sqlite=None, compress=None):
         """
             Displays and exports (if relevant) the object fetched by ID
 
@@ -182,6 +267,8 @@ class InteractiveShell(cmd.Cmd):
             :param cache: whether to use the cache of not
             :param json: json export filename
             :param csv: csv export filename
+            :param sqlite: sqlite export filename
+            :param compress: compression of json and csv exports (gz, xz, bz2)
         """
         prop = self.get_fetch_or_list_type(obj_type)
         print(prop["obj_name"] + " details")
@@ -192,16 +279,40 @@ class InteractiveShell(cmd.Cmd):
             else:
                 prop["display_func"](obj, details=True)
                 if len(prop["additional_info"].keys()) > 0:
-                    InteractiveShell.export_decorator(prop["export_func"], False, "", json, csv, obj, prop["additional_info"])
+                    InteractiveShell.export_decorator(prop["export_func"], False, "", json, csv, obj, prop["additional_info"], sqlite, compress)
                 else:
-                    InteractiveShell.export_decorator(prop["export_func"], False, "", json, csv, obj)
+                    InteractiveShell.export_decorator(prop["export_func"], False, "", json, csv, obj, sqlite=sqlite, compress=compress)
         except WordPressApiNotV2:
             Console.log_error("The API does not support WP V2")
         except IOError as e:
             Console.log_error("Could not open %s for writing" % e.filename)
         print()
     
-    def list_obj(self, obj_type, start, limit, is_all=False, cache=True, json=None, csv=None):
+    def custom_endpoints(self):
+        """
+            Returns the endpoints of the custom post types and taxonomies of
+            the target, or an empty list if they can't be retrieved
+        """
+        try:
+            return self.scanner.get_endpoints().custom()
+        except Exception:
+            return []
+
+    def find_custom_endpoint(self, name):
+        """
+            Returns the endpoint of the custom post type or taxonomy having
+            the given name, or None if it is unknown or the custom types can't
+            be retrieved
+        """
+        try:
+            endpoint = self.scanner.find_endpoint(name)
+        except Exception:
+            return None
+        if endpoint is None or not endpoint.is_custom():
+            return None
+        return endpoint
+
+    def list_obj(self, obj_type, start, limit, is_all=False, cache=True, json=None, csv=None, sqlite=None, compress=None):
         """
             Displays and exports (if relevant) the object list
 
@@ -212,6 +323,8 @@ class InteractiveShell(cmd.Cmd):
             :param cache: whether to use the cache of not
             :param json: json export filename
             :param csv: csv export filename
+            :param sqlite: sqlite export filename
+            :param compress: compression of json and csv exports (gz, xz, bz2)
         """
         prop = self.get_fetch_or_list_type(obj_type, plural=True)
         print(prop["obj_name"] + " details")
@@ -219,9 +332,10 @@ class InteractiveShell(cmd.Cmd):
             kwargs = {}
             if obj_type == WPApi.POST:
                 kwargs = {"comments": False}
-            obj_list = self.scanner.get_obj_list(obj_type, start, limit, cache, kwargs=kwargs)
-            prop["display_func"](obj_list)
-            InteractiveShell.export_decorator(prop["export_func"], is_all, prop["obj_name"].lower(), json, csv, obj_list)
+            obj_list = InfoDisplayer.display_progressively(
+                lambda callback: self.scanner.get_obj_list(obj_type, start, limit, cache, kwargs=kwargs, callback=callback),
+                prop["display_func"])
+            InteractiveShell.export_decorator(prop["export_func"], is_all, prop["obj_name"].lower(), json, csv, obj_list, sqlite=sqlite, compress=compress)
         except WordPressApiNotV2:
             Console.log_error("The API does not support WP V2")
         except IOError as e:
@@ -235,7 +349,7 @@ class InteractiveShell(cmd.Cmd):
     def do_show(self, arg):
         'Shows information about parameters in memory'
         parser = ArgumentParser(prog='show', description='show information about global parameters')
-        parser.add_argument("what", choices=['all', 'target', 'proxy', 'cookies', 'credentials', 'version'],
+        parser.add_argument("what", choices=['all', 'target', 'proxy', 'cookies', 'credentials', 'workers', 'version'],
         help='choose the information to be displayed', default='all')
         args = parser.custom_parse_args(arg)
         if args is None:
@@ -267,6 +381,8 @@ class InteractiveShell(cmd.Cmd):
                 print(creds_str[:-1])
             else:
                 print("Credentials: none")
+        if args.what == 'all' or args.what == 'workers':
+            print("Workers: %d" % self.workers)
         if args.what == 'all' or args.what == 'version':
             print("WPJsonScraper version: %s" % self.version)
         print()
@@ -274,7 +390,7 @@ class InteractiveShell(cmd.Cmd):
     def do_set(self, arg):
         'Sets a global parameter of WPJsonScanner'
         parser = ArgumentParser(prog='set', description='sets global parameters for WPJsonScanner')
-        parser.add_argument("what", choices=['target', 'proxy', 'cookies', 'credentials'],
+        parser.add_argument("what", choices=['target', 'proxy', 'cookies', 'credentials', 'workers'],
         help='the parameter to set')
         parser.add_argument("value", type=str, help='the new value of the parameter (for cookies, set as cookie string: "n1=v1; n2=v2")')
         args = parser.custom_parse_args(arg)
@@ -288,7 +404,7 @@ class InteractiveShell(cmd.Cmd):
                 self.target += "/"
             InteractiveShell.prompt = Console.red + self.target + Console.normal + " > "
             print("target = %s" % args.value)
-            self.scanner = WPApi(self.target, session=self.session)
+            self.scanner = WPApi(self.target, session=self.session, workers=self.workers)
             Console.log_info("Cache is erased but session stays the same (with cookies and authorization)")
         elif args.what == 'proxy':
             self.session.set_proxy(args.value)
@@ -305,35 +421,41 @@ class InteractiveShell(cmd.Cmd):
                 ':'.join(authorization_list[1:]))
             self.session.set_creds(authorization)
             print("Credentials set!")
+        elif args.what == "workers":
+            try:
+                self.workers = max(1, int(args.value))
+                self.scanner.workers = self.workers
+                print("workers = %d" % self.workers)
+            except ValueError:
+                Console.log_error("The number of workers must be an integer")
         print()
 
     def do_list(self, arg):
         'Gets the list of something from the server'
         parser = ArgumentParser(prog='list', description='gets a list of something from the server')
-        parser.add_argument("what", choices=[
-            'posts', 
-            #'post-revisions', 
-            #'wp-blocks', 
-            'categories',
-            'tags',
-            'pages',
-            'comments',
-            'media',
-            'users',
-            #'themes',
-            #'search-results',
-            'namespaces',
-            'all',
-            ],
-            help='what to list')
+        parser.add_argument("what",
+            help='what to list (%s or a custom post type or taxonomy)' %
+            ", ".join(InteractiveShell.LIST_TYPES))
         parser.add_argument("--json", "-j", help="list and store as json to the specified file")
         parser.add_argument("--csv", "-c", help="list and store as csv to the specified file")
+        parser.add_argument("--sqlite", "-q", help="list and store in the specified sqlite database")
+        parser.add_argument("--compress", "-z", choices=COMPRESSIONS, help="compress json and csv files on the fly")
         parser.add_argument("--limit", "-l", type=int, help="limit the number of results")
         parser.add_argument("--start", "-s", type=int, help="start at the given index")
         parser.add_argument("--no-cache", dest="cache", action="store_false", help="don't lookup in cache and ask the server")
         args = parser.custom_parse_args(arg)
         if args is None:
             return
+        # The custom types are only retrieved when they are asked for
+        custom_endpoints = []
+        if args.what == "all":
+            custom_endpoints = self.custom_endpoints()
+        elif args.what not in InteractiveShell.LIST_TYPES:
+            endpoint = self.find_custom_endpoint(args.what)
+            if endpoint is None:
+                Console.log_error("Unknown object type: %s" % args.what)
+                return
+            custom_endpoints = [endpoint]
         # The checks must be ordered by dependencies
         kwargs = {
             "start": args.start, 
@@ -341,7 +463,9 @@ class InteractiveShell(cmd.Cmd):
             "is_all": args.what == "all", 
             "cache": args.cache, 
             "json": args.json, 
-            "csv": args.csv
+            "csv": args.csv,
+            "sqlite": args.sqlite,
+            "compress": args.compress
         }
         if args.what == "all" or args.what == "users":
             self.list_obj(WPApi.USER, **kwargs)
@@ -357,38 +481,38 @@ class InteractiveShell(cmd.Cmd):
             self.list_obj(WPApi.COMMENT, **kwargs)
         if args.what == "all" or args.what == "media":
             self.list_obj(WPApi.MEDIA, **kwargs)
+        for endpoint in custom_endpoints:
+            self.list_obj(endpoint.key, **kwargs)
         if args.what == "all" or args.what == "namespaces":
             self.list_obj(WPApi.NAMESPACE, **kwargs)
 
     def do_fetch(self, arg):
         'Fetches a specific content specified by ID'
         parser = ArgumentParser(prog='fetch', description='fetches something from the server or the cache by ID')
-        parser.add_argument("what", choices=[
-            'post', 
-            #'post-revision', 
-            #'wp-block', 
-            'category',
-            'tag',
-            'page',
-            'comment',
-            'media',
-            'user',
-            #'theme',
-            #'search-result',
-            ],
-            help='what to fetch')
+        parser.add_argument("what",
+            help='what to fetch (%s or a custom post type or taxonomy)' %
+            ", ".join(InteractiveShell.FETCH_TYPES))
         parser.add_argument("id", type=int, help='the ID of the content to fetch')
         parser.add_argument("--json", "-j", help="list and store as json to the specified file")
         parser.add_argument("--csv", "-c", help="list and store as csv to the specified file")
+        parser.add_argument("--sqlite", "-q", help="list and store in the specified sqlite database")
+        parser.add_argument("--compress", "-z", choices=COMPRESSIONS, help="compress json and csv files on the fly")
         parser.add_argument("--no-cache", dest="cache", action="store_false", help="don't lookup in cache and ask the server")
         args = parser.custom_parse_args(arg)
         what_type = None
         if args is None:
             return
-        what_type = WPApi.str_type_to_native(args.what)
+        if args.what in InteractiveShell.FETCH_TYPES:
+            what_type = WPApi.str_type_to_native(args.what)
+        else:
+            endpoint = self.find_custom_endpoint(args.what)
+            if endpoint is None:
+                Console.log_error("Unknown object type: %s" % args.what)
+                return
+            what_type = endpoint.key
         
         if what_type is not None:
-            self.fetch_obj(what_type, args.id, cache=args.cache, json=args.json, csv=args.csv)
+            self.fetch_obj(what_type, args.id, cache=args.cache, json=args.json, csv=args.csv, sqlite=args.sqlite, compress=args.compress)
         else:
             print("Not implemented")
             print()
@@ -396,35 +520,43 @@ class InteractiveShell(cmd.Cmd):
     def do_search(self, arg):
         'Looks for specific keywords in the WordPress API'
         parser = ArgumentParser(prog='search', description='searches something from the server')
-        parser.add_argument("--type", "-t", action="append", choices=[
-            'all',
-            'post', 
-            #'post-revision', 
-            #'wp-block', 
-            'category',
-            'tag',
-            'page',
-            'comment',
-            'media',
-            'user',
-            #'theme',
-            #'search-result',
-            ],
-            help='the types to look for (default all)',
+        parser.add_argument("--type", "-t", action="append",
+            help='the types to look for (all, %s or a custom post type or taxonomy, default all)' %
+            ", ".join(InteractiveShell.FETCH_TYPES),
             dest='what'
             )
         parser.add_argument("keywords", help='the keywords to look for')
         parser.add_argument("--json", "-j", help="list and store as json to the specified file(s)")
         parser.add_argument("--csv", "-c", help="list and store as csv to the specified file(s)")
+        parser.add_argument("--sqlite", "-q", help="list and store in the specified sqlite database")
+        parser.add_argument("--compress", "-z", choices=COMPRESSIONS, help="compress json and csv files on the fly")
         parser.add_argument("--limit", "-l", type=int, help="limit the number of results")
         parser.add_argument("--start", "-s", type=int, help="start at the given index")
+        parser.add_argument("--unified", "-u", action="store_true", help="find posts, pages and custom post types with a single wp/v2/search request")
+        parser.add_argument("--local", action="store_true", help="search the objects already listed, without any request (keywords may be scoped with title:, content:, author: or slug: and end with *)")
         args = parser.custom_parse_args(arg)
         if args is None:
             return
-        what_types = WPApi.convert_obj_types_to_list(args.what)
-        results = self.scanner.search(what_types, args.keywords, args.start, args.limit)
+        what = []
+        for name in args.what or []:
+            if name == 'all' or name in InteractiveShell.FETCH_TYPES:
+                what.append(name)
+                continue
+            endpoint = self.find_custom_endpoint(name)
+            if endpoint is None:
+                Console.log_error("Unknown object type: %s" % name)
+                return
+            what.append(endpoint.key)
+        what_types = WPApi.convert_obj_types_to_list(what)
+        if args.local:
+            if len(self.scanner.search_index) == 0:
+                Console.log_info("Nothing in cache, list some objects first")
+                return
+            results = self.scanner.local_search(what_types, args.keywords, args.start, args.limit).items()
+        else:
+            results = self.scanner.iter_search(what_types, args.keywords, args.start, args.limit, unified=args.unified)
         print()
-        for k, v in results.items():
+        for k, v in results:
             prop = self.get_fetch_or_list_type(k, plural=True)
             print(prop["obj_name"] + " details")
             if len(v) == 0:
@@ -438,7 +570,9 @@ class InteractiveShell(cmd.Cmd):
                         prop["obj_name"].lower(),
                         args.json,
                         args.csv,
-                        v
+                        v,
+                        sqlite=args.sqlite,
+                        compress=args.compress
                     )
                 except WordPressApiNotV2:
                     Console.log_error("The API does not support WP V2")
@@ -454,6 +588,8 @@ class InteractiveShell(cmd.Cmd):
         parser.add_argument("dest", help='destination folder')
         parser.add_argument("--no-cache", dest="cache", action="store_false", help="don't lookup in cache and ask the server")
         parser.add_argument("--use-slug", dest="slug", action="store_true", help="use the slug as filename and not the source URL name")
+        parser.add_argument("--dedup", dest="dedup", action="store_true", help="store files once per content in a .blobs folder and hard link them")
+        parser.add_argument("--blob-store", dest="blob_store", help="deduplicated storage folder to use (e.g. shared between targets), implies --dedup")
         args = parser.custom_parse_args(arg)
         if args is None:
             return
@@ -463,7 +599,7 @@ class InteractiveShell(cmd.Cmd):
             return
 
         print("Pulling the media URLs")
-        media, slugs = self.scanner.get_media_urls(args.ids, args.cache)
+        media, slugs, media_ids = self.scanner.get_media_urls(args.ids, args.cache, with_ids=True)
         if len(media) == 0:
             Console.log_error("No media found corresponding to the criteria")
             return
@@ -471,17 +607,85 @@ class InteractiveShell(cmd.Cmd):
         answer = input("Do you wish to proceed to download? (y/N)")
         if answer.lower() != "y":
             return
-        print("Note: Only files over 10MB are logged here")
-
+        blob_store = args.blob_store
+        if blob_store is None and args.dedup:
+            blob_store = os.path.join(args.dest, ".blobs")
         number_downloaded = 0
         if args.slug:
-            number_downloaded = Exporter.download_media(media, args.dest, slugs)
+            number_downloaded = Exporter.download_media(media, args.dest, slugs,
+                session=self.session, workers=self.workers, ids=media_ids,
+                blob_store=blob_store)
         else:
-            number_downloaded = Exporter.download_media(media, args.dest)
+            number_downloaded = Exporter.download_media(media, args.dest,
+                session=self.session, workers=self.workers, ids=media_ids,
+                blob_store=blob_store)
         print('Downloaded %d media to %s' % (number_downloaded, args.dest))
 
-def start_interactive(target, session, version):
+    def do_routes(self, arg):
+        'Displays the documentation of the routes published by the API'
+        parser = ArgumentParser(prog='routes', description='displays the routes of the API matching the given filters')
+        parser.add_argument("namespace", nargs='?', help='only display the routes of this namespace')
+        parser.add_argument("--method", "-m", help='only display the routes accepting this HTTP method')
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument("--parameterized", "-p", dest="parameterized", action="store_const", const=True,
+        help='only display the routes with parameters (e.g. IDs)')
+        group.add_argument("--static", "-s", dest="parameterized", action="store_const", const=False,
+        help='only display the routes without parameters')
+        args = parser.custom_parse_args(arg)
+        if args is None:
+            return
+        try:
+            index = self.scanner.get_route_index(args.namespace if args.namespace is not None else "all")
+        except NoWordpressApi:
+            Console.log_error("No WordPress API available at the given URL "
+            "(too old WordPress or not WordPress?)")
+            return
+        if args.namespace is not None and args.namespace not in index.by_namespace.keys():
+            Console.log_error("The specified namespace was not found")
+            return
+        routes = index.select(args.namespace, args.method, args.parameterized)
+        InfoDisplayer.display_endpoints({'routes': routes})
+        print("%d routes" % len(routes))
+        print()
+
+    def do_stats(self, arg):
+        'Displays the number, latency and size of the requests sent since the start of the session'
+        parser = ArgumentParser(prog='stats', description='displays statistics about the requests sent to the server')
+        parser.add_argument("--limit", "-l", type=int, default=15, help="the number of endpoints to display, slowest first (default 15)")
+        parser.add_argument("--reset", "-r", action="store_true", help="clear the statistics after displaying them")
+        args = parser.custom_parse_args(arg)
+        if args is None:
+            return
+        InfoDisplayer.display_stats(self.session.stats.summary(), args.limit)
+        if args.reset:
+            self.session.stats = RequestStats()
+
+    def do_profile(self, arg):
+        'Profiles the CPU time and the memory of the next commands, each command being a phase'
+        parser = ArgumentParser(prog='profile', description='profiles the CPU time and the memory of the next commands')
+        parser.add_argument("action", choices=["start", "stop"], help="start or stop profiling, the reports of each command being written when it ends")
+        parser.add_argument("folder", nargs="?", default="profile", help="the folder where the reports are written (default profile)")
+        args = parser.custom_parse_args(arg)
+        if args is None:
+            return
+        if args.action == "start":
+            if Profiler.enabled():
+                Console.log_error("The profiler is already started")
+                return
+            Profiler.start(args.folder)
+            Console.log_success("Profiling the next commands to %s" % args.folder)
+        else:
+            if not Profiler.enabled():
+                Console.log_error("The profiler is not started")
+                return
+            InfoDisplayer.display_profile(Profiler.stop())
+
+def start_interactive(target, session, version, workers=MediaDownloader.DEFAULT_WORKERS,
+                      scanner=None):
     """
     Starts a new interactive session
+    param scanner: the WPApi of the target, if already created
     """
-    InteractiveShell(target, session, version).cmdloop()
\ No newline at end of file
+    InteractiveShell(target, session, version, workers, scanner).cmdloop()
+    if Profiler.enabled():
+        InfoDisplayer.display_profile(Profiler.stop())
\ No newline at end of file
@@ -0,0 +1,178 @@
+"""
+Copyright (c) 2018-2020 Mickaël "Kilawyn" Walter
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import json
+import errno
+import shutil
+import hashlib
+import threading
+from urllib import parse as urlparse
+
+class MediaStore:
+    """
+        Content-addressed storage of media files.
+
+        Every file is stored once under its SHA-256 in the blob folder, the
+        files of the output folder being hard links (or copies when linking is
+        not possible) to these blobs. A manifest maps source URLs and media IDs
+        to the hashes so that known files are never fetched again.
+    """
+    MANIFEST_FILE = "manifest.json"
+    """
+        The name of the manifest in the blob folder
+    """
+    HASH_BUFFER_SIZE = 1024 * 1024
+    """
+        The size of the buffer used to hash files already on disk
+    """
+
+    def __init__(self, folder):
+        """
+            Creates or opens a blob store
+
+            :param folder: the blob folder, created if needed
+        """
+        self.folder = folder
+        self.lock = threading.Lock()
+        self.manifest = {"blobs": {}, "urls": {}, "media": {}}
+        os.makedirs(folder, exist_ok=True)
+        try:
+            with open(os.path.join(folder, MediaStore.MANIFEST_FILE), "rt", encoding="utf-8") as f:
+                self.manifest.update(json.load(f))
+        except (IOError, ValueError):
+            pass
+
+    def save(self):
+        """
+            Atomically writes the manifest
+        """
+        manifest_file = os.path.join(self.folder, MediaStore.MANIFEST_FILE)
+        with self.lock:
+            with open(manifest_file + ".tmp", "wt", encoding="utf-8") as f:
+                json.dump(self.manifest, f)
+        os.replace(manifest_file + ".tmp", manifest_file)
+
+    def blob_path(self, digest):
+        """
+            Returns the path of a blob given its hex digest
+        """
+        return os.path.join(self.folder, digest[:2], digest)
+
+    @staticmethod
+    def media_key(url, media_id):
+        """
+            Media IDs are only unique per site, so they are keyed by host
+        """
+        return "%s#%d" % (urlparse.urlparse(url).netloc, media_id)
+
+    @staticmethod
+    def new_hash():
+        """
+            Returns a new hash object as used for blob names
+        """
+        return hashlib.sha256()
+
+    @staticmethod
+    def hash_file(path, hasher):
+        """
+            Feeds the content of a file to the hasher (used when resuming a partial file)
+        """
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(MediaStore.HASH_BUFFER_SIZE), b""):
+                hasher.update(block)
+
+    def lookup(self, url, media_id=None):
+        """
+            Returns the blob information of an already stored media
+
+            :param url: the source URL of the media
+            :param media_id: the ID of the media, if known
+            :return: a dict with the digest, size and content type, or None
+        """
+        with self.lock:
+            digest = self.manifest["urls"].get(url)
+            if digest is None and media_id is not None:
+                digest = self.manifest["media"].get(MediaStore.media_key(url, media_id))
+            if digest is None or digest not in self.manifest["blobs"]:
+                return None
+            blob = dict(self.manifest["blobs"][digest])
+        if not os.path.isfile(self.blob_path(digest)):
+            return None
+        blob["digest"] = digest
+        return blob
+
+    def add(self, path, digest, url, media_id=None, content_type=None):
+        """
+            Moves a downloaded file into the store, dropping it if the content
+            is already stored
+
+            :param path: the downloaded file, removed from its location
+            :param digest: the hex digest of the file
+            :param url: the source URL
+            :param media_id: the ID of the media, if known
+            :param content_type: the Content-Type of the media
+        """
+        blob = self.blob_path(digest)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        if os.path.isfile(blob):
+            os.remove(path)
+        else:
+            try:
+                os.replace(path, blob)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                # The store is on another file system (e.g. a shared
+                # --blob-store): the file is copied next to the blob and
+                # renamed, so that the blob never appears partially written
+                tmp = "%s.%d.tmp" % (blob, threading.get_ident())
+                shutil.copyfile(path, tmp)
+                os.replace(tmp, blob)
+                os.remove(path)
+        with self.lock:
+            self.manifest["blobs"][digest] = {
+                "size": os.path.getsize(blob),
+                "content_type": content_type
+            }
+            self.manifest["urls"][url] = digest
+            if media_id is not None:
+                self.manifest["media"][MediaStore.media_key(url, media_id)] = digest
+
+    def materialize(self, digest, path):
+        """
+            Makes the blob available at the given path with a hard link, or a
+            copy if the file system does not allow it
+
+            :param digest: the hex digest of the blob
+            :param path: the destination path
+        """
+        blob = self.blob_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.isfile(path):
+            if os.path.samefile(blob, path):
+                return
+            os.remove(path)
+        try:
+            os.link(blob, path)
+        except OSError:
+            shutil.copyfile(blob, path)
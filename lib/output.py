@@ -0,0 +1,171 @@
+"""
+Copyright (c) 2018-2020 Mickaël "Kilawyn" Walter
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import io
+import os
+import bz2
+import gzip
+import lzma
+import time
+import tarfile
+
+from lib.defaults import COMPRESSIONS
+
+TAR_EXTENSIONS = {
+    '.tar': '',
+    '.tar.gz': 'gz',
+    '.tgz': 'gz',
+    '.tar.xz': 'xz',
+    '.txz': 'xz',
+    '.tar.bz2': 'bz2',
+    '.tbz2': 'bz2',
+}
+"""
+    Archive extensions and the compression they imply
+"""
+
+def split_compression(filename):
+    """
+    Splits the compression extension from a filename
+    @params:
+        filename: the filename (e.g. posts.json.gz)
+    @returns: a tuple (filename without compression extension, compression or None)
+    """
+    for compression in COMPRESSIONS:
+        if filename.endswith('.' + compression):
+            return filename[:-len(compression) - 1], compression
+    return filename, None
+
+def open_output(filename, compression=None):
+    """
+    Opens a text file for writing, compressed on the fly if the filename ends
+    with a compression extension or if a compression is given
+    @params:
+        filename: the path of the file
+        compression: gz, xz, bz2 or None to guess it from the extension
+    @returns: a writable text file object
+    """
+    if compression is None:
+        compression = split_compression(filename)[1]
+    if compression == 'gz':
+        return gzip.open(filename, "wt", encoding="utf-8", compresslevel=6)
+    elif compression == 'xz':
+        return lzma.open(filename, "wt", encoding="utf-8")
+    elif compression == 'bz2':
+        return bz2.open(filename, "wt", encoding="utf-8")
+    return open(filename, "w", encoding="utf-8")
+
+def open_input(filename):
+    """
+    Opens a text file for reading, decompressed on the fly if the filename
+    ends with a compression extension
+    @params:
+        filename: the path of the file
+    @returns: a readable text file object
+    """
+    compression = split_compression(filename)[1]
+    if compression == 'gz':
+        return gzip.open(filename, "rt", encoding="utf-8")
+    elif compression == 'xz':
+        return lzma.open(filename, "rt", encoding="utf-8")
+    elif compression == 'bz2':
+        return bz2.open(filename, "rt", encoding="utf-8")
+    return open(filename, "r", encoding="utf-8")
+
+def archive_compression(path):
+    """
+    Returns the compression of an archive path ('' for plain tar) or None if
+    the path is not an archive
+    """
+    for ext, compression in TAR_EXTENSIONS.items():
+        if path.endswith(ext):
+            return compression
+    return None
+
+def export_path(path, compression=None):
+    """
+    Returns the actual destination of an export folder: the path itself or
+    the tar archive written instead if a compression is requested
+    """
+    if compression is not None and archive_compression(path) is None:
+        return path + ".tar." + compression
+    return path
+
+class ExportFolder:
+    """
+    Destination of exports made of many small files: either a folder or a
+    single tar stream (optionally compressed) when the path has an archive
+    extension
+    """
+
+    def __init__(self, path, compression=None):
+        """
+        Opens the destination
+        param path: the folder or archive path
+        param compression: gz, xz or bz2 to write path + .tar.<compression>
+        instead of a folder
+        """
+        path = export_path(path, compression)
+        self.path = path
+        self.tar = None
+        tar_compression = archive_compression(path)
+        if tar_compression is not None:
+            # Stream mode, no seek back so the archive is written in one pass
+            self.tar = tarfile.open(path, "w|" + tar_compression)
+            self.root = os.path.basename(path)
+            for ext in TAR_EXTENSIONS.keys():
+                if self.root.endswith(ext):
+                    self.root = self.root[:-len(ext)]
+                    break
+        elif not os.path.isdir(path):
+            os.makedirs(path)
+
+    def write(self, relpath, text):
+        """
+        Writes a text file in the destination
+        param relpath: the path of the file relative to the destination
+        param text: the content of the file
+        """
+        if self.tar is not None:
+            data = text.encode("utf-8")
+            info = tarfile.TarInfo(self.root + "/" + relpath.replace(os.sep, "/"))
+            info.size = len(data)
+            info.mtime = int(time.time())
+            info.mode = 0o644
+            self.tar.addfile(info, io.BytesIO(data))
+        else:
+            path = os.path.join(self.path, relpath)
+            folder = os.path.dirname(path)
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            with open(path, "wt", encoding="utf-8") as f:
+                f.write(text)
+
+    def close(self):
+        if self.tar is not None:
+            self.tar.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,200 @@
+"""
+Copyright (c) 2018-2020 Mickaël "Kilawyn" Walter
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+import os
+import re
+import sys
+import json
+import time
+import threading
+
+# cProfile, pstats and tracemalloc are imported when profiling starts, as
+# Profiler.phase is called by every run
+
+class Profiler:
+    """
+    Profiles the CPU time and the memory allocations of the phases of a run
+    (discovery, crawl of each type, exports, downloads)
+
+    Phases follow each other: starting a phase ends the previous one. For
+    each phase, the cProfile statistics of all threads (the crawls use
+    worker threads) are written to a .prof file readable by pstats, and a
+    text report gives the functions taking most time, the peak of memory
+    traced by tracemalloc and the lines allocating most memory.
+    """
+    TOP_FUNCTIONS = 30
+    """
+        The number of functions listed in the reports
+    """
+    TOP_ALLOCATIONS = 15
+    """
+        The number of allocation sites listed in the reports
+    """
+    folder = None
+    current = None
+    phases = []
+    lock = threading.Lock()
+
+    @staticmethod
+    def start(folder):
+        """
+        Starts profiling, the reports being written to the given folder
+        param folder: the destination folder, created if needed
+        """
+        import tracemalloc
+        os.makedirs(folder, exist_ok=True)
+        Profiler.folder = folder
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        threading.setprofile(Profiler.profile_thread)
+
+    @staticmethod
+    def enabled():
+        return Profiler.folder is not None
+
+    @staticmethod
+    def profile_thread(frame, event, arg):
+        """
+        Profile function of the new threads, replaced by a profiler dedicated
+        to the thread as soon as the thread runs
+        """
+        import cProfile
+        sys.setprofile(None)
+        with Profiler.lock:
+            phase = Profiler.current
+            if phase is None:
+                return
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Since Python 3.12, the profiler of the phase sees every thread
+                return
+            phase['threads'].append(profiler)
+
+    @staticmethod
+    def phase(name):
+        """
+        Ends the current phase and starts a new one, does nothing if the
+        profiler is not started
+        param name: the name of the phase (e.g. crawl posts)
+        """
+        if Profiler.folder is None:
+            return
+        import cProfile
+        import tracemalloc
+        Profiler.end_phase()
+        phase = {
+            'name': name,
+            'threads': [],
+            'snapshot': tracemalloc.take_snapshot(),
+            'profiler': cProfile.Profile(),
+        }
+        tracemalloc.reset_peak()
+        phase['start_time'] = time.time()
+        with Profiler.lock:
+            Profiler.current = phase
+        phase['profiler'].enable()
+
+    @staticmethod
+    def end_phase():
+        """
+        Ends the current phase and writes its reports
+        return: the summary of the phase, None if no phase was running
+        """
+        phase = Profiler.current
+        if phase is None:
+            return None
+        import pstats
+        import tracemalloc
+        phase['profiler'].disable()
+        duration = time.time() - phase['start_time']
+        with Profiler.lock:
+            Profiler.current = None
+        peak = tracemalloc.get_traced_memory()[1]
+        snapshot = tracemalloc.take_snapshot()
+        filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ]
+        allocations = snapshot.filter_traces(filters).compare_to(
+            phase['snapshot'].filter_traces(filters), 'lineno')
+        allocations = [a for a in allocations if a.size_diff > 0]
+        allocations.sort(key=lambda a: a.size_diff, reverse=True)
+
+        stats = pstats.Stats(phase['profiler'])
+        for profiler in phase['threads']:
+            stats.add(profiler)
+
+        basename = "%02d-%s" % (len(Profiler.phases) + 1,
+            re.sub(r'[^A-Za-z0-9_.-]+', '_', phase['name']).strip('_'))
+        profile_file = os.path.join(Profiler.folder, basename + ".prof")
+        report_file = os.path.join(Profiler.folder, basename + ".txt")
+        stats.dump_stats(profile_file)
+        summary = {
+            'name': phase['name'],
+            'duration': duration,
+            'profiled_time': stats.total_tt,
+            'threads': len(phase['threads']) + 1,
+            'peak_memory': peak,
+            'allocated': sum(a.size_diff for a in allocations),
+            'profile': profile_file,
+            'report': report_file,
+        }
+        with open(report_file, "wt", encoding="utf-8") as f:
+            f.write("Phase: %s\n" % phase['name'])
+            # cProfile measures the wall clock time, waits on the network included
+            f.write("Duration: %.3fs, %.3fs profiled in %d threads\n" % (duration,
+                stats.total_tt, summary['threads']))
+            f.write("Peak of traced memory: %d bytes, %d bytes still allocated "
+                "at the end of the phase\n\n" % (peak, summary['allocated']))
+            f.write("Lines allocating most memory during the phase:\n")
+            for allocation in allocations[:Profiler.TOP_ALLOCATIONS]:
+                f.write("    %s\n" % allocation)
+            f.write("\n")
+            stats.stream = f
+            stats.sort_stats('cumulative').print_stats(Profiler.TOP_FUNCTIONS)
+            stats.sort_stats('tottime').print_stats(Profiler.TOP_FUNCTIONS)
+        Profiler.phases.append(summary)
+        return summary
+
+    @staticmethod
+    def stop():
+        """
+        Ends the current phase, writes the summary of all phases to
+        summary.json and stops profiling
+        return: the list of the summaries of the phases
+        """
+        if Profiler.folder is None:
+            return []
+        import tracemalloc
+        Profiler.end_phase()
+        threading.setprofile(None)
+        tracemalloc.stop()
+        with open(os.path.join(Profiler.folder, "summary.json"), "wt", encoding="utf-8") as f:
+            json.dump(Profiler.phases, f, indent=4)
+        Profiler.folder = None
+        phases = Profiler.phases
+        Profiler.phases = []
+        return phases
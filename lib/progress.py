@@ -0,0 +1,204 @@
+"""
+Copyright (c) 2018-2020 Mickaël "Kilawyn" Walter
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import sys
+import time
+import shutil
+import threading
+
+from lib.console import Console
+from lib.utils import format_size
+
+class ProgressTask:
+    """
+    A task reported by Progress (a collection crawl, a file download...)
+    """
+
+    def __init__(self, name, total=None, total_bytes=None):
+        """
+        Creates a task, see Progress.start
+        param name: the name displayed
+        param total: the number of items to process, if known
+        param total_bytes: the number of bytes to process, if known
+        """
+        self.name = name
+        self.total = total
+        self.total_bytes = total_bytes
+        self.done = 0
+        self.bytes = 0
+        self.start_time = time.time()
+        self.lock = threading.Lock()
+
+    def advance(self, items=1, size=0):
+        """
+        Records processed items and bytes
+        param items: the number of new items
+        param size: the number of new bytes
+        """
+        with self.lock:
+            self.done += items
+            self.bytes += size
+        Progress.refresh()
+
+    def set_total(self, total=None, total_bytes=None):
+        with self.lock:
+            if total is not None:
+                self.total = total
+            if total_bytes is not None:
+                self.total_bytes = total_bytes
+        Progress.refresh()
+
+    def close(self):
+        Progress.finish(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def describe(self, final=False):
+        """
+        Returns the state of the task as a short text (e.g. posts 300/2000
+        15% 45.0/s ETA 38s)
+        """
+        with self.lock:
+            done, total, size, total_bytes = self.done, self.total, self.bytes, self.total_bytes
+        elapsed = max(time.time() - self.start_time, 0.001)
+        text = self.name
+        if total is not None or done > 0:
+            text += " %d" % done
+            if total is not None:
+                text += "/%d" % total
+                if total > 0 and not final:
+                    text += " %d%%" % (100 * done // total)
+            text += " %.1f/s" % (done / elapsed)
+        if size > 0 or total_bytes is not None:
+            text += " %s" % format_size(size)
+            if total_bytes is not None:
+                text += "/%s" % format_size(total_bytes)
+            text += " %s/s" % format_size(size / elapsed)
+        if final:
+            text += " in %.1fs" % elapsed
+        else:
+            eta = None
+            if total_bytes is not None and size > 0:
+                eta = (total_bytes - size) * elapsed / size
+            elif total is not None and done > 0:
+                eta = (total - done) * elapsed / done
+            if eta is not None:
+                text += " ETA %ds" % max(0, eta)
+        return text
+
+class Progress:
+    """
+    Static class reporting the progress of concurrent tasks on the status line
+    of the console
+
+    Redraws are limited to one every REFRESH_INTERVAL seconds. When the
+    status line is not a terminal (e.g. redirected to a log file), a plain
+    line is written every LOG_INTERVAL seconds instead.
+    """
+    REFRESH_INTERVAL = 0.2
+    """
+        The minimal time between two redraws of the status line, in seconds
+    """
+    LOG_INTERVAL = 10
+    """
+        The time between two progress lines when not on a terminal, in seconds
+    """
+    SEPARATOR = " | "
+    tasks = []
+    lock = threading.RLock()
+    last_refresh = 0
+    interactive = None
+
+    @staticmethod
+    def is_interactive():
+        if Progress.interactive is None:
+            try:
+                Progress.interactive = sys.stderr.isatty()
+            except (AttributeError, ValueError):
+                Progress.interactive = False
+        return Progress.interactive
+
+    @staticmethod
+    def start(name, total=None, total_bytes=None):
+        """
+        Starts reporting a task
+        param name: the name displayed
+        param total: the number of items to process, if known
+        param total_bytes: the number of bytes to process, if known
+        return: the ProgressTask, to be closed when done
+        """
+        task = ProgressTask(name, total, total_bytes)
+        with Progress.lock:
+            Progress.tasks.append(task)
+        Progress.refresh(force=True)
+        return task
+
+    @staticmethod
+    def finish(task):
+        """
+        Stops reporting a task, its final state being written on its own line
+        """
+        with Progress.lock:
+            if task not in Progress.tasks:
+                return
+            Progress.tasks.remove(task)
+            with Console.status_lock:
+                Console.clear_status()
+                sys.stderr.write(task.describe(final=True) + "\n")
+                sys.stderr.flush()
+            Progress.refresh(force=True)
+
+    @staticmethod
+    def refresh(force=False):
+        """
+        Redraws the status line, if the last redraw is old enough
+        param force: redraw in any case (on a terminal)
+        """
+        now = time.time()
+        interval = Progress.REFRESH_INTERVAL if Progress.is_interactive() else Progress.LOG_INTERVAL
+        if not force and now - Progress.last_refresh < interval:
+            return
+        if not Progress.lock.acquire(blocking=False):
+            # Another thread is drawing
+            return
+        try:
+            if not Progress.is_interactive():
+                if now - Progress.last_refresh >= interval and len(Progress.tasks) > 0:
+                    Progress.last_refresh = now
+                    sys.stderr.write(Progress.SEPARATOR.join(t.describe() for t in Progress.tasks) + "\n")
+                    sys.stderr.flush()
+                return
+            Progress.last_refresh = now
+            if len(Progress.tasks) == 0:
+                Console.clear_status()
+                return
+            line = Progress.SEPARATOR.join(t.describe() for t in Progress.tasks)
+            width = shutil.get_terminal_size().columns - 1
+            if len(line) > width:
+                line = line[:max(0, width - 3)] + "..."
+            Console.show_status(line)
+        finally:
+            Progress.lock.release()
@@ -20,10 +20,13 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import time
 from http.cookies import SimpleCookie
 import requests
 
 from lib.console import Console
+from lib.eventlog import EventLog
+from lib.requeststats import RequestStats
 
 class ConnectionCouldNotResolve(Exception):
     pass
@@ -37,6 +40,12 @@ class ConnectionRefused(Exception):
 class ConnectionTimeout(Exception):
     pass
 
+class NotRecorded(Exception):
+    """
+    Raised when replaying a request absent from the archive
+    """
+    pass
+
 class HTTPError400(Exception):
     pass
 
@@ -49,6 +58,9 @@ class HTTPError403(Exception):
 class HTTPError404(Exception):
     pass
 
+class HTTPError416(Exception):
+    pass
+
 class HTTPError500(Exception):
     pass
 
@@ -83,13 +95,18 @@ class RequestSession:
             type(authorization) is requests.auth.HTTPBasicAuth or
             type(authorization) is requests.auth.HTTPDigestAuth):
             self.s.auth = authorization
+        self.stats = RequestStats()
+        self.recorder = None
+        self.replay = None
 
-    def get(self, url):
+    def get(self, url, headers=None, stream=False):
         """
         Calls the get function from requests but handles errors to raise proper
         exception following the context
+        param headers: additional headers to send with the request
+        param stream: if True, the body is not downloaded until accessed
         """
-        return self.do_request("get", url)
+        return self.do_request("get", url, headers=headers, stream=stream)
 
 
     def post(self, url, data=None):
@@ -99,18 +116,29 @@ class RequestSession:
         """
         return self.do_request("post", url, data)
 
-    def do_request(self, method, url, data=None):
+    def do_request(self, method, url, data=None, headers=None, stream=False):
         """
         Helper class to regroup requests and handle exceptions at the same
         location
         """
         response = None
+        start_time = time.time()
+        EventLog.emit('request_started', method=method, url=url)
         try:
-            if method == "post":
-                response = self.s.post(url, data)
+            if self.replay is not None:
+                response = self.replay.response(method, url, headers)
+            elif method == "post":
+                response = self.s.post(url, data, headers=headers)
             else:
-                response = self.s.get(url)
+                response = self.s.get(url, headers=headers, stream=stream)
+            if self.recorder is not None and self.replay is None:
+                response = self.recorder.record(method, url, headers, response, stream)
+        except NotRecorded as e:
+            self.record_failure(method, url, start_time, e)
+            Console.log_error(str(e))
+            raise e
         except requests.ConnectionError as e:
+            self.record_failure(method, url, start_time, e)
             if "Errno -5" in str(e) or "Errno -2" in str(e)\
               or "Errno -3" in str(e):
                 Console.log_error("Could not resolve host %s" % url)
@@ -125,7 +153,9 @@ class RequestSession:
                 print(e)
                 raise e
         except Exception as e:
+            self.record_failure(method, url, start_time, e)
             raise e
+        self.record(method, url, response, start_time, stream)
 
         if response.status_code == 400:
             raise HTTPError400
@@ -139,6 +169,8 @@ class RequestSession:
             raise HTTPError403
         elif response.status_code == 404:
             raise HTTPError404
+        elif response.status_code == 416:
+            raise HTTPError416
         elif response.status_code == 500:
             Console.log_error("Error 500 (Internal Server Error) while trying"
             " to fetch the API")
@@ -154,6 +186,57 @@ class RequestSession:
 
         return response
     
+    def record(self, method, url, response, start_time, stream=False):
+        """
+        Records the measures of a response in self.stats and the event log
+        """
+        if stream:
+            # The body is not read yet
+            size = int(response.headers.get('Content-Length', 0) or 0)
+        else:
+            size = len(response.content)
+        duration = time.time() - start_time
+        ttfb = response.elapsed.total_seconds()
+        self.stats.record(method, url, response.status_code, duration, ttfb,
+            size)
+        EventLog.emit('request_finished', method=method, url=url,
+            status=response.status_code, duration=round(duration, 6),
+            ttfb=round(ttfb, 6), bytes=size)
+
+    def record_failure(self, method, url, start_time, error):
+        """
+        Records a request which got no response
+        """
+        duration = time.time() - start_time
+        self.stats.record(method, url, duration=duration)
+        EventLog.emit('request_failed', method=method, url=url,
+            duration=round(duration, 6), error=type(error).__name__,
+            message=str(error))
+
+    def set_recorder(self, recorder):
+        """
+        Records every exchange from now on
+        param recorder: a TrafficRecorder or None to stop recording
+        """
+        self.recorder = recorder
+
+    def set_replay(self, archive):
+        """
+        Answers the requests with recorded exchanges instead of sending them
+        param archive: a TrafficArchive or None to use the network again
+        """
+        self.replay = archive
+
+    def set_max_connections(self, max_connections):
+        """
+        Sets the maximum number of connections kept open per host, should be
+        at least the number of threads sharing this session
+        """
+        adapter = requests.adapters.HTTPAdapter(pool_connections=max_connections,
+          pool_maxsize=max_connections)
+        self.s.mount("http://", adapter)
+        self.s.mount("https://", adapter)
+
     def set_cookies(self, cookies):
         """
         Sets new cookies from a string
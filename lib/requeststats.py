@@ -0,0 +1,157 @@
+"""
+Copyright (c) 2018-2020 Mickaël "Kilawyn" Walter
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import re
+import time
+import bisect
+import threading
+from urllib.parse import urlsplit
+
+class EndpointStats:
+    """
+    Measures of the requests sent to a single endpoint
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.count = 0
+        self.errors = 0
+        self.bytes = 0
+        self.statuses = {}
+        self.durations = []
+        self.ttfbs = []
+        self.histogram = [0] * (len(RequestStats.BUCKETS) + 1)
+
+    @staticmethod
+    def percentile(values, fraction):
+        """
+        Returns the value below which the given fraction of the values are
+        (nearest rank), None if there is no value
+        """
+        if len(values) == 0:
+            return None
+        values = sorted(values)
+        return values[min(len(values) - 1, int(fraction * len(values)))]
+
+    def summary(self):
+        """
+        Returns the measures as a dict (durations in seconds)
+        """
+        return {
+            'endpoint': self.key,
+            'requests': self.count,
+            'errors': self.errors,
+            'bytes': self.bytes,
+            'statuses': dict(self.statuses),
+            'total_time': sum(self.durations),
+            'p50': EndpointStats.percentile(self.durations, 0.5),
+            'p95': EndpointStats.percentile(self.durations, 0.95),
+            'p99': EndpointStats.percentile(self.durations, 0.99),
+            'max': max(self.durations) if len(self.durations) > 0 else None,
+            'ttfb_p50': EndpointStats.percentile(self.ttfbs, 0.5),
+            'histogram': list(self.histogram),
+        }
+
+class RequestStats:
+    """
+    Collects the timing, status and size of every request of a
+    RequestSession, aggregated per endpoint
+
+    Endpoints are URL paths where numeric segments are replaced by {id}
+    (e.g. /wp-json/wp/v2/posts/{id}/revisions) and uploaded files are grouped
+    under /wp-content/uploads/*.
+    """
+    BUCKETS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+    """
+        The upper bounds of the latency histogram buckets, in seconds (the
+        last bucket holds the slower requests)
+    """
+    NUMERIC_SEGMENT = re.compile(r"/\d+(?=/|$)")
+    UPLOADS = "/wp-content/uploads/"
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.start_time = time.time()
+
+    @staticmethod
+    def endpoint_key(method, url):
+        """
+        Returns the endpoint of a request, see RequestStats
+        """
+        path = urlsplit(url).path
+        if RequestStats.UPLOADS in path:
+            path = path[:path.index(RequestStats.UPLOADS) + len(RequestStats.UPLOADS)] + "*"
+        path = RequestStats.NUMERIC_SEGMENT.sub("/{id}", path)
+        return "%s %s" % (method.upper(), path)
+
+    def record(self, method, url, status=None, duration=0, ttfb=None, size=0):
+        """
+        Records a request
+        param method: the HTTP method
+        param url: the requested URL
+        param status: the status code of the response, None if no response
+        was received
+        param duration: the time spent in the request, in seconds
+        param ttfb: the time until the response headers were received
+        param size: the size of the response body, in bytes
+        """
+        key = RequestStats.endpoint_key(method, url)
+        with self.lock:
+            stats = self.endpoints.get(key)
+            if stats is None:
+                stats = EndpointStats(key)
+                self.endpoints[key] = stats
+            stats.count += 1
+            stats.bytes += size
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            if status is None or status >= 400:
+                stats.errors += 1
+            stats.durations.append(duration)
+            if ttfb is not None:
+                stats.ttfbs.append(ttfb)
+            stats.histogram[bisect.bisect_left(RequestStats.BUCKETS, duration)] += 1
+
+    def summary(self):
+        """
+        Returns the measures of every endpoint and of all the requests
+        return: a dict with the endpoints key (list of dicts, see
+        EndpointStats.summary, slowest total time first), the total key (the
+        same measures for all requests) and the elapsed key (time since the
+        stats were created)
+        """
+        with self.lock:
+            endpoints = [e.summary() for e in self.endpoints.values()]
+            total = EndpointStats("all")
+            for e in self.endpoints.values():
+                total.count += e.count
+                total.errors += e.errors
+                total.bytes += e.bytes
+                total.durations += e.durations
+                total.ttfbs += e.ttfbs
+                for i, count in enumerate(e.histogram):
+                    total.histogram[i] += count
+                for status, count in e.statuses.items():
+                    total.statuses[status] = total.statuses.get(status, 0) + count
+        endpoints.sort(key=lambda e: e['total_time'], reverse=True)
+        return {'endpoints': endpoints, 'total': total.summary(),
+                'elapsed': time.time() - self.start_time}
@@ -0,0 +1,195 @@
+"""
+Copyright (c) 2018-2020 Mickaël "Kilawyn" Walter
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import re
+
+class RouteIndex:
+    """
+        Lookup tables over the routes published by the API index.
+
+        The routes are walked once when the index is built, so selecting the
+        routes of a namespace, of a method or the crawlable ones does not
+        require to scan and check every route again.
+    """
+
+    PARAMETER_REGEX = re.compile(r"\(\?P<(\w+)>([^()]*)\)")
+    """
+        Matches the named groups of parameterized routes, e.g. (?P<id>[\\d]+)
+    """
+
+    def __init__(self, routes, namespaces=None):
+        """
+            Builds the index
+
+            :param routes: the routes dict of the API index (route -> route details)
+            :param namespaces: the namespaces of the API index
+        """
+        self.routes = routes if type(routes) is dict else {}
+        self.namespaces = list(namespaces) if namespaces is not None else []
+        self.by_namespace = {}
+        self.by_method = {}
+        self.static = []
+        self.parameterized = []
+        self.namespace_roots = set()
+        self.get_args = {}
+        self.required_args = {}
+        self.crawlable_cache = {}
+
+        namespace_set = set(self.namespaces)
+        for url, route in self.routes.items():
+            if type(route) is not dict:
+                continue
+            ns = route.get('namespace', '')
+            self.by_namespace.setdefault(ns, []).append(url)
+            if '(?P<' in url:
+                self.parameterized.append(url)
+            else:
+                self.static.append(url)
+            if url.lstrip('/') in namespace_set:
+                self.namespace_roots.add(url)
+            endpoints = route.get('endpoints')
+            if type(endpoints) is not list:
+                continue
+            methods = set()
+            for endpoint in endpoints:
+                methods.update(endpoint.get('methods', []))
+                if 'GET' not in endpoint.get('methods', []):
+                    continue
+                args = endpoint.get('args')
+                if type(args) is not dict:
+                    args = {}
+                required = [name for name, arg in args.items()
+                            if type(arg) is dict and arg.get('required')]
+                # The first GET endpoint without required argument is kept,
+                # all GET endpoints of a route share the same URL anyway
+                if url not in self.get_args.keys() or \
+                   len(self.required_args[url]) > 0 and len(required) == 0:
+                    self.get_args[url] = args
+                    self.required_args[url] = required
+            for method in methods:
+                self.by_method.setdefault(method, []).append(url)
+
+    def namespace_routes(self, ns):
+        """
+            Returns the routes of the given namespace
+        """
+        return self.by_namespace.get(ns, [])
+
+    def method_routes(self, method):
+        """
+            Returns the routes accepting the given HTTP method
+        """
+        return self.by_method.get(method.upper(), [])
+
+    def is_parameterized(self, url):
+        return '(?P<' in url
+
+    def crawlable(self, ns="all"):
+        """
+            Returns the GET routes of plugin namespaces that can be fetched
+            without any required argument
+
+            :param ns: the namespace or "all" for all plugin namespaces
+            :return: a list of (route, GET arguments) tuples
+        """
+        if ns in self.crawlable_cache.keys():
+            return self.crawlable_cache[ns]
+        if ns == "all":
+            urls = []
+            for namespace, ns_urls in self.by_namespace.items():
+                if namespace not in ['wp/v2', '']:
+                    urls += ns_urls
+        elif ns in ['wp/v2', '']:
+            urls = []
+        else:
+            urls = self.namespace_routes(ns)
+        crawlable = [(url, self.get_args[url]) for url in urls
+                     if url in self.get_args.keys()
+                     and len(self.required_args[url]) == 0
+                     and not self.is_parameterized(url)
+                     and url not in self.namespace_roots]
+        self.crawlable_cache[ns] = crawlable
+        return crawlable
+
+    def probeable(self, ns="all"):
+        """
+            Returns the GET routes of plugin namespaces having exactly one
+            numeric parameter and no other required argument, whose values
+            can be enumerated
+
+            :param ns: the namespace or "all" for all plugin namespaces
+            :return: a list of (route, parameter name, collection route) tuples,
+            the collection route being the route without the parameter
+        """
+        if ns == "all":
+            urls = []
+            for namespace, ns_urls in self.by_namespace.items():
+                if namespace not in ['wp/v2', '']:
+                    urls += ns_urls
+        elif ns in ['wp/v2', '']:
+            urls = []
+        else:
+            urls = self.namespace_routes(ns)
+        probeable = []
+        for url in urls:
+            if url not in self.get_args.keys() or not self.is_parameterized(url):
+                continue
+            params = RouteIndex.PARAMETER_REGEX.findall(url)
+            if len(params) != 1 or '\\d' not in params[0][1]:
+                continue
+            name = params[0][0]
+            if len([arg for arg in self.required_args[url] if arg != name]) > 0:
+                continue
+            match = RouteIndex.PARAMETER_REGEX.search(url)
+            collection = url[:match.start()].rstrip('/')
+            probeable.append((url, name, collection))
+        return probeable
+
+    @staticmethod
+    def fill(url, value):
+        """
+            Replaces the parameter of a route by the given value
+        """
+        return RouteIndex.PARAMETER_REGEX.sub(str(value), url, count=1)
+
+    def select(self, ns=None, method=None, parameterized=None):
+        """
+            Returns the routes matching all the given criteria
+
+            :param ns: a namespace, or None for all
+            :param method: an HTTP method, or None for all
+            :param parameterized: True for routes with parameters only, False
+            for static routes only, None for all
+            :return: a dict of route -> route details, in the order of the API index
+        """
+        urls = None
+        for selected in [
+            self.namespace_routes(ns) if ns is not None else None,
+            self.method_routes(method) if method is not None else None,
+            None if parameterized is None else
+                (self.parameterized if parameterized else self.static)]:
+            if selected is None:
+                continue
+            urls = set(selected) if urls is None else urls & set(selected)
+        if urls is None:
+            return dict(self.routes)
+        return {url: route for url, route in self.routes.items() if url in urls}
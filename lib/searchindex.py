@@ -0,0 +1,212 @@
+"""
+Copyright (c) 2018-2020 Mickaël "Kilawyn" Walter
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import re
+import html
+import bisect
+import threading
+
+class SearchIndex:
+    """
+        Inverted index of the objects crawled by WPApi, answering keyword
+        searches without any request to the server.
+
+        Objects are tokenized as they are crawled, so that a search only looks
+        up the postings of its words. Queries are made of words which must all
+        be found in an object, each word being optionally scoped to a field (e.g.
+        title:hello author:admin) or ending with * to match a prefix.
+    """
+    FIELDS = ['title', 'content', 'author', 'slug']
+    """
+        The fields a query word can be scoped to
+    """
+    TOKEN_REGEX = re.compile(r"\w+")
+    TAG_REGEX = re.compile(r"<[^>]*>")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.documents = []
+        # The terms indexed for each document, removed when it is replaced
+        self.document_terms = []
+        self.doc_ids = {}
+        # field (None for all fields) -> token -> set of document numbers
+        self.postings = {field: {} for field in SearchIndex.FIELDS + [None]}
+        self.vocabulary = None
+
+    @staticmethod
+    def tokenize(text):
+        """
+            Returns the lowercase words of a text, HTML tags and entities removed
+        """
+        if type(text) is not str:
+            return []
+        text = html.unescape(SearchIndex.TAG_REGEX.sub(" ", text))
+        return SearchIndex.TOKEN_REGEX.findall(text.lower())
+
+    @staticmethod
+    def rendered(value):
+        if type(value) is dict:
+            value = value.get('rendered')
+        return value if type(value) is str else None
+
+    @staticmethod
+    def fields(obj):
+        """
+            Returns the text of the indexed fields of an object
+
+            :param obj: a post, page, comment, user, term, media... as returned by the API
+            :return: a dict field -> list of texts
+        """
+        fields = {
+            'title': [SearchIndex.rendered(obj.get('title')), obj.get('name')],
+            'content': [SearchIndex.rendered(obj.get(key)) for key in
+                        ['content', 'excerpt', 'description', 'caption']],
+            'author': [obj.get('author_name')],
+            'slug': [obj.get('slug')],
+        }
+        if type(obj.get('author')) is int:
+            fields['author'].append(str(obj['author']))
+        return fields
+
+    def add(self, obj_type, objects):
+        """
+            Indexes crawled objects, objects already indexed being replaced by
+            their new version
+
+            :param obj_type: the type of the objects (e.g. WPApi.POST)
+            :param objects: the list of objects
+        """
+        with self.lock:
+            self.vocabulary = None
+            for obj in objects:
+                if type(obj) is dict and 'id' in obj.keys():
+                    self.index(obj_type, obj)
+
+    @staticmethod
+    def terms(obj):
+        """
+            Returns the tokens of each field of an object
+        """
+        terms = {}
+        for field, texts in SearchIndex.fields(obj).items():
+            tokens = set()
+            for text in texts:
+                tokens.update(SearchIndex.tokenize(text))
+            terms[field] = tokens
+        terms[None] = set().union(*terms.values())
+        return terms
+
+    def index(self, obj_type, obj):
+        key = (obj_type, obj['id'])
+        doc_id = self.doc_ids.get(key)
+        terms = SearchIndex.terms(obj)
+        if doc_id is None:
+            doc_id = len(self.documents)
+            self.doc_ids[key] = doc_id
+            self.documents.append((obj_type, obj))
+            self.document_terms.append(terms)
+        else:
+            # The previous version may be the same dict, modified in place
+            # since, so the terms recorded at indexing time are removed
+            for field, tokens in self.document_terms[doc_id].items():
+                postings = self.postings[field]
+                for token in tokens:
+                    postings[token].discard(doc_id)
+                    if len(postings[token]) == 0:
+                        del postings[token]
+            self.documents[doc_id] = (obj_type, obj)
+            self.document_terms[doc_id] = terms
+        for field, tokens in terms.items():
+            postings = self.postings[field]
+            for token in tokens:
+                doc_ids = postings.get(token)
+                if doc_ids is None:
+                    postings[token] = {doc_id}
+                else:
+                    doc_ids.add(doc_id)
+
+    def __len__(self):
+        return len(self.documents)
+
+    def match(self, field, token):
+        """
+            Returns the documents having the token (or a token starting with
+            it if it ends with *) in the given field (None for any field)
+        """
+        postings = self.postings[field]
+        if not token.endswith("*"):
+            return postings.get(token, set())
+        if self.vocabulary is None:
+            self.vocabulary = {f: sorted(p.keys()) for f, p in self.postings.items()}
+        vocabulary = self.vocabulary[field]
+        prefix = token[:-1]
+        found = set()
+        i = bisect.bisect_left(vocabulary, prefix)
+        while i < len(vocabulary) and vocabulary[i].startswith(prefix):
+            found |= postings[vocabulary[i]]
+            i += 1
+        return found
+
+    def search(self, query, obj_types=None, authors=None):
+        """
+            Looks for the objects matching all the words of the query
+
+            :param query: the query (e.g. "hello title:world author:admin slug:foo*")
+            :param obj_types: the types to look for, None for all
+            :param authors: a dict author ID -> name used to resolve author:
+            words, in addition to the comment author names
+            :return: a dict type -> list of objects, in indexing order
+        """
+        with self.lock:
+            return self.lookup(query, obj_types, authors)
+
+    def lookup(self, query, obj_types, authors):
+        if authors is None:
+            authors = {}
+        candidates = None
+        for word in query.split():
+            field = None
+            if ":" in word and word.split(":", 1)[0].lower() in SearchIndex.FIELDS:
+                field, word = word.split(":", 1)
+                field = field.lower()
+            prefix = word.endswith("*")
+            tokens = SearchIndex.tokenize(word)
+            if prefix and len(tokens) > 0:
+                tokens[-1] += "*"
+            for token in tokens:
+                found = self.match(field, token)
+                if field == 'author':
+                    found = set(found)
+                    for author_id, name in authors.items():
+                        names = SearchIndex.tokenize(name)
+                        if (token in names) or (token.endswith("*") and
+                            any(n.startswith(token[:-1]) for n in names)):
+                            found |= self.postings['author'].get(str(author_id), set())
+                candidates = found if candidates is None else candidates & found
+        results = {}
+        if candidates is None:
+            return results
+        for doc_id in sorted(candidates):
+            obj_type, obj = self.documents[doc_id]
+            if obj_types is None or obj_type in obj_types:
+                results.setdefault(obj_type, []).append(obj)
+        return results
@@ -0,0 +1,296 @@
+"""
+Copyright (c) 2018-2020 Mickaël "Kilawyn" Walter
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import html
+import json
+import sqlite3
+
+class SQLiteExporter:
+    """
+        Writes WordPress objects to normalized tables of a SQLite database.
+
+        Every table also has a raw column holding the full JSON object, which
+        can be queried with the SQLite JSON functions.
+    """
+    BATCH_SIZE = 5000
+    """
+        The number of rows given to each executemany call
+    """
+    TABLES = {
+        'users': [
+            ('id', 'id', 'INTEGER PRIMARY KEY'),
+            ('name', 'name', 'TEXT'),
+            ('slug', 'slug', 'TEXT'),
+            ('description', 'description', 'TEXT'),
+            ('url', 'url', 'TEXT'),
+            ('link', 'link', 'TEXT'),
+        ],
+        'categories': [
+            ('id', 'id', 'INTEGER PRIMARY KEY'),
+            ('name', 'name', 'TEXT'),
+            ('slug', 'slug', 'TEXT'),
+            ('description', 'description', 'TEXT'),
+            ('count', 'count', 'INTEGER'),
+            ('parent', 'parent', 'INTEGER'),
+            ('link', 'link', 'TEXT'),
+        ],
+        'tags': [
+            ('id', 'id', 'INTEGER PRIMARY KEY'),
+            ('name', 'name', 'TEXT'),
+            ('slug', 'slug', 'TEXT'),
+            ('description', 'description', 'TEXT'),
+            ('count', 'count', 'INTEGER'),
+            ('link', 'link', 'TEXT'),
+        ],
+        'terms': [
+            ('id', 'id', 'INTEGER PRIMARY KEY'),
+            ('taxonomy', 'taxonomy', 'TEXT'),
+            ('name', 'name', 'TEXT'),
+            ('slug', 'slug', 'TEXT'),
+            ('description', 'description', 'TEXT'),
+            ('count', 'count', 'INTEGER'),
+            ('parent', 'parent', 'INTEGER'),
+            ('link', 'link', 'TEXT'),
+        ],
+        'posts': [
+            ('id', 'id', 'INTEGER PRIMARY KEY'),
+            ('date_gmt', 'date_gmt', 'TEXT'),
+            ('modified_gmt', 'modified_gmt', 'TEXT'),
+            ('slug', 'slug', 'TEXT'),
+            ('status', 'status', 'TEXT'),
+            ('type', 'type', 'TEXT'),
+            ('link', 'link', 'TEXT'),
+            ('title', ['title', 'rendered'], 'TEXT'),
+            ('content', ['content', 'rendered'], 'TEXT'),
+            ('excerpt', ['excerpt', 'rendered'], 'TEXT'),
+            ('protected', ['content', 'protected'], 'INTEGER'),
+            ('author', 'author', 'INTEGER'),
+            ('comment_status', 'comment_status', 'TEXT'),
+        ],
+        'pages': [
+            ('id', 'id', 'INTEGER PRIMARY KEY'),
+            ('date_gmt', 'date_gmt', 'TEXT'),
+            ('modified_gmt', 'modified_gmt', 'TEXT'),
+            ('slug', 'slug', 'TEXT'),
+            ('status', 'status', 'TEXT'),
+            ('link', 'link', 'TEXT'),
+            ('title', ['title', 'rendered'], 'TEXT'),
+            ('content', ['content', 'rendered'], 'TEXT'),
+            ('excerpt', ['excerpt', 'rendered'], 'TEXT'),
+            ('protected', ['content', 'protected'], 'INTEGER'),
+            ('author', 'author', 'INTEGER'),
+            ('parent', 'parent', 'INTEGER'),
+            ('template', 'template', 'TEXT'),
+        ],
+        'media': [
+            ('id', 'id', 'INTEGER PRIMARY KEY'),
+            ('date_gmt', 'date_gmt', 'TEXT'),
+            ('slug', 'slug', 'TEXT'),
+            ('status', 'status', 'TEXT'),
+            ('link', 'link', 'TEXT'),
+            ('title', ['title', 'rendered'], 'TEXT'),
+            ('author', 'author', 'INTEGER'),
+            ('post', 'post', 'INTEGER'),
+            ('media_type', 'media_type', 'TEXT'),
+            ('mime_type', 'mime_type', 'TEXT'),
+            ('source_url', 'source_url', 'TEXT'),
+            ('alt_text', 'alt_text', 'TEXT'),
+        ],
+        'revisions': [
+            ('id', 'id', 'INTEGER PRIMARY KEY'),
+            ('parent', 'parent', 'INTEGER'),
+            ('kind', None, 'TEXT'),
+            ('date_gmt', 'date_gmt', 'TEXT'),
+            ('modified_gmt', 'modified_gmt', 'TEXT'),
+            ('author', 'author', 'INTEGER'),
+            ('title', ['title', 'rendered'], 'TEXT'),
+            ('content', ['content', 'rendered'], 'TEXT'),
+            ('excerpt', ['excerpt', 'rendered'], 'TEXT'),
+        ],
+        'comments': [
+            ('id', 'id', 'INTEGER PRIMARY KEY'),
+            ('post', 'post', 'INTEGER'),
+            ('parent', 'parent', 'INTEGER'),
+            ('author', 'author', 'INTEGER'),
+            ('author_name', 'author_name', 'TEXT'),
+            ('author_url', 'author_url', 'TEXT'),
+            ('date_gmt', 'date_gmt', 'TEXT'),
+            ('status', 'status', 'TEXT'),
+            ('link', 'link', 'TEXT'),
+            ('content', ['content', 'rendered'], 'TEXT'),
+        ],
+    }
+    """
+        Columns of each table: (column name, key or key path in the object, SQL type),
+        a None key being a value given for all the inserted objects
+    """
+    LINK_TABLES = [
+        "CREATE TABLE IF NOT EXISTS post_terms (post_id INTEGER, term_id INTEGER, "
+        "taxonomy TEXT, PRIMARY KEY (post_id, term_id, taxonomy))",
+        "CREATE TABLE IF NOT EXISTS post_comments (post_id INTEGER, comment_id INTEGER, "
+        "PRIMARY KEY (post_id, comment_id))",
+        "CREATE INDEX IF NOT EXISTS post_terms_term ON post_terms (term_id)",
+        "CREATE INDEX IF NOT EXISTS post_comments_comment ON post_comments (comment_id)",
+        "CREATE INDEX IF NOT EXISTS posts_author ON posts (author)",
+        "CREATE INDEX IF NOT EXISTS comments_post ON comments (post)",
+        "CREATE INDEX IF NOT EXISTS revisions_parent ON revisions (parent)",
+    ]
+
+    def __init__(self, filename):
+        """
+            Opens (and creates if needed) the database
+
+            :param filename: the path of the SQLite file
+        """
+        self.conn = sqlite3.connect(filename)
+        # The export can be rebuilt from scratch, durability is not worth the fsyncs
+        self.conn.execute("PRAGMA journal_mode=MEMORY")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        with self.conn:
+            for table, columns in SQLiteExporter.TABLES.items():
+                self.conn.execute("CREATE TABLE IF NOT EXISTS %s (%s, raw TEXT)" % (table,
+                    ", ".join("%s %s" % (c[0], c[2]) for c in columns)))
+            for statement in SQLiteExporter.LINK_TABLES:
+                self.conn.execute(statement)
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def select(obj, key):
+        """
+            Returns the value of the object at the given key or key path, None if absent
+        """
+        if type(key) is str:
+            key = [key]
+        selected = obj
+        for k in key:
+            if type(selected) is not dict or k not in selected.keys():
+                return None
+            selected = selected[k]
+        if type(selected) is dict or type(selected) is list:
+            return json.dumps(selected, ensure_ascii=False)
+        return selected
+
+    def executemany_batched(self, statement, rows):
+        """
+            Runs executemany over batches of rows taken from an iterable
+        """
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= SQLiteExporter.BATCH_SIZE:
+                self.conn.executemany(statement, batch)
+                batch = []
+        if len(batch) > 0:
+            self.conn.executemany(statement, batch)
+
+    def insert_objects(self, table, objects, values=None):
+        """
+            Inserts (or replaces) objects in the given table
+
+            :param table: the table name (a key of TABLES)
+            :param objects: the list of objects as returned by the API
+            :param values: the values of the columns not read from the objects (column -> value)
+            :return: the number of objects inserted
+        """
+        if values is None:
+            values = {}
+        columns = SQLiteExporter.TABLES[table]
+        statement = "INSERT OR REPLACE INTO %s (%s, raw) VALUES (%s)" % (table,
+            ", ".join(c[0] for c in columns), ", ".join(["?"] * (len(columns) + 1)))
+        objects = [o for o in objects if o is not None and 'id' in o.keys()]
+
+        def rows():
+            for obj in objects:
+                row = []
+                for c in columns:
+                    if c[1] is None:
+                        row.append(values.get(c[0]))
+                        continue
+                    value = SQLiteExporter.select(obj, c[1])
+                    if c[0] == 'title' and type(value) is str:
+                        value = html.unescape(value)
+                    row.append(value)
+                row.append(json.dumps(obj, ensure_ascii=False))
+                yield row
+        self.executemany_batched(statement, rows())
+        return len(objects)
+
+    def insert_post_links(self, posts):
+        """
+            Fills the post_terms and post_comments link tables from post objects
+        """
+        def terms():
+            for post in posts:
+                for taxonomy, key in [('category', 'categories'), ('post_tag', 'tags')]:
+                    if type(post.get(key)) is list:
+                        for term_id in post[key]:
+                            yield (post['id'], term_id, taxonomy)
+        def comments():
+            for post in posts:
+                if type(post.get('comments')) is list:
+                    for comment in post['comments']:
+                        yield (post['id'], comment['id'])
+        self.executemany_batched("INSERT OR IGNORE INTO post_terms VALUES (?, ?, ?)", terms())
+        self.executemany_batched("INSERT OR IGNORE INTO post_comments VALUES (?, ?)", comments())
+
+    def insert_comment_links(self, comments):
+        """
+            Fills the post_comments link table from comment objects
+        """
+        self.executemany_batched("INSERT OR IGNORE INTO post_comments VALUES (?, ?)",
+            ((c['post'], c['id']) for c in comments if type(c.get('post')) is int))
+
+    def write(self, posts=None, pages=None, users=None, tags=None, categories=None,
+              media=None, comments=None, terms=None):
+        """
+            Writes the given lists of objects in a single transaction, terms
+            being those of custom taxonomies
+
+            :return: the total number of objects written
+        """
+        total = 0
+        with self.conn:
+            for table, objects in [('users', users), ('categories', categories),
+                                   ('tags', tags), ('terms', terms), ('posts', posts), ('pages', pages),
+                                   ('media', media), ('comments', comments)]:
+                if objects is None:
+                    continue
+                total += self.insert_objects(table, objects)
+                if table in ['posts', 'pages']:
+                    parents = [o for o in objects if o is not None and 'id' in o.keys()]
+                    self.insert_post_links(parents)
+                    embedded_comments = []
+                    for parent in parents:
+                        if type(parent.get('comments')) is list:
+                            embedded_comments += parent['comments']
+                    self.insert_objects('comments', embedded_comments)
+                    for key, kind in [('revisions', 'revision'), ('autosaves', 'autosave')]:
+                        embedded_revisions = []
+                        for parent in parents:
+                            if type(parent.get(key)) is list:
+                                embedded_revisions += parent[key]
+                        self.insert_objects('revisions', embedded_revisions, {'kind': kind})
+                elif table == 'comments':
+                    self.insert_comment_links([c for c in objects if c is not None and 'id' in c.keys()])
+        return total
@@ -0,0 +1,197 @@
+"""
+Copyright (c) 2018-2020 Mickaël "Kilawyn" Walter
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+import io
+import json
+import time
+import base64
+import threading
+from datetime import timedelta
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3 import HTTPResponse
+
+from lib.output import open_output, open_input
+from lib.requestsession import NotRecorded
+
+ARCHIVE_FORMAT = "wpjsonscraper-traffic"
+"""
+    Name of the format written on the first line of the archives
+"""
+
+class TrafficRecorder:
+    """
+    Records the HTTP exchanges of a RequestSession to an archive
+
+    The archive is a NDJSON file: a first line describing the archive, then
+    an exchange per line (request method, URL and range, response status,
+    headers and decoded body). It is compressed on the fly if its name ends
+    with .gz, .xz or .bz2. The bodies of streamed responses (media
+    downloads) are left out unless asked for, they are neither read in
+    memory nor written.
+    """
+
+    def __init__(self, filename, target=None, stream_bodies=False):
+        """
+        Creates the archive
+        param filename: the path of the archive
+        param target: the URL of the scanned site, kept in the archive
+        param stream_bodies: if True, the bodies of streamed responses are
+        recorded too
+        """
+        self.lock = threading.Lock()
+        self.count = 0
+        self.stream_bodies = stream_bodies
+        self.file = open_output(filename)
+        self.file.write(json.dumps({'format': ARCHIVE_FORMAT, 'version': 1,
+            'target': target, 'created': time.strftime("%Y-%m-%dT%H:%M:%S")}) + "\n")
+
+    def record(self, method, url, headers, response, stream=False):
+        """
+        Writes an exchange to the archive
+        param method: the method of the request (get or post)
+        param url: the URL of the request
+        param headers: the additional headers of the request
+        param response: the response, its body is read if it was streamed and
+        stream bodies are recorded
+        param stream: if True, the response was streamed
+        return: a response equivalent to the given one, to be used instead
+        """
+        exchange = {
+            'method': method,
+            'url': url,
+            'range': (headers or {}).get('Range'),
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': dict(response.headers),
+            'elapsed': response.elapsed.total_seconds(),
+        }
+        body = None
+        if stream and not self.stream_bodies:
+            exchange['body_omitted'] = True
+        else:
+            body = response.content
+            try:
+                exchange['body'] = body.decode('utf-8')
+            except UnicodeDecodeError:
+                exchange['body_base64'] = base64.b64encode(body).decode('ascii')
+        line = json.dumps(exchange, ensure_ascii=False, separators=(',', ':')) + "\n"
+        with self.lock:
+            if self.file is not None:
+                self.file.write(line)
+                self.count += 1
+        if body is None:
+            return response
+        return TrafficArchive.build_response(exchange, body)
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+class TrafficArchive:
+    """
+    Answers the requests of a RequestSession with the exchanges of an
+    archive written by TrafficRecorder, without any network access
+
+    The archive is loaded in memory. Requests are matched by method, URL and
+    range; a request sent several times gets the recorded responses in turn,
+    the last one being given again once they are all used. Exchanges recorded
+    without their body are not answered.
+    """
+
+    def __init__(self, filename):
+        """
+        Loads an archive
+        param filename: the path of the archive
+        """
+        self.lock = threading.Lock()
+        self.filename = filename
+        self.exchanges = {}
+        self.target = None
+        with open_input(filename) as f:
+            header = json.loads(f.readline())
+            if header.get('format') != ARCHIVE_FORMAT:
+                raise ValueError("%s is not a traffic archive" % filename)
+            self.target = header.get('target')
+            for line in f:
+                exchange = json.loads(line)
+                if 'body' in exchange:
+                    body = exchange.pop('body').encode('utf-8')
+                elif 'body_base64' in exchange:
+                    body = base64.b64decode(exchange.pop('body_base64'))
+                else:
+                    body = None
+                key = (exchange['method'], exchange['url'], exchange.get('range'))
+                self.exchanges.setdefault(key, []).append((exchange, body))
+        self.positions = dict((key, 0) for key in self.exchanges.keys())
+
+    def __len__(self):
+        return sum(len(e) for e in self.exchanges.values())
+
+    def response(self, method, url, headers=None):
+        """
+        Returns the recorded response of a request
+        param method: the method of the request
+        param url: the URL of the request
+        param headers: the additional headers of the request
+        """
+        key = (method, url, (headers or {}).get('Range'))
+        with self.lock:
+            exchanges = self.exchanges.get(key)
+            if exchanges is None:
+                raise NotRecorded("not in archive %s: %s %s" % (self.filename,
+                    method.upper(), url))
+            position = self.positions[key]
+            self.positions[key] = min(position + 1, len(exchanges) - 1)
+        exchange, body = exchanges[position]
+        if body is None:
+            raise NotRecorded("body not in archive %s: %s %s" % (self.filename,
+                method.upper(), url))
+        return TrafficArchive.build_response(exchange, body)
+
+    @staticmethod
+    def build_response(exchange, body):
+        """
+        Builds a response holding a recorded exchange, its body being read
+        either at once (content) or by chunks (raw.read) like a streamed one
+        """
+        headers = CaseInsensitiveDict(exchange['headers'])
+        # The body is stored decoded
+        for key in ['Content-Encoding', 'Transfer-Encoding']:
+            if key in headers:
+                del headers[key]
+        headers['Content-Length'] = str(len(body))
+        response = requests.Response()
+        response.status_code = exchange['status']
+        response.reason = exchange.get('reason')
+        response.headers = headers
+        response.url = exchange['url']
+        response.encoding = get_encoding_from_headers(headers)
+        response.elapsed = timedelta(seconds=exchange.get('elapsed', 0))
+        response.raw = HTTPResponse(body=io.BytesIO(body), headers=dict(headers),
+            status=exchange['status'], preload_content=False)
+        return response
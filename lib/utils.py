@@ -54,37 +54,6 @@ def url_path_join(*parts):
 def first(sequence, default=''):
     return next((x for x in sequence if x), default)
 
-# Code from https://stackoverflow.com/questions/3173320/text-progress-bar-in-th
-# e-console
-
-def print_progress_bar (iteration, total, prefix = '', suffix = '', decimals = 1,\
- length = 100, fill = '█'):
-    """
-    Call in a loop to create terminal progress bar
-    @params:
-        iteration   - Required  : current iteration (Int)
-        total       - Required  : total iterations (Int)
-        prefix      - Optional  : prefix string (Str)
-        suffix      - Optional  : suffix string (Str)
-        decimals    - Optional  : positive number of decimals in percent \
-        complete (Int)
-        length      - Optional  : character length of bar (Int)
-        fill        - Optional  : bar fill character (Str)
-    """
-    try:
-      percent = ("{0:." + str(decimals) + "f}").format(100 * (iteration / \
-      float(total)))
-      filledLength = int(length * iteration // total)
-    except:
-      percent = 0
-      filledLength = 0
-
-    bar = fill * filledLength + '-' * (length - filledLength)
-    print('\r%s |%s| %s%% %s' % (prefix, bar, percent, suffix), end = '\r')
-    # Print New Line on Complete
-    if iteration == total: 
-        print()
-
 def get_content_as_json (response_obj):
     """
     When a BOM is present (see issue #2), UTF-8 is not properly decoded by 
@@ -102,3 +71,16 @@ def get_content_as_json (response_obj):
             return response_obj.json()
         except:
             return {}
+
+def format_size(size):
+    """
+    Returns a human readable representation of a size in bytes
+    @params:
+        size: the size in bytes (Int or Float)
+    @returns: a string such as "12.3 MB"
+    """
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if abs(size) < 1024:
+            return "%.1f %s" % (size, unit)
+        size /= 1024
+    return "%.1f TB" % size
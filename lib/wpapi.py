@@ -21,17 +21,30 @@ SOFTWARE.
 """
 
 import math
-import copy
+import time
+import json
+import hashlib
+import itertools
+from collections import deque
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import requests
 from urllib.parse import urlencode
 
 from json.decoder import JSONDecodeError
 
+from lib import defaults
 from lib.exceptions import NoWordpressApi, WordPressApiNotV2, \
                             NSNotFoundException
-from lib.requestsession import RequestSession, HTTPError400, HTTPError404
-from lib.utils import url_path_join, print_progress_bar, get_content_as_json, get_by_id
+from lib.requestsession import RequestSession, HTTPError400, HTTPError404, \
+                               NotRecorded
+from lib.routeindex import RouteIndex
+from lib.endpoints import Endpoint, EndpointRegistry
+from lib.searchindex import SearchIndex
+from lib.utils import url_path_join, get_content_as_json, get_by_id
+from lib.progress import Progress
+from lib.eventlog import EventLog
 
 class WPApi:
     """
@@ -89,22 +102,82 @@ class WPApi:
         Constant representing all types
     """
 
+    BUILTIN_ENDPOINTS = [
+        Endpoint(POST, 'post', 'posts', 'posts', Endpoint.TYPE, 'posts'),
+        Endpoint(CATEGORY, 'category', 'categories', 'categories', Endpoint.TAXONOMY, 'categories'),
+        Endpoint(TAG, 'tag', 'tags', 'tags', Endpoint.TAXONOMY, 'tags'),
+        Endpoint(PAGE, 'page', 'pages', 'pages', Endpoint.TYPE, 'pages'),
+        Endpoint(COMMENT, 'comment', 'comments', 'comments', Endpoint.OTHER, 'comments'),
+        Endpoint(MEDIA, 'media', 'media', 'media', Endpoint.TYPE, 'media'),
+        Endpoint(USER, 'user', 'users', 'users', Endpoint.OTHER, 'users'),
+    ]
+    """
+        The collections of the core API and the attributes holding their cache
+    """
+
+    DEFAULT_WORKERS = defaults.DEFAULT_WORKERS
+    """
+        The default number of routes crawled in parallel
+    """
+    MAX_PER_PAGE = 100
+    """
+        The largest page size accepted by WordPress collections
+    """
+    INDEX_FIELDS = ['name', 'description', 'url', 'home', 'gmt_offset',
+                    'timezone_string', 'namespaces', 'authentication']
+    """
+        The fields of the API index requested at discovery, the routes are
+        fetched later, namespace by namespace, when they are needed
+    """
+    DATE_FORMAT = "%Y-%m-%dT%H:%M:%S"
+    """
+        The format of dates of the API (ISO 8601 without time zone)
+    """
+    SHARD_SIZE = defaults.SHARD_SIZE
+    """
+        The default maximum number of entries of a date window when crawling
+        with shards
+    """
+    EMBED_FIELDS = "author,wp:term"
+    """
+        The links embedded in posts and pages when crawling with embed
+    """
+    PROBE_MISSES = defaults.PROBE_MISSES
+    """
+        The default number of consecutive missing IDs after which ID probing
+        jumps to the next known ID or stops
+    """
+    PROBE_MAX = defaults.PROBE_MAX
+    """
+        The default highest ID probed, unless the known IDs go further
+    """
+
     def __init__(self, target, api_path="wp-json/", session=None,
-                 search_terms=None):
+                 search_terms=None, workers=DEFAULT_WORKERS, embed=False,
+                 shard_size=None):
         """
         Creates a new instance of WPApi
         param target: the target of the scan
         param api_path: the api path, if non-default
         param session: the requests session object to use for HTTP requests
         param search_terms : the terms of the keyword search, if any
+        param workers: the number of parallel requests for crawls
+        param embed: crawl posts and pages with their authors and terms
+        embedded (see harvest_embedded)
+        param shard_size: crawl whole collections sorted by date in date
+        windows of at most shard_size entries (see crawl_sharded), None to
+        crawl them page by page
         """
         self.api_path = api_path
+        self.workers = max(1, workers)
         self.search_terms = search_terms
         self.has_v2 = None
         self.name = None
         self.description = None
         self.url = target
         self.basic_info = None
+        self.route_index = None
+        self.loaded_namespaces = set()
         self.posts = None
         self.tags = None
         self.categories = None
@@ -115,6 +188,13 @@ class WPApi:
         self.comments_loaded = False
         self.orphan_comments = []
         self.comments = None
+        self.endpoints = EndpointRegistry(WPApi.BUILTIN_ENDPOINTS)
+        self.custom_types_loaded = False
+        self.custom_caches = {}
+        self.embed = embed
+        self.shard_size = shard_size
+        self.embedded = {}
+        self.search_index = SearchIndex()
 
         if session is not None:
             self.s = session
@@ -172,6 +252,9 @@ class WPApi:
             current = WPApi.str_type_to_native(el)
             if current is not None:
                 out.append(current)
+            else:
+                # Custom post types and taxonomies are identified by their slug
+                out.append(el)
         return out
 
     def get_orphans_comments(self):
@@ -183,15 +266,20 @@ class WPApi:
     def get_basic_info(self):
         """
         Collects and stores basic information about the target
+
+        Only the fields of INDEX_FIELDS are requested, the index of plugin-heavy
+        sites being mostly made of route schemas (see load_routes).
         """
         rest_url = url_path_join(self.url, self.api_path)
         if self.basic_info is not None:
             return self.basic_info
 
+        rest_url += ('&' if '?' in rest_url else '?') + \
+            urlencode({'_fields': ','.join(WPApi.INDEX_FIELDS)})
         try:
             req = self.s.get(rest_url)
-        except Exception:
-            raise NoWordpressApi
+        except Exception as e:
+            raise NoWordpressApi from e
         if req.status_code >= 400:
             raise NoWordpressApi
         self.basic_info = get_content_as_json(req)
@@ -206,90 +294,312 @@ class WPApi:
                 self.basic_info['namespaces']:
             self.has_v2 = True
 
+        if 'routes' in self.basic_info.keys():
+            # Old versions ignore _fields and send the full index
+            self.loaded_namespaces = set(self.basic_info.get('namespaces', []))
+        self.route_index = RouteIndex(self.basic_info.get('routes'),
+                                      self.basic_info.get('namespaces'))
+
         return self.basic_info
 
-    def crawl_pages(self, url, start=None, num=None, search_terms=None, display_progress=True):
+    def get_namespace_routes(self, ns):
         """
-        Crawls all pages while there is at least one result for the given
-        endpoint or tries to get pages from start to end
+        Fetches the routes of a namespace from its index (wp-json/<ns>)
+
+        :param ns: the namespace
+        :return: the routes as a dict or None if the namespace index is not available
+        """
+        try:
+            req = self.s.get(url_path_join(self.url, self.api_path, ns))
+            content = get_content_as_json(req)
+        except Exception:
+            return None
+        if type(content) is not dict or type(content.get('routes')) is not dict:
+            return None
+        return content['routes']
+
+    def load_routes(self, ns="all"):
+        """
+        Fetches the routes of the given namespace (or all namespaces) if they
+        are not known yet and updates the route index
+
+        The namespace indexes are fetched in parallel. If one of them is not
+        available, the full API index is fetched instead.
+
+        :param ns: the namespace or "all"
+        """
+        if self.basic_info is None:
+            self.get_basic_info()
+        namespaces = self.get_namespaces()
+        if ns != "all":
+            namespaces = [ns] if ns in namespaces else []
+        missing = [n for n in namespaces if n not in self.loaded_namespaces]
+        if len(missing) == 0:
+            return
+        routes = self.basic_info.setdefault('routes', {})
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            ns_routes = list(executor.map(self.get_namespace_routes, missing))
+        finally:
+            executor.shutdown(wait=True)
+        if None in ns_routes:
+            try:
+                full_index = get_content_as_json(self.s.get(
+                    url_path_join(self.url, self.api_path)))
+            except Exception:
+                full_index = None
+            if type(full_index) is dict and type(full_index.get('routes')) is dict:
+                routes.update(full_index['routes'])
+                self.loaded_namespaces.update(self.get_namespaces())
+        for n, r in zip(missing, ns_routes):
+            if r is not None:
+                routes.update(r)
+                self.loaded_namespaces.add(n)
+        self.route_index = RouteIndex(routes, self.basic_info.get('namespaces'))
+
+    def fetch_collection_page(self, url, params):
+        """
+        Fetches a page of a collection
+
+        :param url: the collection route relative to the API root
+        :param params: the query parameters (page, per_page...)
+        :return: a tuple (response, list of entries), the response being None
+        past the last page
+        """
+        rest_url = url_path_join(self.url, self.api_path, url)
+        rest_url += ('&' if '?' in rest_url else '?') + urlencode(params)
+        try:
+            req = self.s.get(rest_url)
+        except HTTPError400:
+            # Past the last page
+            return None, []
+        except NotRecorded:
+            # Replaying, the collection ends where the record does
+            return None, []
+        except Exception:
+            raise WordPressApiNotV2
+        try:
+            content = get_content_as_json(req)
+        except JSONDecodeError:
+            content = []
+        if type(content) is not list:
+            content = []
+        EventLog.emit('page_fetched', route=url, page=params.get('page'),
+            entries=len(content), bytes=len(req.content))
+        return req, content
+
+    def crawl_sharded(self, url, search_terms=None, display_progress=True, params=None,
+                      callback=None):
+        """
+        Crawls a whole collection by date windows instead of deep pages
+
+        Deep pages are slow SQL OFFSET queries and shift when objects are
+        published during the crawl. The date range of the collection is cut in
+        windows (after/before parameters) which are split in two while they
+        hold more than shard_size entries, then the few pages of every window
+        are fetched in parallel. Collections without pagination headers are
+        crawled with crawl_pages.
+
+        :param url: the collection route relative to the API root (e.g. wp/v2/posts)
+        :param search_terms: the terms of a keyword search, self.search_terms by default
+        :param display_progress: whether to display a progress bar
+        :param params: additional query parameters
+        :param callback: a function called with the new entries of each page,
+        in order, as soon as they are fetched
+        :return: a tuple (entries, total number of entries)
         """
         if search_terms is None:
             search_terms = self.search_terms
-        page = 1
-        total_entries = 0
-        total_pages = 0
-        more_entries = True
-        entries = []
-        base_url = url
-        entries_left = 1
-        per_page = 10
+        params = dict(params) if params is not None else {}
         if search_terms is not None:
-            if '?' in base_url:
-                base_url += '&' + urlencode({'search': search_terms})
-            else:
-                base_url += '?' + urlencode({'search': search_terms})
-        if start is not None:
-            page = math.floor(start/per_page) + 1
-        if num is not None:
-            entries_left = num
-        while more_entries and entries_left > 0:
-            rest_url = url_path_join(self.url, self.api_path, (base_url % page))
-            if start is not None:
-                rest_url += "&per_page=%d" % per_page
-            try:
-                req = self.s.get(rest_url)
-                if (page == 1 or start is not None and page == math.floor(start/per_page) + 1) and 'X-WP-Total' in req.headers:
-                    total_entries = int(req.headers['X-WP-Total'])
-                    total_pages = int(req.headers['X-WP-TotalPages'])
-                    print("Total number of entries: %d" % total_entries)
-                    if start is not None and total_entries < start:
-                        start = total_entries - 1
-            except HTTPError400:
-                break
-            except Exception:
-                raise WordPressApiNotV2
+            params['search'] = search_terms
+        params.update({'orderby': 'date', 'order': 'desc'})
+        per_page = WPApi.MAX_PER_PAGE
+
+        def date_of(obj):
+            value = obj.get('date') or obj.get('date_gmt')
             try:
-                json_content = get_content_as_json(req)
-                if type(json_content) is list and len(json_content) > 0:
-                    if (start is None or start is not None and page > math.floor(start/per_page) + 1) and num is None:
-                        entries += json_content
-                        if start is not None:
-                            entries_left -= len(json_content)
-                    elif start is not None and page == math.floor(start/per_page) + 1:
-                        if num is None or num is not None and len(json_content[start % per_page:]) < num:
-                            entries += json_content[start % per_page:]
-                            if num is not None:
-                                entries_left -= len(json_content[start % per_page:])
-                        else:
-                            entries += json_content[start % per_page:(start % per_page) + num]
-                            entries_left = 0
+                return datetime.strptime(value[:19], WPApi.DATE_FORMAT)
+            except (TypeError, ValueError):
+                return None
+
+        def bound(order):
+            req, content = self.fetch_collection_page(url, dict(params, order=order, per_page=1))
+            if req is None or 'X-WP-Total' not in req.headers:
+                return None, None
+            return int(req.headers['X-WP-Total']), \
+                date_of(content[0]) if len(content) > 0 else None
+
+        def count(window):
+            req, content = self.fetch_collection_page(url, dict(window_params(window), per_page=1))
+            if req is None or 'X-WP-Total' not in req.headers:
+                return 0
+            return int(req.headers['X-WP-Total'])
+
+        def window_params(window):
+            # after and before are exclusive, the window is [start, end)
+            return dict(params, after=(window[0] - timedelta(seconds=1)).strftime(WPApi.DATE_FORMAT),
+                before=window[1].strftime(WPApi.DATE_FORMAT))
+
+        def fetch(task):
+            window, page = task
+            return self.fetch_collection_page(url, dict(window_params(window), page=page,
+                per_page=per_page))[1]
+
+        start_time = time.time()
+        progress = None
+        self.s.set_max_connections(max(self.workers, 10))
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            (total_entries, newest), (_, oldest) = executor.map(bound, ['desc', 'asc'])
+            if total_entries is None or newest is None or oldest is None:
+                executor.shutdown(wait=True)
+                return self.crawl_pages(url, search_terms=search_terms,
+                    display_progress=display_progress, params=params, callback=callback)
+            if display_progress:
+                print("Total number of entries: %d" % total_entries)
+            # Windows are kept from the newest to the oldest, like the default order
+            pending = [(oldest, newest + timedelta(seconds=1))]
+            counts = [total_entries]
+            windows = []
+            while len(pending) > 0:
+                to_split = []
+                for window, window_count in zip(pending, counts):
+                    if window_count == 0:
+                        continue
+                    if window_count > self.shard_size and \
+                       window[1] - window[0] > timedelta(seconds=1):
+                        middle = window[0] + (window[1] - window[0]) / 2
+                        middle = middle.replace(microsecond=0)
+                        to_split += [(middle, window[1]), (window[0], middle)]
                     else:
-                        if num is not None and entries_left > len(json_content):
-                            entries += json_content
-                            entries_left -= len(json_content)
-                        else:
-                            entries += json_content[:entries_left]
-                            entries_left = 0
-                    
-                    if display_progress:
-                        if num is None and start is None and total_entries >= 0:
-                            print_progress_bar(page, total_pages,
-                            length=70)
-                        elif num is None and start is not None and total_entries >= 0:
-                            print_progress_bar(total_entries-start-entries_left, total_entries-start,
-                            length=70)
-                        elif num is not None and total_entries > 0:
-                            print_progress_bar(num-entries_left, num,
-                            length=70)
-                else:
-                    more_entries = False
-            except JSONDecodeError:
-                more_entries = False
+                        windows.append((window, window_count))
+                pending = to_split
+                counts = list(executor.map(count, pending))
+            windows.sort(key=lambda w: w[0][0], reverse=True)
+            tasks = [(window, page) for window, window_count in windows
+                     for page in range(1, math.ceil(window_count/per_page) + 1)]
+            entries = []
+            seen = set()
+            if display_progress:
+                progress = Progress.start(url.split('/')[-1], total=total_entries)
+            for content in executor.map(fetch, tasks):
+                new_entries = []
+                for entry in content:
+                    # An object modified during the crawl may appear twice
+                    if type(entry) is dict and entry.get('id') in seen:
+                        continue
+                    if type(entry) is dict:
+                        seen.add(entry.get('id'))
+                    new_entries.append(entry)
+                entries += new_entries
+                if callback is not None and len(new_entries) > 0:
+                    callback(new_entries)
+                if progress is not None:
+                    progress.advance(len(new_entries))
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            if progress is not None:
+                progress.close()
+        EventLog.emit('collection_complete', route=url, entries=len(entries),
+            total=total_entries, duration=round(time.time() - start_time, 6))
+        return (entries, len(entries))
 
-            page += 1
+    def crawl_pages(self, url, start=None, num=None, search_terms=None, display_progress=True, params=None,
+                    callback=None):
+        """
+        Crawls the pages of a collection holding the entries from start to
+        start + num (all entries by default)
+
+        The first page gives the total number of entries and pages, the other
+        pages are then fetched in parallel by self.workers threads.
+
+        :param url: the collection route relative to the API root (e.g. wp/v2/posts)
+        :param start: the offset of the first entry
+        :param num: the maximum number of entries
+        :param search_terms: the terms of a keyword search, self.search_terms by default
+        :param display_progress: whether to display the number of entries and
+        a progress bar
+        :param params: additional query parameters
+        :param callback: a function called with the entries of each page, in
+        order, as soon as they are fetched
+        :return: a tuple (entries, total number of entries)
+        """
+        if search_terms is None:
+            search_terms = self.search_terms
+        per_page = WPApi.MAX_PER_PAGE
+        params = dict(params) if params is not None else {}
+        if search_terms is not None:
+            params['search'] = search_terms
+        offset = start if start is not None else 0
+        first_page = math.floor(offset/per_page) + 1
+
+        def fetch(page):
+            return self.fetch_collection_page(url, dict(params, page=page, per_page=per_page))
+
+        start_time = time.time()
+        entries = []
+        skip = offset - (first_page - 1) * per_page
+
+        def add_page(content):
+            nonlocal skip
+            content = content[skip:]
+            skip = 0
+            if num is not None:
+                content = content[:max(0, num - len(entries))]
+            entries.extend(content)
+            if callback is not None and len(content) > 0:
+                callback(content)
+
+        req, content = fetch(first_page)
+        if req is None:
+            return ([], 0)
+        pages = [content]
+        add_page(content)
+        if 'X-WP-Total' in req.headers and 'X-WP-TotalPages' in req.headers:
+            total_entries = int(req.headers['X-WP-Total'])
+            total_pages = int(req.headers['X-WP-TotalPages'])
+            if display_progress:
+                print("Total number of entries: %d" % total_entries)
+            end = total_entries if num is None else min(total_entries, offset + num)
+            last_page = min(total_pages, max(first_page, math.ceil(end/per_page)))
+            remaining = range(first_page + 1, last_page + 1)
+            task = None
+            if display_progress:
+                task = Progress.start(url.split('/')[-1], total=max(0, end - offset))
+                task.advance(len(entries), len(req.content))
+            try:
+                if len(remaining) > 0:
+                    self.s.set_max_connections(max(self.workers, 10))
+                    executor = ThreadPoolExecutor(max_workers=self.workers)
+                    try:
+                        for req, content in executor.map(fetch, remaining):
+                            pages.append(content)
+                            known = len(entries)
+                            add_page(content)
+                            if task is not None:
+                                task.advance(len(entries) - known,
+                                    len(req.content) if req is not None else 0)
+                    finally:
+                        executor.shutdown(wait=True, cancel_futures=True)
+            finally:
+                if task is not None:
+                    task.close()
+        else:
+            # Without pagination headers, pages are fetched until a short one
+            while len(pages[-1]) == per_page and \
+                  (num is None or (first_page - 1 + len(pages)) * per_page < offset + num):
+                req, content = fetch(first_page + len(pages))
+                if req is None or len(content) == 0:
+                    break
+                pages.append(content)
+                add_page(content)
+            total_entries = (first_page - 1) * per_page + sum(len(p) for p in pages)
 
+        EventLog.emit('collection_complete', route=url, entries=len(entries),
+            total=total_entries, duration=round(time.time() - start_time, 6))
         return (entries, total_entries)
-    
+
     def crawl_single_page(self, url):
         """
             Crawls a single URL
@@ -302,6 +612,8 @@ class WPApi:
             return None
         except HTTPError404:
             return None
+        except NotRecorded:
+            return None
         except Exception:
             raise WordPressApiNotV2
         try:
@@ -342,7 +654,7 @@ class WPApi:
             s = start
             if start is None:
                 s = 0
-            if start >= total_entries:
+            if s >= total_entries:
                 s = total_entries - 1
             n = num
             if n is not None and s + n > total_entries:
@@ -363,21 +675,220 @@ class WPApi:
                 cache += [None] * (total_entries - len(cache))
         return cache
 
-    def get_comments(self, start=None, num=None, force=False):
+    def get_endpoint(self, obj_type):
         """
-        Retrieves all comments
+        Returns the Endpoint of the given object type, loading the custom
+        types if needed, or None if the type is unknown
+        """
+        endpoint = self.endpoints.get(obj_type)
+        if endpoint is None and not self.custom_types_loaded:
+            endpoint = self.get_endpoints().get(obj_type)
+        return endpoint
+
+    def find_endpoint(self, name):
+        """
+        Returns the Endpoint of the given type name (e.g. post, books), loading
+        the custom types if needed, or None if the type is unknown
+        """
+        endpoint = self.endpoints.find(name)
+        if endpoint is None and not self.custom_types_loaded:
+            endpoint = self.get_endpoints().find(name)
+        return endpoint
+
+    def get_endpoints(self):
+        """
+        Returns the EndpointRegistry, completed with the custom post types and
+        taxonomies of the target the first time it is called
+        """
+        if self.custom_types_loaded:
+            return self.endpoints
+        self.custom_types_loaded = True
+        if self.has_v2 is None:
+            self.get_basic_info()
+        if not self.has_v2:
+            return self.endpoints
+
+        def fetch(url):
+            try:
+                return self.crawl_single_page(url)
+            except WordPressApiNotV2:
+                return None
+        executor = ThreadPoolExecutor(max_workers=2)
+        try:
+            types, taxonomies = executor.map(fetch, ['wp/v2/types', 'wp/v2/taxonomies'])
+        finally:
+            executor.shutdown(wait=True)
+        self.endpoints.load(types, taxonomies)
+        return self.endpoints
+
+    def census(self):
         """
-        comments = self.get_from_cache(self.comments, start, num, force)
-        if comments is not None:
-            return comments
+        Counts the objects of every known collection, custom types included,
+        with concurrent requests for a single object
 
-        comments, total_entries = self.crawl_pages('wp/v2/comments?page=%d', start, num)
-        self.comments = self.update_cache(self.comments, comments, total_entries, start, num)
-        return comments
+        :return: a list of dicts (one per endpoint) with the endpoint, total
+        (None if the collection is not accessible or not counted), requests
+        (needed to crawl it), bytes (estimated size of the crawl) and latency
+        (of the count request) keys
+        """
+        endpoints = self.get_endpoints().all()
+
+        def count(endpoint):
+            start_time = time.time()
+            entry = {'endpoint': endpoint, 'total': None, 'requests': 0,
+                     'bytes': 0, 'latency': 0}
+            try:
+                req, content = self.fetch_collection_page(endpoint.path, {'per_page': 1})
+            except WordPressApiNotV2:
+                req = None
+            entry['latency'] = time.time() - start_time
+            if req is None or 'X-WP-Total' not in req.headers:
+                return entry
+            entry['total'] = int(req.headers['X-WP-Total'])
+            entry['requests'] = max(1, math.ceil(entry['total']/WPApi.MAX_PER_PAGE))
+            if len(content) > 0:
+                # A single object approximates the average object size
+                entry['bytes'] = len(req.content) * entry['total']
+            return entry
+
+        self.s.set_max_connections(max(self.workers, 10))
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            return list(executor.map(count, endpoints))
+        finally:
+            executor.shutdown(wait=True)
+
+    def get_cache(self, endpoint):
+        if endpoint.cache is not None:
+            return getattr(self, endpoint.cache)
+        return self.custom_caches.get(endpoint.key)
+
+    def set_cache(self, endpoint, values):
+        if endpoint.cache is not None:
+            setattr(self, endpoint.cache, values)
+        else:
+            self.custom_caches[endpoint.key] = values
 
-    def get_posts(self, comments=False, start=None, num=None, force=False):
+    def get_collection(self, obj_type, start=None, num=None, force=False, callback=None):
+        """
+        Retrieves all objects of the given type or the specified ones
+
+        :param obj_type: the object type (e.g. WPApi.TAG or the slug of a custom type)
+        :param start: the offset of the first object
+        :param num: the maximum number of objects
+        :param force: ignore the cache
+        :param callback: a function called with the objects of each page as
+        they are fetched (once with all of them if they are cached)
+        :return: the list of objects
+        """
+        endpoint = self.get_endpoint(obj_type)
+        if endpoint is None:
+            return []
+        objects = self.get_from_cache(self.get_cache(endpoint), start, num, force)
+        if objects is not None:
+            if callback is not None:
+                callback(objects)
+            return objects
+
+        objects, total_entries = self.crawl_collection(endpoint, start, num, callback)
+        self.harvest_embedded(objects)
+        self.search_index.add(endpoint.key, objects)
+        self.set_cache(endpoint, self.update_cache(self.get_cache(endpoint),
+            objects, total_entries, start, num))
+        return objects
+
+    def embed_params(self, endpoint):
+        """
+        Returns the query parameters embedding authors and terms in the
+        objects of the given endpoint, if enabled and relevant
+        """
+        if self.embed and endpoint is not None and endpoint.kind == Endpoint.TYPE:
+            return {'_embed': WPApi.EMBED_FIELDS}
+        return None
+
+    def harvest_embedded(self, objects):
+        """
+        Moves the authors and terms embedded in objects (_embedded key) to
+        the embedded objects store, see get_known_objects
+
+        :param objects: the objects crawled with embed parameters
+        """
+        for obj in objects:
+            if type(obj) is not dict:
+                continue
+            embedded = obj.pop('_embedded', None)
+            if type(embedded) is not dict:
+                continue
+            found = []
+            for author in embedded.get('author', []):
+                found.append((WPApi.USER, author))
+            for terms in embedded.get('wp:term', []):
+                if type(terms) is not list:
+                    continue
+                for term in terms:
+                    if type(term) is not dict:
+                        continue
+                    taxonomy = term.get('taxonomy')
+                    if taxonomy == 'category':
+                        found.append((WPApi.CATEGORY, term))
+                    elif taxonomy == 'post_tag':
+                        found.append((WPApi.TAG, term))
+                    elif type(taxonomy) is str:
+                        found.append((taxonomy, term))
+            for key, embedded_obj in found:
+                # Errors (e.g. hidden authors) are embedded as objects without ID
+                if type(embedded_obj) is dict and type(embedded_obj.get('id')) is int:
+                    self.embedded.setdefault(key, {})[embedded_obj['id']] = embedded_obj
+
+    def get_known_objects(self, obj_type):
+        """
+        Returns the objects of the given type known without any request: the
+        cached ones and the ones embedded in crawled posts and pages
+
+        Unlike the get_<type> functions, the list may be incomplete, it is
+        meant to map IDs to objects (e.g. authors of exported posts).
+
+        :param obj_type: the object type (e.g. WPApi.USER)
+        :return: a list of objects
+        """
+        known = []
+        endpoint = self.endpoints.get(obj_type)
+        if endpoint is not None and self.get_cache(endpoint) is not None:
+            known = [o for o in self.get_cache(endpoint) if o is not None]
+        ids = set(o.get('id') for o in known)
+        for obj_id, obj in self.embedded.get(obj_type, {}).items():
+            if obj_id not in ids:
+                known.append(obj)
+        return known
+
+    def crawl_collection(self, endpoint, start=None, num=None, callback=None):
+        """
+        Crawls the objects of an endpoint, by date windows if shards are
+        enabled and the whole collection of a dated type is requested
+
+        :return: a tuple (entries, total number of entries)
+        """
+        if self.shard_size is not None and start is None and num is None and \
+           (endpoint.kind == Endpoint.TYPE or endpoint.key == WPApi.COMMENT):
+            return self.crawl_sharded(endpoint.path, params=self.embed_params(endpoint),
+                callback=callback)
+        return self.crawl_pages(endpoint.path, start=start, num=num,
+            params=self.embed_params(endpoint), callback=callback)
+
+    def get_comments(self, start=None, num=None, force=False, callback=None):
+        """
+        Retrieves all comments
+        """
+        return self.get_collection(WPApi.COMMENT, start, num, force, callback)
+
+    def get_posts(self, comments=False, start=None, num=None, force=False, callback=None):
         """
         Retrieves all posts or the specified ones
+
+        The callback, if any, is called with the posts of each page as they
+        are fetched, or once with all of them when they come from the cache or
+        when comments are requested. In the latter case, it is called with no
+        posts after each page, so that it can still stop the crawl by raising.
         """
         if self.has_v2 is None:
             self.get_basic_info()
@@ -385,21 +896,35 @@ class WPApi:
             raise WordPressApiNotV2
         if self.posts is not None and start is not None and len(self.posts) < start:
             start = len(self.posts) - 1
-        if self.posts is not None and (self.comments_loaded and comments or not comments) and not force:
+        posts = None
+        if self.posts is not None and not force:
             posts = self.get_from_cache(self.posts, start, num)
-            if posts is not None:
-                return posts
-        posts, total_entries = self.crawl_pages('wp/v2/posts?page=%d', start=start, num=num)
-
-        self.posts = self.update_cache(self.posts, posts, total_entries, start, num)
+        if posts is not None and (self.comments_loaded or not comments):
+            if callback is not None:
+                callback(posts)
+            return posts
+        # Posts are displayed with their comments, which are only known at the end
+        progressive = callback is not None and (self.comments_loaded or not comments)
+        page_callback = callback
+        if callback is not None and not progressive:
+            page_callback = lambda entries: callback([])
+        if posts is None:
+            posts, total_entries = self.crawl_collection(self.get_endpoint(WPApi.POST),
+                start, num, page_callback)
+            self.harvest_embedded(posts)
+            self.search_index.add(WPApi.POST, posts)
+            self.posts = self.update_cache(self.posts, posts, total_entries, start, num)
+        # Otherwise the cached posts are kept (with their revisions, if any),
+        # only the comments are missing
 
         if not self.comments_loaded and comments:
             # Load comments
-            comment_list = self.crawl_pages('wp/v2/comments?page=%d')[0]
+            comment_list = self.crawl_pages('wp/v2/comments', callback=page_callback)[0]
+            self.search_index.add(WPApi.COMMENT, comment_list)
             for comment in comment_list:
                 found_post = False
                 for i in range(0, len(self.posts)):
-                    if self.posts[i]['id'] == comment['post']:
+                    if self.posts[i] is not None and self.posts[i]['id'] == comment['post']:
                         if "comments" not in self.posts[i]:
                             self.posts[i]['comments'] = []
                         self.posts[i]["comments"].append(comment)
@@ -414,59 +939,98 @@ class WPApi:
             return_posts = return_posts[start:]
         if num is not None and num < len(return_posts):
             return_posts = return_posts[:num]
+        if callback is not None and not progressive:
+            callback(return_posts)
         return return_posts
 
-    def get_tags(self, start=None, num=None, force=False):
+    def get_revisions(self, obj_type=POST, force=False):
         """
-        Retrieves all tags
+        Fetches the revisions and autosaves of all posts or pages and stores
+        them in the revisions and autosaves keys of their parent object
+
+        The requests are made in parallel by self.workers threads. Revisions
+        with the same title, content and excerpt as a previous one (and
+        autosaves identical to a revision) are only kept once. Revisions are
+        usually only available to authenticated users.
+
+        :param obj_type: WPApi.POST or WPApi.PAGE
+        :param force: fetch again the revisions of objects already having them
+        :return: the number of revisions and autosaves stored
         """
-        tags = self.get_from_cache(self.tags, start, num, force)
-        if tags is not None:
-            return tags
+        endpoint = self.get_endpoint(obj_type)
+        parents = self.get_posts() if obj_type == WPApi.POST else self.get_pages()
+        parents = [p for p in parents if p is not None and type(p.get('id')) is int
+                   and (force or 'revisions' not in p.keys())]
+        if len(parents) == 0:
+            return 0
 
-        tags, total_entries = self.crawl_pages('wp/v2/tags?page=%d', start, num)
-        self.tags = self.update_cache(self.tags, tags, total_entries, start, num)
-        return tags
+        def fetch(parent):
+            results = {}
+            for kind in ['revisions', 'autosaves']:
+                result = self.crawl_route("%s/%d/%s" % (endpoint.path, parent['id'], kind),
+                    {'page': {}, 'per_page': {}})
+                if result is not None and type(result['data']) is list:
+                    results[kind] = result['data']
+            return parent, results
+
+        # A first request tells if revisions are accessible at all, to avoid
+        # as many errors as posts
+        parent, results = fetch(parents[0])
+        if len(results) == 0:
+            return 0
+        stored = 0
+        progress = Progress.start("%s revisions" % endpoint.name, total=len(parents))
+        self.s.set_max_connections(max(self.workers, 10))
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            for parent, results in itertools.chain([(parent, results)],
+                                                   executor.map(fetch, parents[1:])):
+                seen = set()
+                for kind in ['revisions', 'autosaves']:
+                    unique = []
+                    for revision in results.get(kind, []):
+                        body = hashlib.sha256(json.dumps([
+                            revision.get(k) for k in ['title', 'content', 'excerpt']
+                        ], sort_keys=True).encode("utf-8")).hexdigest()
+                        if body not in seen:
+                            seen.add(body)
+                            unique.append(revision)
+                    parent[kind] = unique
+                    stored += len(unique)
+                progress.advance()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            progress.close()
+        return stored
 
-    def get_categories(self, start=None, num=None, force=False):
+    def get_tags(self, start=None, num=None, force=False, callback=None):
+        """
+        Retrieves all tags
+        """
+        return self.get_collection(WPApi.TAG, start, num, force, callback)
+
+    def get_categories(self, start=None, num=None, force=False, callback=None):
         """
         Retrieves all categories or the specified ones
         """
-        categories = self.get_from_cache(self.categories, start, num, force)
-        if categories is not None:
-            return categories
-        
-        categories, total_entries = self.crawl_pages('wp/v2/categories?page=%d', start=start, num=num)
-        self.categories = self.update_cache(self.categories, categories, total_entries, start, num)
-        return categories
+        return self.get_collection(WPApi.CATEGORY, start, num, force, callback)
 
-    def get_users(self, start=None, num=None, force=False):
+    def get_users(self, start=None, num=None, force=False, callback=None):
         """
         Retrieves all users or the specified ones
         """
-        users = self.get_from_cache(self.users, start, num, force)
-        if users is not None:
-            return users
-
-        users, total_entries = self.crawl_pages('wp/v2/users?page=%d', start=start, num=num)
-        self.users = self.update_cache(self.users, users, total_entries, start, num)
-        return users
+        return self.get_collection(WPApi.USER, start, num, force, callback)
 
-    def get_media(self, start=None, num=None, force=False):
+    def get_media(self, start=None, num=None, force=False, callback=None):
         """
         Retrieves all media objects
         """
-        media = self.get_from_cache(self.media, start, num, force)
-        if media is not None:
-            return media
+        return self.get_collection(WPApi.MEDIA, start, num, force, callback)
 
-        media, total_entries = self.crawl_pages('wp/v2/media?page=%d', start=start, num=num)
-        self.media = self.update_cache(self.media, media, total_entries, start, num)
-        return media
-    
-    def get_media_urls(self, ids, cache=True):
+    def get_media_urls(self, ids, cache=True, with_ids=False):
         """
         Retrieves the media download URLs for specified IDs or all or from cache
+        If with_ids is True, the list of media IDs is returned as a third value
         """
         media = []
         if ids == 'all':
@@ -486,26 +1050,24 @@ class WPApi:
                     pass
         urls = []
         slugs = []
+        media_ids = []
         if media is None:
-            return []
+            media = []
         for m in media:
             if m is not None and type(m) is dict and "source_url" in m.keys() and 'slug' in m.keys():
                 urls.append(m["source_url"])
                 slugs.append(m['slug'])
+                media_ids.append(m.get('id'))
+        if with_ids:
+            return urls, slugs, media_ids
         return urls, slugs
             
 
-    def get_pages(self, start=None, num=None, force=False):
+    def get_pages(self, start=None, num=None, force=False, callback=None):
         """
         Retrieves all pages
         """
-        pages = self.get_from_cache(self.pages, start, num, force)
-        if pages is not None:
-            return pages
-
-        pages, total_entries = self.crawl_pages('wp/v2/pages?page=%d', start=start, num=num)
-        self.pages = self.update_cache(self.pages, pages, total_entries, start, num)
-        return pages
+        return self.get_collection(WPApi.PAGE, start, num, force, callback)
 
     def get_namespaces(self, start=None, num=None, force=False):
         """
@@ -514,61 +1076,190 @@ class WPApi:
         if self.has_v2 is None or force:
             self.get_basic_info()
         if 'namespaces' in self.basic_info.keys():
+            namespaces = self.basic_info['namespaces']
             if start is None and num is None:
-                return self.basic_info['namespaces']
-            namespaces = copy.deepcopy(self.basic_info['namespaces'])
-            if start is not None and start < len(namespaces):
-                namespaces = namespaces[start:]
-            if num <= len(namespaces):
-                namespaces = namespaces[:num]
-            return namespaces
+                return namespaces
+            # Namespaces are strings, a slice is enough to leave the original untouched
+            if start is None:
+                start = 0
+            if num is None:
+                return namespaces[start:]
+            return namespaces[start:start + num]
         return []
 
     def get_routes(self):
         """
         Retrieves an array of routes
         """
-        if self.has_v2 is None:
-            self.get_basic_info()
+        self.load_routes()
         if 'routes' in self.basic_info.keys():
             return self.basic_info['routes']
         return []
 
+    def get_route_index(self, ns="all"):
+        """
+        Returns the RouteIndex built from the routes of the API, with the
+        routes of the given namespace loaded
+        """
+        self.load_routes(ns)
+        return self.route_index
+
     def crawl_namespaces(self, ns):
         """
         Crawls all accessible get routes defined for the specified namespace.
         """
-        namespaces = self.get_namespaces()
-        routes = self.get_routes()
-        ns_data = {}
-        if ns != "all" and ns not in namespaces:
+        return dict((url, result['data']) for url, result in self.iter_namespaces(ns))
+
+    def iter_namespaces(self, ns, probe_ids=False, max_misses=PROBE_MISSES,
+                        max_id=PROBE_MAX):
+        """
+        Crawls all accessible get routes defined for the specified namespace
+        and yields the results route by route, as soon as they are fetched
+
+        Routes are crawled in parallel by self.workers threads and every page
+        of paginated collections is fetched.
+
+        :param ns: the namespace to crawl or "all"
+        :param probe_ids: also enumerate the routes with a numeric parameter
+        (e.g. items/(?P<id>\\d+)), seeded with the IDs of the collections
+        :param max_misses: the number of consecutive missing IDs ending a probe
+        :param max_id: the highest ID probed, unless the collection goes further
+        :return: a generator of (route, result) tuples, result being a dict
+        with the data, the number of pages fetched, the elapsed time in
+        seconds and the number of bytes received
+        """
+        if ns != "all" and ns not in self.get_namespaces():
             raise NSNotFoundException
-        for url, route in routes.items():
-            if 'namespace' not in route.keys() \
-               or 'endpoints' not in route.keys():
-                continue
-            url_as_ns = url.lstrip('/')
-            if '(?P<' in url or url_as_ns in namespaces:
-                continue
-            if ns != 'all' and route['namespace'] != ns or \
-               route['namespace'] in ['wp/v2', '']:
-                continue
-            for endpoint in route['endpoints']:
-                if 'GET' not in endpoint['methods']:
+        to_crawl = self.get_route_index(ns).crawlable(ns)
+        seeds = {}
+
+        self.s.set_max_connections(max(self.workers, 10))
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            futures = {executor.submit(self.crawl_route, url, args): url
+                       for url, args in to_crawl}
+            for future in as_completed(futures):
+                result = future.result()
+                if result is not None:
+                    url = futures[future]
+                    if probe_ids and type(result['data']) is list:
+                        seeds[url.rstrip('/')] = [o['id'] for o in result['data']
+                            if type(o) is dict and type(o.get('id')) is int]
+                    yield (url, result)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        if probe_ids:
+            for url, param, collection in self.get_route_index(ns).probeable(ns):
+                yield from self.probe_ids(url, seeds.get(collection, []), max_misses,
+                    max_id)
+
+    def probe_ids(self, url, seeds=None, max_misses=PROBE_MISSES, max_id=PROBE_MAX):
+        """
+        Enumerates the values of the numeric parameter of a route
+
+        IDs are tried in ascending order from 1, self.workers * 2 being in
+        flight at a time. After max_misses consecutive missing IDs, the
+        requests in flight are cancelled and the probe jumps to the next known
+        ID (seed) or stops if there is none left, so sparse ID spaces are not
+        brute-forced. IDs above both max_id and the last seed plus max_misses
+        are never probed, as some routes answer for any ID.
+
+        :param url: the route with a single numeric parameter
+        :param seeds: IDs known to exist (e.g. seen in the collection)
+        :param max_misses: the number of consecutive missing IDs ending a run
+        :param max_id: the highest ID probed, unless the seeds go further
+        :return: a generator of (route, result) tuples for the existing IDs
+        """
+        seeds = sorted(set(i for i in (seeds or []) if i > 0))
+        max_misses = max(1, max_misses)
+        window = self.workers * 2
+        if len(seeds) > 0:
+            max_id = max(max_id, seeds[-1] + max_misses)
+
+        def probe(obj_id):
+            return (obj_id, self.crawl_route(RouteIndex.fill(url, obj_id)))
+
+        self.s.set_max_connections(max(self.workers, 10))
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            pending = deque()
+            cursor = 1
+            misses = 0
+            while True:
+                while cursor is not None and cursor <= max_id and len(pending) < window:
+                    pending.append(executor.submit(probe, cursor))
+                    cursor += 1
+                if len(pending) == 0:
+                    break
+                obj_id, result = pending.popleft().result()
+                if result is not None:
+                    misses = 0
+                    yield (RouteIndex.fill(url, obj_id), result)
                     continue
-                keep = True
-                if len(endpoint['args']) > 0 and type(endpoint['args']) is dict:
-                    for name,arg in endpoint['args'].items():
-                        if arg['required']:
-                            keep = False
-                if keep:
-                    rest_url = url_path_join(self.url, self.api_path, url)
-                    try:
-                        ns_request = self.s.get(rest_url)
-                        ns_data[url] = get_content_as_json(ns_request)
-                    except Exception:
-                        continue
-        return ns_data
+                misses += 1
+                if misses >= max_misses:
+                    for future in pending:
+                        future.cancel()
+                    pending.clear()
+                    next_seeds = [i for i in seeds if i > obj_id]
+                    cursor = next_seeds[0] if len(next_seeds) > 0 else None
+                    misses = 0
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def crawl_route(self, url, args=None):
+        """
+        Fetches a GET route, following the pagination if the route declares
+        page and per_page arguments
+
+        :param url: the route
+        :param args: the arguments of the GET endpoint of the route
+        :return: a dict with the data, pages, elapsed and bytes keys or None
+        if the route could not be fetched
+        """
+        if args is None:
+            args = {}
+        start_time = time.time()
+        rest_url = url_path_join(self.url, self.api_path, url)
+        paginated = 'page' in args.keys() and 'per_page' in args.keys()
+        per_page = WPApi.MAX_PER_PAGE
+        if paginated and type(args['per_page']) is dict and \
+           type(args['per_page'].get('maximum')) is int:
+            per_page = min(per_page, args['per_page']['maximum'])
+        result = {'data': None, 'pages': 0, 'elapsed': 0, 'bytes': 0}
+        page = 1
+        total_pages = None
+        while True:
+            page_url = rest_url
+            if paginated:
+                page_url += ('&' if '?' in page_url else '?') + \
+                    urlencode({'page': page, 'per_page': per_page})
+            try:
+                req = self.s.get(page_url)
+                content = get_content_as_json(req)
+            except Exception:
+                if page == 1:
+                    return None
+                # Past the last page, WordPress answers with an error 400
+                break
+            result['pages'] += 1
+            result['bytes'] += len(req.content)
+            if page == 1:
+                result['data'] = content
+                if 'X-WP-TotalPages' in req.headers:
+                    total_pages = int(req.headers['X-WP-TotalPages'])
+            elif type(content) is list:
+                result['data'] += content
+            if not paginated or type(content) is not list or len(content) == 0:
+                break
+            if total_pages is not None and page >= total_pages:
+                break
+            if total_pages is None and len(content) < per_page:
+                break
+            page += 1
+        result['elapsed'] = time.time() - start_time
+        return result
 
     def get_obj_by_id_helper(self, cache, obj_id, url, use_cache=True):
         if use_cache and cache is not None:
@@ -590,23 +1281,13 @@ class WPApi:
             :param obj_id: the ID of the object to fetch
             :param use_cache: if the cache should be used to avoid useless requests
         """
-        if obj_type == WPApi.USER:
-            return self.get_obj_by_id_helper(self.users, obj_id, 'wp/v2/users/%d', use_cache)
-        if obj_type == WPApi.TAG:
-            return self.get_obj_by_id_helper(self.tags, obj_id, 'wp/v2/tags/%d', use_cache)
-        if obj_type == WPApi.CATEGORY:
-            return self.get_obj_by_id_helper(self.categories, obj_id, 'wp/v2/categories/%d', use_cache)
-        if obj_type == WPApi.POST:
-            return self.get_obj_by_id_helper(self.posts, obj_id, 'wp/v2/posts/%d', use_cache)
-        if obj_type == WPApi.PAGE:
-            return self.get_obj_by_id_helper(self.pages, obj_id, 'wp/v2/pages/%d', use_cache)
-        if obj_type == WPApi.COMMENT:
-            return self.get_obj_by_id_helper(self.comments, obj_id, 'wp/v2/comments/%d', use_cache)
-        if obj_type == WPApi.MEDIA:
-            return self.get_obj_by_id_helper(self.comments, obj_id, 'wp/v2/media/%d', use_cache)
-        return []
+        endpoint = self.get_endpoint(obj_type)
+        if endpoint is None:
+            return []
+        return self.get_obj_by_id_helper(self.get_cache(endpoint), obj_id,
+            endpoint.path + '/%d', use_cache)
     
-    def get_obj_list(self, obj_type, start, limit, cache, kwargs={}):
+    def get_obj_list(self, obj_type, start, limit, cache, kwargs={}, callback=None):
         """
             Returns a list of maximum limit objects specified by the starting object offset.
 
@@ -615,30 +1296,18 @@ class WPApi:
             :param limit: the maximum number of objects to return
             :param cache: if the cache should be used to avoid useless requests
             :param kwargs: additional parameters to pass to the function (for POST only)
+            :param callback: a function called with the objects of each page as they are fetched
         """
-        get_func = None
-        if obj_type == WPApi.USER:
-            get_func = self.get_users
-        elif obj_type == WPApi.TAG:
-            get_func = self.get_tags
-        elif obj_type == WPApi.CATEGORY:
-            get_func = self.get_categories
-        elif obj_type == WPApi.PAGE:
-            get_func = self.get_pages
-        elif obj_type == WPApi.COMMENT:
-            get_func = self.get_comments
-        elif obj_type == WPApi.MEDIA:
-            get_func = self.get_media
-        elif obj_type == WPApi.NAMESPACE:
-            get_func = self.get_namespaces
-        
-        if get_func is not None:
-            return get_func(start=start, num=limit, force=not cache)
+        if obj_type == WPApi.NAMESPACE:
+            objects = self.get_namespaces(start=start, num=limit, force=not cache)
+            if callback is not None:
+                callback(objects)
+            return objects
         elif obj_type == WPApi.POST:
-            return self.get_posts(start=start, num=limit, force=not cache, **kwargs)
-        return []
+            return self.get_posts(start=start, num=limit, force=not cache, callback=callback, **kwargs)
+        return self.get_collection(obj_type, start=start, num=limit, force=not cache, callback=callback)
     
-    def search(self, obj_types, keywords, start, limit):
+    def search(self, obj_types, keywords, start, limit, unified=False):
         """
             Looks for data with the specified keywords of the given types.
 
@@ -646,27 +1315,97 @@ class WPApi:
             :param keywords: the keywords to look for
             :param start: a start index
             :param limit: the max number to return
+            :param unified: find posts, pages and custom post types with wp/v2/search
             :return: a dict of lists of objects sorted by types
         """
-        out = {}
+        return dict(self.iter_search(obj_types, keywords, start, limit, unified))
+
+    def local_search(self, obj_types, keywords, start=None, limit=None):
+        """
+            Looks for the keywords in the objects crawled so far, without any
+            request (see SearchIndex.search for the query syntax)
+
+            :param obj_types: a list of the desired object types to look for
+            :param keywords: the query
+            :param start: a start index
+            :param limit: the max number to return
+            :return: a dict of lists of objects sorted by types
+        """
+        if WPApi.ALL_TYPES in obj_types or len(obj_types) == 0:
+            obj_types = None
+        authors = {}
+        for user in self.get_known_objects(WPApi.USER):
+            if type(user.get('name')) is str:
+                authors[user['id']] = user['name']
+        results = self.search_index.search(keywords, obj_types, authors)
+        offset = start if start is not None else 0
+        for t, objects in results.items():
+            results[t] = objects[offset:] if limit is None else objects[offset:offset + limit]
+        return results
+
+    def iter_search(self, obj_types, keywords, start=None, limit=None, unified=False):
+        """
+            Looks for data with the specified keywords of the given types, all
+            types being searched in parallel
+
+            With unified, the objects of post types (except media) are found
+            with a single search on wp/v2/search and then fetched by ID. Types
+            are searched separately if the endpoint is not available.
+
+            :param obj_types: a list of the desired object types to look for
+            :param keywords: the keywords to look for
+            :param start: a start index
+            :param limit: the max number to return
+            :param unified: find posts, pages and custom post types with wp/v2/search
+            :return: a generator of (type, list of objects) tuples, in the
+            order the searches complete
+        """
         if WPApi.ALL_TYPES in obj_types or len(obj_types) == 0:
-            obj_types = [
-                WPApi.POST, WPApi.CATEGORY, WPApi.TAG, WPApi.PAGE,
-                WPApi.COMMENT, WPApi.MEDIA, WPApi.USER
-            ] # All supported types for search
+            # All supported types for search
+            obj_types = [e.key for e in self.get_endpoints().all()]
+        endpoints = []
         for t in obj_types:
-            if t == WPApi.POST:
-                out[t] = self.crawl_pages('wp/v2/posts?page=%d', start=start, num=limit, search_terms=keywords, display_progress=False)[0]
-            elif t == WPApi.CATEGORY:
-                out[t] = self.crawl_pages('wp/v2/categories?page=%d', start=start, num=limit, search_terms=keywords, display_progress=False)[0]
-            elif t == WPApi.TAG:
-                out[t] = self.crawl_pages('wp/v2/tags?page=%d', start=start, num=limit, search_terms=keywords, display_progress=False)[0]
-            elif t == WPApi.PAGE:
-                out[t] = self.crawl_pages('wp/v2/pages?page=%d', start=start, num=limit, search_terms=keywords, display_progress=False)[0]
-            elif t == WPApi.COMMENT:
-                out[t] = self.crawl_pages('wp/v2/comments?page=%d', start=start, num=limit, search_terms=keywords, display_progress=False)[0]
-            elif t == WPApi.MEDIA:
-                out[t] = self.crawl_pages('wp/v2/media?page=%d', start=start, num=limit, search_terms=keywords, display_progress=False)[0]
-            elif t == WPApi.USER:
-                out[t] = self.crawl_pages('wp/v2/users?page=%d', start=start, num=limit, search_terms=keywords, display_progress=False)[0]
-        return out
\ No newline at end of file
+            endpoint = self.get_endpoint(t)
+            if endpoint is not None and endpoint not in endpoints:
+                endpoints.append(endpoint)
+
+        def search_type(endpoint):
+            return self.crawl_pages(endpoint.path, start=start, num=limit,
+                search_terms=keywords, display_progress=False)[0]
+
+        def fetch_ids(endpoint, ids):
+            objects = []
+            for i in range(0, len(ids), WPApi.MAX_PER_PAGE):
+                chunk = ids[i:i + WPApi.MAX_PER_PAGE]
+                objects += self.fetch_collection_page(endpoint.path, {'include':
+                    ",".join(str(obj_id) for obj_id in chunk), 'orderby': 'include',
+                    'per_page': len(chunk)})[1]
+            return objects
+
+        hits = None
+        if unified:
+            post_types = [e for e in endpoints if e.kind == Endpoint.TYPE and e.key != WPApi.MEDIA]
+            if len(post_types) > 0:
+                try:
+                    hits = self.crawl_pages('wp/v2/search', search_terms=keywords,
+                        display_progress=False, params={'type': 'post',
+                        'subtype': ",".join(e.name for e in post_types)})[0]
+                except WordPressApiNotV2:
+                    hits = None
+        self.s.set_max_connections(max(self.workers, 10))
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            futures = {}
+            for endpoint in endpoints:
+                if hits is not None and endpoint in post_types:
+                    ids = [h['id'] for h in hits if type(h) is dict and
+                           h.get('subtype') == endpoint.name]
+                    offset = start if start is not None else 0
+                    ids = ids[offset:] if limit is None else ids[offset:offset + limit]
+                    futures[executor.submit(fetch_ids, endpoint, ids)] = endpoint
+                else:
+                    futures[executor.submit(search_type, endpoint)] = endpoint
+            for future in as_completed(futures):
+                yield futures[future].key, future.result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)